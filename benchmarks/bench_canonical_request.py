@@ -0,0 +1,59 @@
+# coding=utf-8
+"""
+Compares the single pass canonical encoder of CommonSession.call against the former request path,
+that deep-copied the request, converted the dates in place and hashed the result with `json.dumps`,
+on large requests with and without dates.
+
+    python benchmarks/bench_canonical_request.py [atoms] [repeats]
+"""
+import copy
+import sys
+import timeit
+from datetime import datetime, date
+
+import pytz
+
+from mdstudio.api.converter import convert_obj_to_json
+from mdstudio.api.request_hash import request_hash, canonical_request
+
+
+def legacy_request(request):
+    request = copy.deepcopy(request)
+    convert_obj_to_json(request)
+    return request, request_hash(request)
+
+
+def make_request(size, dates):
+    created = datetime(2018, 1, 1, 10, tzinfo=pytz.utc)
+    atoms = [{
+        'id': i,
+        'element': 'CHNOS'[i % 5],
+        'name': u'atom-{}'.format(i),
+        'position': [i * 0.1, i * 0.2, i * 0.3],
+        'fixed': i % 3 == 0
+    } for i in range(size)]
+    if dates:
+        for atom in atoms:
+            atom['measuredAt'] = created
+            atom['day'] = date(2018, 1, 1)
+
+    return {'structure': 'protein', 'createdAt': created, 'atoms': atoms}
+
+
+def main(size=5000, repeats=10):
+    print('atoms:          {}'.format(size))
+    for dates in [False, True]:
+        request = make_request(size, dates)
+        assert legacy_request(request) == canonical_request(request)
+
+        legacy = min(timeit.repeat(lambda: legacy_request(request), number=1, repeat=repeats))
+        current = min(timeit.repeat(lambda: canonical_request(request), number=1, repeat=repeats))
+
+        print('dates per atom: {}'.format(2 if dates else 0))
+        print('  deepcopy:     {:.1f}ms'.format(legacy * 1000))
+        print('  single pass:  {:.1f}ms'.format(current * 1000))
+        print('  speedup:      {:.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
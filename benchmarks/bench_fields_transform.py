@@ -0,0 +1,153 @@
+# coding=utf-8
+"""
+Compares the compiled field path plans of Fields.convert_call against the former implementation,
+that split the field paths and copied the key lists for every document, on nested requests with
+`$set`, `$in` and dotted key operators.
+
+    python benchmarks/bench_fields_transform.py [requests] [repeats]
+"""
+import copy
+import sys
+import timeit
+from datetime import datetime, date
+
+import pytz
+
+from mdstudio.db.fields import Fields
+
+
+class LegacyFields(Fields):
+    def transform_to_object(self, document, fields, parser, prefixes, **kwargs):
+        if prefixes is None:
+            prefixes = ['']
+
+        nfields = []
+        for f in fields:
+            for p in prefixes:
+                if p and not f.startswith('{}.'.format(p)):
+                    nfields.append('{}.{}'.format(p, f))
+                else:
+                    nfields.append(f)
+
+        for field in nfields:
+            split_fields = field.split('.')
+            self.transform_docfield_to_object(document, split_fields, parser, **kwargs)
+
+    def transform_docfield_to_object(self, doc, field, parser, **kwargs):
+        subdoc = doc
+        for i, level in enumerate(field[:-1]):
+            if isinstance(subdoc, dict):
+                if level in subdoc:
+                    subdoc = subdoc[level]
+                else:
+                    for key, val in subdoc.items():
+                        if key.startswith('$'):
+                            self.transform_docfield_to_object(val, field[i:], parser, **kwargs)
+                        elif '.' in key:
+                            accessor = None
+                            keys = key.split('.')
+                            nfields = copy.deepcopy(field[i:])
+                            for vkey in copy.deepcopy(keys):
+
+                                if not nfields:
+                                    break
+
+                                if not accessor:
+                                    accessor = vkey
+                                else:
+                                    accessor = '{}.{}'.format(accessor, vkey)
+                                if nfields[0] == vkey:
+                                    nfields.pop(0)
+                                elif not vkey.startswith('$'):
+                                    break
+                                if accessor in subdoc:
+                                    self.transform_docfield_to_object(subdoc, [accessor] + nfields, parser, **kwargs)
+
+                    subdoc = None
+            else:
+                if isinstance(subdoc, list):
+                    for d in subdoc:
+                        self.transform_docfield_to_object(d, field[i:], parser, **kwargs)
+                subdoc = None
+                break
+
+        if isinstance(subdoc, dict):
+            for key, val in subdoc.items():
+                if key.startswith('$') and key in self.conversion_operators:
+                    self.transform_docfield_to_object(val, [field[-1]], parser, **kwargs)
+
+        if subdoc is None:
+            return
+
+        key = field[-1]
+
+        if isinstance(subdoc, list):
+            for d in subdoc:
+                if key in d:
+                    d[key] = parser(self, d[key], d, key, **kwargs)
+        else:
+            if key in subdoc:
+                if isinstance(subdoc[key], dict):
+                    for dkey, val in subdoc[key].items():
+                        if dkey.startswith('$') and dkey in self.conversion_operators:
+                            subdoc[key][dkey] = parser(self, val, subdoc, key, **kwargs)
+                elif isinstance(subdoc[key], list):
+                    for i, e in enumerate(subdoc[key]):
+                        subdoc[key][i] = parser(self, e, subdoc, key, **kwargs)
+                else:
+                    subdoc[key] = parser(self, subdoc[key], subdoc, key, **kwargs)
+
+
+FIELDS = {
+    'date_times': ['createdAt', 'run.startedAt', 'run.frames.time', 'meta.updatedAt'],
+    'dates': ['day', 'run.day']
+}
+
+
+def make_requests(size):
+    created = datetime(2018, 1, 1, 10, tzinfo=pytz.utc)
+    return [{
+        'filter': {
+            'createdAt': {'$gte': created, '$lt': created},
+            'status': {'$in': ['queued', 'running']},
+            'run.day': {'$gt': date(2018, 1, 1 + i % 28)},
+            '$or': [{'day': date(2018, 1, 1)}, {'meta.updatedAt': {'$lt': created}}]
+        },
+        'update': {
+            '$set': {
+                'run.startedAt': created,
+                'run.frames': [{'step': j, 'time': created} for j in range(5)],
+                'meta': {'updatedAt': created, 'name': 'structure-{}'.format(i)}
+            },
+            '$push': {'run.frames': {'$each': [{'step': 6, 'time': created}]}}
+        }
+    } for i in range(size)]
+
+
+def convert(fields, requests):
+    for request in requests:
+        fields.convert_call(request, ['filter', 'update'])
+
+
+def main(size=10000, repeats=5):
+    legacy_fields = LegacyFields(**FIELDS)
+    fields = Fields(**FIELDS)
+    requests = make_requests(size)
+
+    # the conversions are idempotent on already converted values, so the same requests are reused
+    expected = copy.deepcopy(requests)
+    convert(legacy_fields, expected)
+    convert(fields, requests)
+    assert expected == requests
+
+    legacy = min(timeit.repeat(lambda: convert(legacy_fields, requests), number=1, repeat=repeats))
+    current = min(timeit.repeat(lambda: convert(fields, requests), number=1, repeat=repeats))
+
+    print('requests:       {}'.format(size))
+    print('split per call: {:.4f}s'.format(legacy))
+    print('compiled plans: {:.4f}s'.format(current))
+    print('speedup:        {:.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
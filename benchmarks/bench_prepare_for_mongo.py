@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+Compares MongoDatabaseWrapper._prepare_for_mongo against the former deepcopy based
+implementation on insert_many sized batches.
+
+    python benchmarks/bench_prepare_for_mongo.py [batch size] [repeats]
+"""
+import copy
+import sys
+import timeit
+from datetime import datetime, date
+
+import pytz
+from bson import ObjectId
+
+from mdstudio.db.impl.mongo_database_wrapper import MongoDatabaseWrapper
+
+
+def legacy_prepare_for_mongo(doc):
+    def _prepare_obj(obj):
+        if obj and '_id' in obj:
+            obj['_id'] = ObjectId(obj['_id'])
+
+    doc = copy.deepcopy(doc)
+    if isinstance(doc, list):
+        for d in doc:
+            _prepare_obj(d)
+    else:
+        _prepare_obj(doc)
+
+    def _recurse(document):
+        if isinstance(document, dict):
+            iter = document.items()
+        elif isinstance(document, list):
+            iter = enumerate(document)
+        else:
+            return
+
+        for key, value in iter:
+            if isinstance(value, date) and not isinstance(value, datetime):
+                document[key] = datetime(value.year, value.month, value.day, tzinfo=pytz.utc)
+            if not isinstance(value, datetime):
+                _recurse(value)
+
+    _recurse(doc)
+    return doc
+
+
+def make_batch(size):
+    return [{
+        '_id': str(ObjectId()),
+        'name': 'structure-{}'.format(i),
+        'created': date(2018, 1, 1 + i % 28),
+        'frames': [{
+            'step': j,
+            'energy': {'potential': -1.5 * j, 'kinetic': 0.5 * j},
+            'coordinates': [[0.1 * j, 0.2 * j, 0.3 * j] for _ in range(4)]
+        } for j in range(5)]
+    } for i in range(size)]
+
+
+def main(size=10000, repeats=5):
+    wrapper = MongoDatabaseWrapper('benchmark', None)
+    batch = make_batch(size)
+
+    assert legacy_prepare_for_mongo(batch) == wrapper._prepare_for_mongo(batch)
+
+    legacy = min(timeit.repeat(lambda: legacy_prepare_for_mongo(batch), number=1, repeat=repeats))
+    current = min(timeit.repeat(lambda: wrapper._prepare_for_mongo(batch), number=1, repeat=repeats))
+
+    print('documents:     {}'.format(size))
+    print('deepcopy:      {:.4f}s'.format(legacy))
+    print('copy on write: {:.4f}s'.format(current))
+    print('speedup:       {:.1f}x'.format(legacy / current))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""
+Measures the schema validation overhead per endpoint call (claims, input and output), for the
+former validator that was built on every validation, the compiled validators of WampEndpoint, and
+the code generating backend when fastjsonschema is installed.
+
+    python benchmarks/bench_schema_validation.py [calls]
+"""
+import copy
+import json
+import os
+import sys
+import time
+
+from mdstudio.api.schema import validate_json_schema, compile_validator, fastjsonschema
+
+SCHEMAS_PATH = os.path.join(os.path.dirname(__file__), '..', 'mdstudio', 'schemas')
+
+INPUT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'structure': {'type': 'string', 'minLength': 1},
+        'steps': {'type': 'integer', 'minimum': 1, 'default': 1000},
+        'temperature': {'type': 'number', 'minimum': 0},
+        'atoms': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'element': {'type': 'string', 'enum': ['C', 'H', 'N', 'O', 'S']},
+                    'position': {'type': 'array', 'items': {'type': 'number'}, 'minItems': 3, 'maxItems': 3},
+                    'charge': {'type': 'number', 'default': 0}
+                },
+                'required': ['element', 'position']
+            }
+        }
+    },
+    'required': ['structure', 'atoms']
+}
+
+OUTPUT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'energy': {'type': 'number'},
+        'converged': {'type': 'boolean'},
+        'frames': {'type': 'array', 'items': {'type': 'array', 'items': {'type': 'number'}}}
+    },
+    'required': ['energy', 'converged']
+}
+
+
+def load_claims_schema():
+    with open(os.path.join(SCHEMAS_PATH, 'claims.v1.json'), 'r') as f:
+        return json.load(f)
+
+
+def make_calls(size):
+    claims = {'username': 'user', 'group': 'group', 'role': 'role', 'uri': 'mdstudio.md.endpoint.run', 'action': 'call'}
+    request = {
+        'structure': 'protein',
+        'temperature': 300.0,
+        'atoms': [{'element': 'CHNOS'[i % 5], 'position': [i * 0.1, i * 0.2, i * 0.3]} for i in range(20)]
+    }
+    result = {'energy': -1234.5, 'converged': True, 'frames': [[j * 0.5 for j in range(30)] for _ in range(5)]}
+    return [(copy.deepcopy(claims), copy.deepcopy(request), result) for _ in range(size)]
+
+
+def measure(validate_claims, validate_input, validate_output, calls):
+    started = time.time()
+    for claims, request, result in calls:
+        validate_claims(claims)
+        validate_input(request)
+        validate_output(result)
+    return time.time() - started
+
+
+def main(size=10000):
+    claims_schema = load_claims_schema()
+
+    timings = [('validator per call', measure(
+        lambda claims: validate_json_schema(claims_schema, claims),
+        lambda request: validate_json_schema(INPUT_SCHEMA, request),
+        lambda result: validate_json_schema(OUTPUT_SCHEMA, result),
+        make_calls(size)
+    ))]
+
+    backends = [('compiled', False)]
+    if fastjsonschema is not None:
+        backends.append(('compiled fast', True))
+
+    for name, fast in backends:
+        calls = make_calls(size)
+        timings.append((name, measure(compile_validator(claims_schema, fast),
+                                      compile_validator(INPUT_SCHEMA, fast),
+                                      compile_validator(OUTPUT_SCHEMA, fast), calls)))
+        assert all(request['steps'] == 1000 and request['atoms'][0]['charge'] == 0 for _, request, _ in calls)
+
+    print('calls:                {}'.format(size))
+    for name, timing in timings:
+        print('{:<21} {:.2f}s ({:.1f}us per call, {:.1f}x)'.format(name + ':', timing, timing / size * 1e6,
+                                                                    timings[0][1] / timing))
+    if fastjsonschema is None:
+        print('fastjsonschema is not installed, the fast backend was skipped')
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""
+Compares the strict parsers of mdstudio.utc against dateutil, on timestamps and dates in the
+formats produced by `to_utc_string` and `to_date_string`.
+
+    python benchmarks/bench_utc_parse.py [timestamps]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from dateutil.parser import parse as parsedate
+
+from mdstudio.utc import from_utc_string, from_date_string, to_utc_string, to_date_string
+
+
+def legacy_from_utc_string(dt):
+    parsed = parsedate(dt)
+    if not parsed.tzinfo:
+        parsed = parsed.replace(tzinfo=pytz.utc)
+    return parsed.astimezone(pytz.utc)
+
+
+def legacy_from_date_string(ldate):
+    return legacy_from_utc_string(ldate).date()
+
+
+def make_timestamps(size):
+    start = datetime(2018, 1, 1, tzinfo=pytz.utc)
+    return [to_utc_string(start + timedelta(seconds=i * 7.123)) for i in range(size)]
+
+
+def measure(parse, values):
+    started = time.time()
+    for value in values:
+        parse(value)
+    return time.time() - started
+
+
+def main(size=1000000):
+    timestamps = make_timestamps(size)
+    dates = [to_date_string(from_utc_string(t).date()) for t in timestamps[:size // 10]]
+
+    assert [legacy_from_utc_string(t) for t in timestamps[:1000]] == [from_utc_string(t) for t in timestamps[:1000]]
+    assert [legacy_from_date_string(d) for d in dates[:1000]] == [from_date_string(d) for d in dates[:1000]]
+
+    legacy = measure(legacy_from_utc_string, timestamps)
+    current = measure(from_utc_string, timestamps)
+    legacy_dates = measure(legacy_from_date_string, dates)
+    current_dates = measure(from_date_string, dates)
+
+    print('timestamps:      {}'.format(size))
+    print('dateutil:        {:.2f}s'.format(legacy))
+    print('strict parser:   {:.2f}s'.format(current))
+    print('speedup:         {:.1f}x'.format(legacy / current))
+    print('dates:           {}'.format(len(dates)))
+    print('dateutil:        {:.2f}s'.format(legacy_dates))
+    print('strict parser:   {:.2f}s'.format(current_dates))
+    print('speedup:         {:.1f}x'.format(legacy_dates / current_dates))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,107 @@
+# coding=utf-8
+import copy
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Union
+
+import six
+
+
+class VerifiedClaimsCache(object):
+    """
+    Caches the results of the claim verification at the auth component, so a caller that sends
+    many calls with the same signed claims only has them verified once.
+
+    The results are keyed by a digest of the signed claims, and only successful verifications are
+    cached. An entry expires at the expiry (`exp`) of the claims, or after `ttl` seconds when that
+    comes first, and the least recently used entries are evicted above `max_size`.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        # type: (float, int) -> None
+        assert max_size > 0
+
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+        self._lock = Lock()
+        # digest -> (verified claims, expiry time), ordered from least to most recently used
+        self._entries = OrderedDict()
+
+    def get(self, signed_claims):
+        # type: (Union[str, bytes]) -> Optional[dict]
+        key = self._key(signed_claims)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= time.time():
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._entries[key] = entry
+            self.hits += 1
+
+        # the endpoints hand the claims to the wrapped function, so every caller gets its own copy
+        return copy.deepcopy(entry[0])
+
+    def put(self, signed_claims, verified):
+        # type: (Union[str, bytes], dict) -> None
+        if 'error' in verified or 'expired' in verified:
+            return
+
+        expiry = time.time() + self.ttl
+        claims_expiry = self._expiry(verified.get('claims', {}))
+        if claims_expiry is not None:
+            expiry = min(expiry, claims_expiry)
+        if expiry <= time.time():
+            return
+
+        key = self._key(signed_claims)
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+            self._entries[key] = (copy.deepcopy(verified), expiry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'size': len(self._entries),
+                'hitRatio': float(self.hits) / lookups if lookups else 0.0
+            }
+
+    @staticmethod
+    def _key(signed_claims):
+        # type: (Union[str, bytes]) -> bytes
+        if isinstance(signed_claims, six.text_type):
+            signed_claims = signed_claims.encode('utf-8')
+        elif not isinstance(signed_claims, bytes):
+            signed_claims = repr(signed_claims).encode('utf-8')
+        return hashlib.sha256(signed_claims).digest()
+
+    @staticmethod
+    def _expiry(claims):
+        # type: (dict) -> Optional[float]
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)) and not isinstance(exp, bool):
+            return float(exp)
+        return None
@@ -1,7 +1,10 @@
 from datetime import datetime, date
+from typing import List, Optional, Tuple, Union
 
 from mdstudio.utc import to_utc_string, to_date_string
 
+_date_formats = ['date', 'date-time']
+
 
 def convert_obj_to_json(document):
     if isinstance(document, dict):
@@ -20,3 +23,81 @@ def convert_obj_to_json(document):
             convert_obj_to_json(value)
 
     return document
+
+
+def date_paths(schema):
+    # type: (dict) -> Optional[List[Tuple[str, ...]]]
+    """
+    Collects the paths of the `date` and `date-time` formatted properties of a flattened schema, where
+    arrays do not add a path segment. Returns None when the dates cannot be located from the schema,
+    e.g. when it still contains references, in which case the whole document should be converted.
+    """
+    paths = []
+    if not _collect_date_paths(schema, (), paths):
+        return None
+
+    return sorted(set(paths))
+
+
+def convert_paths_to_json(document, paths):
+    # type: (Union[dict, list], List[Tuple[str, ...]]) -> Union[dict, list]
+    for path in paths:
+        _convert_path_to_json(document, path)
+
+    return document
+
+
+def _collect_date_paths(schema, prefix, paths):
+    if not isinstance(schema, dict):
+        return True
+    if '$ref' in schema:
+        return False
+
+    if schema.get('format') in _date_formats:
+        paths.append(prefix)
+
+    for key, subschema in schema.get('properties', {}).items():
+        if not _collect_date_paths(subschema, prefix + (key,), paths):
+            return False
+
+    items = schema.get('items', [])
+    for subschema in (items if isinstance(items, list) else [items]):
+        if not _collect_date_paths(subschema, prefix, paths):
+            return False
+
+    for combinator in ['allOf', 'anyOf', 'oneOf']:
+        for subschema in schema.get(combinator, []):
+            if not _collect_date_paths(subschema, prefix, paths):
+                return False
+
+    # dates below properties we do not know the name of can not be located
+    unnamed = list(schema.get('patternProperties', {}).values()) + [schema.get('additionalProperties')]
+    for subschema in unnamed:
+        if isinstance(subschema, dict):
+            nested = []
+            if not _collect_date_paths(subschema, (), nested) or nested:
+                return False
+
+    return True
+
+
+def _convert_path_to_json(document, path):
+    if isinstance(document, list):
+        for d in document:
+            _convert_path_to_json(d, path)
+    elif isinstance(document, dict) and path and path[0] in document:
+        if len(path) == 1:
+            document[path[0]] = _to_json_value(document[path[0]])
+        else:
+            _convert_path_to_json(document[path[0]], path[1:])
+
+
+def _to_json_value(value):
+    if isinstance(value, datetime):
+        return to_utc_string(value)
+    elif isinstance(value, date):
+        return to_date_string(value)
+    elif isinstance(value, list):
+        return [_to_json_value(v) for v in value]
+
+    return value
@@ -11,9 +11,10 @@ from jsonschema import ValidationError
 from twisted.internet.defer import _inlineCallbacks, Deferred
 
 from mdstudio.api.api_result import APIResult
-from mdstudio.api.converter import convert_obj_to_json
+from mdstudio.api.claims_cache import VerifiedClaimsCache
+from mdstudio.api.converter import convert_obj_to_json, convert_paths_to_json, date_paths
 from mdstudio.api.request_hash import request_hash
-from mdstudio.api.schema import ISchema, EndpointSchema, validate_json_schema, ClaimSchema, MDStudioClaimSchema, InlineSchema, \
+from mdstudio.api.schema import ISchema, EndpointSchema, compile_validator, ClaimSchema, MDStudioClaimSchema, InlineSchema, \
     MDStudioSchema
 from mdstudio.deferred.chainable import chainable, Chainable
 from mdstudio.deferred.return_value import return_value
@@ -34,7 +35,11 @@ def validation_error(schema, instance, error, prefix, uri):
 
 
 class WampEndpoint(object):
-    def __init__(self, wrapped_f, uri, input_schema, output_schema, claim_schema=None, options=None, scope=None):
+    # verification results of signed claims, shared by all endpoints since the claims are checked per endpoint
+    verified_claims = VerifiedClaimsCache()
+
+    def __init__(self, wrapped_f, uri, input_schema, output_schema, claim_schema=None, options=None, scope=None,
+                 schema_conversion=False, fast_validation=False):
         from mdstudio.component.impl.common import CommonSession
 
         self.uri_suffix = uri
@@ -52,6 +57,17 @@ class WampEndpoint(object):
         if claim_schema:
             self.claim_schemas.append(claim_schema)
 
+        # when set, only the dates on the `date` and `date-time` paths of the output schema are converted,
+        # instead of walking the whole result. Dates on undeclared paths are then left as they are
+        self.schema_conversion = schema_conversion
+        self._date_paths = None
+        self._date_paths_resolved = False
+
+        # the schemas are compiled into validators once, and the validators are reused for every call.
+        # With `fast_validation` the schemas are compiled to code when fastjsonschema is installed
+        self.fast_validation = fast_validation
+        self._validators = None
+
     def set_instance(self, instance):
         self.instance = instance
         self.uri = u'{}.{}.endpoint.{}'.format(
@@ -73,7 +89,10 @@ class WampEndpoint(object):
 
         from mdstudio.component.impl.common import CommonSession
 
-        claims = yield super(CommonSession, self.instance).call(u'mdstudio.auth.endpoint.verify', signed_claims)
+        claims = self.verified_claims.get(signed_claims)
+        if claims is None:
+            claims = yield super(CommonSession, self.instance).call(u'mdstudio.auth.endpoint.verify', signed_claims)
+            self.verified_claims.put(signed_claims, claims)
 
         claim_errors = self.validate_claims(claims, request)
         if claim_errors:
@@ -89,7 +108,7 @@ class WampEndpoint(object):
         result = yield result
 
         result = result if isinstance(result, APIResult) else APIResult(result)
-        convert_obj_to_json(result)
+        self.convert_result(result)
 
         if 'error' in result:
             return_value(result)
@@ -110,6 +129,38 @@ class WampEndpoint(object):
     def call_wrapped(self, request, claims):
         return self.wrapped(self.instance, request, claims)
 
+    def convert_result(self, result):
+        # type: (APIResult) -> None
+        paths = self.output_date_paths() if self.schema_conversion else None
+        if paths is None:
+            convert_obj_to_json(result)
+        else:
+            convert_paths_to_json(result, [('data',) + path for path in paths])
+
+    def output_date_paths(self):
+        # the schemas are flattened on registration, so the paths only have to be collected once
+        if not self._date_paths_resolved:
+            self._date_paths = date_paths(self.output_schema.to_schema())
+            self._date_paths_resolved = True
+
+        return self._date_paths
+
+    def compile_validators(self):
+        # called when the schemas are flattened, since the validators are compiled from the flattened schemas
+        self._validators = {
+            'input': compile_validator(self.input_schema.to_schema(), self.fast_validation),
+            'output': compile_validator(self.output_schema.to_schema(), self.fast_validation),
+            'claims': [compile_validator(s.to_schema(), self.fast_validation) for s in self.claim_schemas]
+        }
+
+        return self._validators
+
+    def validators(self):
+        if self._validators is None:
+            self.compile_validators()
+
+        return self._validators
+
     def validate_claims(self, claims, request):
         if 'error' in claims:
             res = APIResult(error=claims['error'])
@@ -126,8 +177,8 @@ class WampEndpoint(object):
             else:
                 s = None
                 try:
-                    for s in self.claim_schemas:
-                        validate_json_schema(s.to_schema(), claims)
+                    for s, validate in zip(self.claim_schemas, self.validators()['claims']):
+                        validate(claims)
                 except ValidationError as e:
                     res = {'error': validation_error(s.to_schema(), claims, e, 'Claims', self.uri)}
                     self.instance.log.error('{error_message}', error_message=res['error'])
@@ -144,7 +195,7 @@ class WampEndpoint(object):
     def validate_request(self, request):
         schema = self.input_schema.to_schema()
         try:
-            validate_json_schema(schema, request)
+            self.validators()['input'](request)
         except ValidationError as e:
             return APIResult(error=validation_error(schema, request, e, 'Input', self.uri))
         else:
@@ -155,7 +206,7 @@ class WampEndpoint(object):
         schema = self.output_schema.to_schema()
 
         try:
-            validate_json_schema(schema, result)
+            self.validators()['output'](result)
         except ValidationError as e:
             res = APIResult(error=validation_error(schema, result, e, 'Output', self.uri))
         else:
@@ -181,7 +232,8 @@ class WampEndpoint(object):
 
 
 class CursorWampEndpoint(WampEndpoint):
-    def __init__(self, wrapped_f, uri, input_schema, output_schema, claim_schema=None, options=None, scope=None):
+    def __init__(self, wrapped_f, uri, input_schema, output_schema, claim_schema=None, options=None, scope=None,
+                 schema_conversion=False, fast_validation=False):
         input_schema = InlineSchema({
             'oneOf': [
                 {
@@ -203,7 +255,8 @@ class CursorWampEndpoint(WampEndpoint):
                 }
             ]
         })
-        super(CursorWampEndpoint, self).__init__(wrapped_f, uri, input_schema, output_schema, claim_schema, options, scope)
+        super(CursorWampEndpoint, self).__init__(wrapped_f, uri, input_schema, output_schema, claim_schema, options, scope,
+                                                 schema_conversion, fast_validation)
 
     @chainable
     def call_wrapped(self, request, claims):
@@ -252,17 +305,21 @@ class CursorWampEndpoint(WampEndpoint):
         })
 
 
-def endpoint(uri, input_schema, output_schema=None, claim_schema=None, options=None, scope=None):
-    # type: (str, SchemaType, Optional[SchemaType], Optional[SchemaType], bool, Optional[str], Optional[RegisterOptions], Optional[str]) -> Callable
+def endpoint(uri, input_schema, output_schema=None, claim_schema=None, options=None, scope=None, schema_conversion=False,
+             fast_validation=False):
+    # type: (str, SchemaType, Optional[SchemaType], Optional[SchemaType], bool, Optional[str], Optional[RegisterOptions], Optional[str], bool, bool) -> Callable
     def wrap_f(f):
-        return WampEndpoint(f, uri, input_schema, output_schema, claim_schema, options, scope)
+        return WampEndpoint(f, uri, input_schema, output_schema, claim_schema, options, scope, schema_conversion,
+                            fast_validation)
 
     return wrap_f
 
 
-def cursor_endpoint(uri, input_schema, output_schema, claim_schema=None, options=None, scope=None):
-    # type: (str, SchemaType, Optional[SchemaType], Optional[SchemaType], bool, Optional[str], Optional[RegisterOptions], Optional[str]) -> Callable
+def cursor_endpoint(uri, input_schema, output_schema, claim_schema=None, options=None, scope=None,
+                    schema_conversion=False, fast_validation=False):
+    # type: (str, SchemaType, Optional[SchemaType], Optional[SchemaType], bool, Optional[str], Optional[RegisterOptions], Optional[str], bool, bool) -> Callable
     def wrap_f(f):
-        return CursorWampEndpoint(f, uri, input_schema, output_schema, claim_schema, options, scope)
+        return CursorWampEndpoint(f, uri, input_schema, output_schema, claim_schema, options, scope,
+                                  schema_conversion, fast_validation)
 
     return wrap_f
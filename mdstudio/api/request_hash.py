@@ -1,7 +1,130 @@
 import json
 from base64 import b64encode
+from datetime import datetime, date
 from hashlib import sha512
+from json.encoder import encode_basestring_ascii
+
+import six
+
+from mdstudio.utc import to_utc_string, to_date_string
 
 
 def request_hash(request):
-    return b64encode(sha512(json.dumps(request, sort_keys=True).encode('utf8')).digest()).decode('utf8')
\ No newline at end of file
+    try:
+        encoded = json.dumps(request, sort_keys=True)
+    except TypeError:
+        # the request still holds dates, which are hashed in their wire form
+        return canonical_request(request)[1]
+
+    return _hash(encoded)
+
+
+def canonical_request(request):
+    """
+    Converts the request to its JSON-safe wire form, and computes the request hash of the wire form,
+    in a single pass over the request. The request itself is left untouched.
+
+    The canonical encoding is the same as `json.dumps(request, sort_keys=True)`, so the hash equals
+    the `request_hash` of the wire form.
+    """
+    chunks = []
+    wire = _encode(request, chunks)
+    return wire, _hash(''.join(chunks))
+
+
+def _hash(encoded):
+    return b64encode(sha512(encoded.encode('utf8')).digest()).decode('utf8')
+
+
+def _encode(value, chunks):
+    # the exact types are checked first, since they make up nearly all of a request
+    vtype = type(value)
+    if vtype is str:
+        chunks.append(encode_basestring_ascii(value))
+        return value
+    if vtype is float:
+        chunks.append(_encode_float(value))
+        return value
+    if vtype is int:
+        chunks.append(int.__repr__(value))
+        return value
+    if vtype is bool:
+        chunks.append('true' if value else 'false')
+        return value
+    if value is None:
+        chunks.append('null')
+        return value
+    if isinstance(value, dict):
+        if not value:
+            chunks.append('{}')
+            return {}
+
+        wire = {}
+        separator = '{'
+        for key in sorted(value):
+            chunks.append(separator)
+            chunks.append(_encode_key(key))
+            chunks.append(': ')
+            wire[key] = _encode(value[key], chunks)
+            separator = ', '
+        chunks.append('}')
+        return wire
+    if isinstance(value, (list, tuple)):
+        if not value:
+            chunks.append('[]')
+            return []
+
+        wire = []
+        separator = '['
+        for item in value:
+            chunks.append(separator)
+            wire.append(_encode(item, chunks))
+            separator = ', '
+        chunks.append(']')
+        return wire
+    if isinstance(value, six.string_types):
+        chunks.append(encode_basestring_ascii(value))
+        return value
+    if isinstance(value, six.integer_types):
+        chunks.append(int.__repr__(value))
+        return value
+    if isinstance(value, float):
+        chunks.append(_encode_float(value))
+        return value
+    if isinstance(value, datetime):
+        value = to_utc_string(value)
+        chunks.append(encode_basestring_ascii(value))
+        return value
+    if isinstance(value, date):
+        value = to_date_string(value)
+        chunks.append(encode_basestring_ascii(value))
+        return value
+
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def _encode_key(key):
+    if isinstance(key, six.string_types):
+        return encode_basestring_ascii(key)
+    if key is None:
+        return '"null"'
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if isinstance(key, six.integer_types):
+        return '"{}"'.format(int.__repr__(key))
+    if isinstance(key, float):
+        return '"{}"'.format(_encode_float(key))
+
+    raise TypeError('Keys must be str, int, float, bool or None, not {}'.format(type(key).__name__))
+
+
+def _encode_float(value):
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return 'Infinity'
+    if value == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(value)
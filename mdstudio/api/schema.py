@@ -5,10 +5,13 @@ import os
 import re
 import six
 from jsonschema import FormatChecker, Draft4Validator
+from typing import Any, Callable
 
 from mdstudio.api.exception import RegisterException
+from mdstudio.api.schema_cache import SchemaCache, file_digest
 from mdstudio.api.singleton import Singleton
 from mdstudio.deferred.chainable import chainable
+from mdstudio.deferred.gather import gather
 from mdstudio.deferred.return_value import return_value
 
 # python 2 compat
@@ -17,9 +20,20 @@ try:
 except NameError:
     FileNotFoundError = IOError
 
+# optional code generating validator backend
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
 class ISchema(object):
+    # flattened schemas shared by all schemas of the process, persisted on disk when a path is set
+    cache = SchemaCache()
+
     def __init__(self):
         self.cached = {}
+        # hashes of the local files the schema was flattened from
+        self.dependencies = {}
 
     def _retrieve_local(self, base_path, schema_path, versions=None):
         if versions is not None:
@@ -28,14 +42,49 @@ class ISchema(object):
 
             for version in versions:
                 path = os.path.join(base_path, '{}.v{}.json'.format(schema_path, version))
-
-                with open(path, 'r') as f:
-                    self.cached[version] = json.load(f)
+                self.cached[version] = self._load_local(path)
         else:
             path = os.path.join(base_path, '{}.json'.format(schema_path))
+            self.cached[1] = self._load_local(path)
+
+    def _load_local(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        self.dependencies[os.path.abspath(path)] = file_digest(data)
+        return json.loads(data.decode('utf-8'))
 
-            with open(path, 'r') as f:
-                self.cached[1] = json.load(f)
+    def _local_key(self, schema_type, base_path, schema_path):
+        return json.dumps([schema_type, base_path, schema_path, sorted(self.dependencies.items())])
+
+    @chainable
+    def _flatten_cached(self, key, session, retrieve=None):
+        """
+        Flattens all versions of the schema, or takes them from the schema cache when the schema with `key`
+        was flattened before. Retrieving the schema with `retrieve` is skipped when it was.
+        """
+        entry = yield self.cache.flatten(key, lambda: self._flatten_versions(session, retrieve))
+
+        if entry is None:
+            self.cached = {}
+            return_value(False)
+
+        self.cached = dict(entry[0])
+        self.dependencies = dict(entry[1])
+        return_value(True)
+
+    @chainable
+    def _flatten_versions(self, session, retrieve=None):
+        if retrieve is not None:
+            yield retrieve()
+
+        versions = list(self.cached.keys())
+        flattened = yield gather([self._recurse_subschemas(self.cached[version], session) for version in versions])
+
+        if not all(f['success'] for f in flattened):
+            return_value(None)
+
+        return_value(({version: f['schema'] for version, f in zip(versions, flattened)}, dict(self.dependencies)))
 
     @chainable
     def _recurse_subschemas(self, schema, session):
@@ -53,21 +102,25 @@ class ISchema(object):
 
                 if (yield subschema.flatten(session)):
                     schema.update(subschema.to_schema())
+                    dependencies = getattr(subschema, 'dependencies', None)
+                    if isinstance(dependencies, dict):
+                        self.dependencies.update(dependencies)
                 else:
                     success = False
 
             if success:
-                for k, v in schema.items():
-                    recursed = yield self._recurse_subschemas(v, session)
-
-                    if not recursed['success']:
+                # the subschemas are independent, so their references are resolved concurrently
+                keys = list(schema.keys())
+                recursed = yield gather([self._recurse_subschemas(schema[k], session) for k in keys])
+
+                for k, r in zip(keys, recursed):
+                    if r['success']:
+                        schema[k] = r['schema']
+                    else:
                         success = False
-                        break
-
-                    schema[k] = recursed['schema']
         elif isinstance(schema, list):
-            for v in schema:
-                success = success and (yield self._recurse_subschemas(v, session))['success']
+            recursed = yield gather([self._recurse_subschemas(v, session) for v in schema])
+            success = all(r['success'] for r in recursed)
 
         return_value({
             'schema': schema,
@@ -153,25 +206,14 @@ class EndpointSchema(ISchema):
         if self.schema_subdir:
             ldir = os.path.join(ldir, self.schema_subdir)
 
+        self.dependencies = {}
         try:
             self._retrieve_local(ldir, self.schema_path, self.versions)
         except FileNotFoundError as ex:
             raise RegisterException('Tried to access schema "{}/{}" with versions {}, '
                                     'but the schema was not found:\n{}'.format(ldir, self.schema_path, self.versions, str(ex)))
 
-        success = True
-
-        for version, schema in self.cached.items():
-            flattened = yield self._recurse_subschemas(schema, session)
-            self.cached[version] = flattened['schema']
-
-            if not flattened['success']:
-                success = False
-                break
-
-        if not success:
-            self.cached = {}
-
+        success = yield self._flatten_cached(self._local_key(self.type_name, ldir, self.schema_path), session)
         return_value(success)
 
     def search_dir(self, session):
@@ -227,37 +269,34 @@ class ResourceSchema(ISchema):
         if self.cached:
             return_value(True)
 
+        self.dependencies = {}
         if session.component_config.static.vendor == self.vendor and session.component_config.static.component == self.component:
-            self._retrieve_local(os.path.join(session.component_schemas_path(), 'resources'), self.schema_path, self.versions)
+            ldir = os.path.join(session.component_schemas_path(), 'resources')
+            self._retrieve_local(ldir, self.schema_path, self.versions)
+            key = self._local_key('resource', ldir, self.schema_path)
+            retrieve = None
         else:
-            yield self._retrieve_wamp(session)
-
-        success = True
-
-        for version, schema in self.cached.items():
-            flattened = yield self._recurse_subschemas(schema, session)
-            self.cached[version] = flattened['schema']
-
-            if not flattened['success']:
-                success = False
-                break
-
-        if not success:
-            self.cached = {}
+            # uploaded resource versions do not change, so remote schemas are keyed by their name and versions
+            key = json.dumps(['resource', self.vendor, self.component, self.schema_path, sorted(self.versions)])
+            retrieve = lambda: self._retrieve_wamp(session)
 
+        success = yield self._flatten_cached(key, session, retrieve)
         return_value(success)
 
     @chainable
     def _retrieve_wamp(self, session):
-        for version in self.versions:
-            self.cached[version] = yield session.group_context(session.component_config.static.vendor).call('mdstudio.schema.endpoint.get', {
-                'name': self.schema_path,
-                'version': version,
-                'component': self.component,
-                'type': 'resource'
-            }, claims={
-                'vendor': self.vendor
-            })
+        context = session.group_context(session.component_config.static.vendor)
+        schemas = yield gather([context.call('mdstudio.schema.endpoint.get', {
+            'name': self.schema_path,
+            'version': version,
+            'component': self.component,
+            'type': 'resource'
+        }, claims={
+            'vendor': self.vendor
+        }) for version in self.versions])
+
+        for version, schema in zip(self.versions, schemas):
+            self.cached[version] = schema
 
 
 def extend_with_default(validator_class):
@@ -276,6 +315,44 @@ def extend_with_default(validator_class):
 
 DefaultValidatingDraft4Validator = extend_with_default(Draft4Validator)
 
+# the format checker holds no state, so it is shared by all validators
+format_checker = FormatChecker()
+
 
 def validate_json_schema(schema_def, instance):
-    DefaultValidatingDraft4Validator(schema_def, format_checker=FormatChecker()).validate(instance)
+    DefaultValidatingDraft4Validator(schema_def, format_checker=format_checker).validate(instance)
+
+
+def compile_validator(schema_def, fast=False):
+    # type: (dict, bool) -> Callable[[Any], None]
+    """
+    Compiles the schema into a validation function, that fills in the defaults and raises a
+    `ValidationError` when the instance does not match the schema, like `validate_json_schema`.
+
+    When `fast` is set and fastjsonschema is installed, the schema is compiled to python code. The
+    reference validator is then only used to report the errors, so the errors are the same for both
+    backends. Schemas the code generator does not support (e.g. remote references) fall back to
+    the reference validator.
+    """
+    validator = DefaultValidatingDraft4Validator(schema_def, format_checker=format_checker)
+
+    if not fast or fastjsonschema is None or not isinstance(schema_def, dict):
+        return validator.validate
+
+    def no_remote_refs(uri):
+        raise RegisterException('Remote reference "{}" is not supported by the fast validator'.format(uri))
+
+    try:
+        fast_validate = fastjsonschema.compile(dict(schema_def, **{'$schema': 'http://json-schema.org/draft-04/schema#'}),
+                                               handlers={'http': no_remote_refs, 'https': no_remote_refs},
+                                               use_default=True)
+    except Exception:
+        return validator.validate
+
+    def validate(instance):
+        try:
+            fast_validate(instance)
+        except fastjsonschema.JsonSchemaValueException:
+            validator.validate(instance)
+
+    return validate
@@ -0,0 +1,151 @@
+# coding=utf-8
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from twisted.internet.defer import Deferred, maybeDeferred, succeed
+
+from mdstudio.logging.logger import Logger
+
+# flattened versions of a schema, and the hashes of the local files they were flattened from
+SchemaEntry = Tuple[Dict[int, Any], Dict[str, str]]
+
+
+def file_digest(data):
+    # type: (bytes) -> str
+    return hashlib.sha256(data).hexdigest()
+
+
+class SchemaCache(object):
+    """
+    Shares the flattened schemas within the process, and persists them on disk, so the schemas do
+    not have to be flattened (and fetched over WAMP) again by other endpoints or on the next start.
+
+    The schemas are content addressed: local schemas are keyed by the hash of their files, and remote
+    resource schemas by their name and version, which do not change once uploaded. The hashes of the
+    local files a schema was flattened from are stored along with it, so an entry on disk is only
+    used while none of these files changed. Concurrent flattens of the same schema share a single
+    flatten. Persisting is disabled when `path` is None.
+    """
+
+    _logger = Logger()
+
+    def __init__(self, path=None):
+        # type: (Optional[str]) -> None
+        self.path = path
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._entries = {}  # type: Dict[str, SchemaEntry]
+        self._pending = {}  # type: Dict[str, list]
+
+    def flatten(self, key, flatten):
+        # type: (str, Callable[[], Any]) -> Deferred
+        """
+        Returns a deferred with the entry of the schema identified by `key`, where `flatten` is only
+        called when the schema is neither flattened in this process nor on disk. The entry is None
+        when flattening failed, in which case it is not cached.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return succeed(entry)
+
+        if key in self._pending:
+            self.hits += 1
+            d = Deferred()
+            self._pending[key].append(d)
+            return d
+
+        entry = self._load(key)
+        if entry is not None:
+            self.disk_hits += 1
+            self._entries[key] = entry
+            return succeed(entry)
+
+        self.misses += 1
+        self._pending[key] = []
+
+        def flattened(entry):
+            waiting = self._pending.pop(key)
+            if entry is not None:
+                self._entries[key] = entry
+                self._store(key, entry)
+            for d in waiting:
+                d.callback(entry)
+            return entry
+
+        def failed(failure):
+            for d in self._pending.pop(key):
+                d.errback(failure)
+            return failure
+
+        return maybeDeferred(flatten).addCallbacks(flattened, failed)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        return {
+            'hits': self.hits,
+            'diskHits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self._entries)
+        }
+
+    def _file(self, key):
+        # type: (str) -> str
+        return os.path.join(self.path, '{}.json'.format(hashlib.sha256(key.encode('utf-8')).hexdigest()))
+
+    def _load(self, key):
+        # type: (str) -> Optional[SchemaEntry]
+        if self.path is None:
+            return None
+
+        try:
+            with open(self._file(key), 'r') as f:
+                stored = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if stored.get('key') != key:
+            return None
+
+        for path, digest in stored['dependencies'].items():
+            try:
+                with open(path, 'rb') as f:
+                    if file_digest(f.read()) != digest:
+                        return None
+            except (IOError, OSError):
+                return None
+
+        return {int(version): schema for version, schema in stored['versions'].items()}, stored['dependencies']
+
+    def _store(self, key, entry):
+        # type: (str, SchemaEntry) -> None
+        if self.path is None:
+            return
+
+        versions, dependencies = entry
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+
+            # written to a temporary file first, so concurrent components never read a partial entry
+            fd, temporary = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({
+                    'key': key,
+                    'versions': {str(version): schema for version, schema in versions.items()},
+                    'dependencies': dependencies
+                }, f)
+            # os.rename does not replace existing files on windows, and os.replace is not available on python 2
+            getattr(os, 'replace', os.rename)(temporary, self._file(key))
+        except (IOError, OSError, TypeError, ValueError) as e:
+            self._logger.warn('Failed to store flattened schema: {error}', error=str(e))
@@ -2,24 +2,29 @@ from typing import Any, Union, List, Tuple, Optional
 
 from mdstudio.cache.cache import ICache
 from mdstudio.deferred.make_deferred import make_deferred
+from mdstudio.deferred.thread_pool import ThreadPools
 
 
 class RedisClientWrapper(ICache):
 
-    def __init__(self, client):
-        # type: (StrictRedisCluster) -> None
+    # type: ThreadPools
+    thread_pools = None
+
+    def __init__(self, client, thread_pools=None):
+        # type: (StrictRedisCluster, Optional[ThreadPools]) -> None
 
         # type: StrictRedisCluster
         self.client = client
+        self.thread_pools = thread_pools
 
-    @make_deferred
+    @make_deferred(pool='write')
     def put(self, key, value, expiry=None):
 
         return {
             'success': self.client.setex(key, expiry, value)
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def put_many(self, values, expiry=None):
         # type: (List[Tuple[str, Any]], Optional[int]) -> dict
 
@@ -33,7 +38,7 @@ class RedisClientWrapper(ICache):
             'success': success
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def extract(self, key):
         # type: (str) -> dict
 
@@ -45,7 +50,7 @@ class RedisClientWrapper(ICache):
             'result': result
         }
 
-    @make_deferred
+    @make_deferred(pool='read')
     def get(self, key):
         # type: (str) -> dict
 
@@ -53,7 +58,7 @@ class RedisClientWrapper(ICache):
             'result': self.client.get(key)
         }
 
-    @make_deferred
+    @make_deferred(pool='read')
     def has(self, key):
         # type: (str) -> dict
 
@@ -61,7 +66,7 @@ class RedisClientWrapper(ICache):
             'has': self.client.exists(key)
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def touch(self, keys):
         # type: (Union[List[str], str]) -> dict
         if isinstance(keys, list):
@@ -73,7 +78,7 @@ class RedisClientWrapper(ICache):
             'touched': count
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def forget(self, keys):
         # type: (Union[List[str], str]) -> dict
         if isinstance(keys, list):
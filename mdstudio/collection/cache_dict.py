@@ -59,7 +59,7 @@ class CacheDict(OrderedDict):
 
         with self.lock:
             n = time.time()
-            for k,v in self.items():
-                if (n - v[1]) > self.max_age:
-                    del v
+            for k in list(self.keys()):
+                if (n - OrderedDict.__getitem__(self, k)[1]) >= self.max_age:
+                    OrderedDict.__delitem__(self, k)
 
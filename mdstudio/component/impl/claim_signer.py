@@ -0,0 +1,118 @@
+# coding=utf-8
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from autobahn.wamp import ApplicationError
+from twisted.internet.defer import Deferred, maybeDeferred
+
+from mdstudio.logging.logger import Logger
+
+
+class ClaimSigner(object):
+    """
+    Signs claims at the auth component, where the claims that are issued in the same reactor tick
+    (or within `window` seconds) are gathered into a single batched sign request, and the signed
+    claims are dispatched back to their callers in order.
+
+    A single pending claim is signed with the regular sign endpoint. When the auth component does not
+    provide the batch endpoint, the signer falls back to concurrent single sign requests.
+    """
+
+    _logger = Logger()
+
+    sign_uri = u'mdstudio.auth.endpoint.sign'
+    sign_batch_uri = u'mdstudio.auth.endpoint.sign_batch'
+
+    def __init__(self, call, clock=None, window=0, max_batch_size=100):
+        # type: (Callable[..., Deferred], Optional[Any], float, int) -> None
+        assert max_batch_size > 0
+
+        if clock is None:
+            from twisted.internet import reactor
+            clock = reactor
+
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.batching = True
+
+        self.batches = 0
+        self.claims = 0
+        self.max_size = 0
+        self.round_trips = 0
+
+        self._call = call
+        self._clock = clock
+        self._pending = []  # type: List[Tuple[dict, Deferred]]
+        self._flush_call = None
+
+    def sign(self, claims):
+        # type: (dict) -> Deferred
+        d = Deferred()
+        self._pending.append((claims, d))
+
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = self._clock.callLater(self.window, self.flush)
+
+        return d
+
+    def flush(self):
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        self.batches += 1
+        self.claims += len(pending)
+        self.max_size = max(self.max_size, len(pending))
+
+        if len(pending) == 1 or not self.batching:
+            self._sign_each(pending)
+        else:
+            self._sign_batch(pending)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Any]
+        return {
+            'batches': self.batches,
+            'claims': self.claims,
+            'maxBatchSize': self.max_size,
+            'averageBatchSize': float(self.claims) / self.batches if self.batches else 0.0,
+            'roundTrips': self.round_trips,
+            'batching': self.batching
+        }
+
+    def _sign_batch(self, pending):
+        # type: (List[Tuple[dict, Deferred]]) -> None
+        self.round_trips += 1
+
+        def dispatch(signed):
+            if not isinstance(signed, list) or len(signed) != len(pending):
+                raise ApplicationError(u'mdstudio.error', 'Received {} signed claims for {} claims'.format(
+                    len(signed) if isinstance(signed, list) else None, len(pending)))
+            for (_, d), signed_claims in zip(pending, signed):
+                d.callback(signed_claims)
+
+        def failed(failure):
+            if failure.check(ApplicationError) and failure.value.error == ApplicationError.NO_SUCH_PROCEDURE:
+                self._logger.info('Batched claim signing is not supported, signing claims separately')
+                self.batching = False
+                self._sign_each(pending)
+            else:
+                for _, d in pending:
+                    if not d.called:
+                        d.errback(failure)
+
+        maybeDeferred(self._call, self.sign_batch_uri, [claims for claims, _ in pending]) \
+            .addCallback(dispatch).addErrback(failed)
+
+    def _sign_each(self, pending):
+        # type: (List[Tuple[dict, Deferred]]) -> None
+        for claims, d in pending:
+            self.round_trips += 1
+            maybeDeferred(self._call, self.sign_uri, claims).chainDeferred(d)
@@ -3,23 +3,25 @@ import json
 import os
 import re
 from collections import OrderedDict
-from copy import deepcopy
-from hashlib import sha512
+from hashlib import sha512, sha256
 
 import yaml
 from autobahn.twisted.wamp import ApplicationSession
 from autobahn.wamp import PublishOptions, ApplicationError
 from autobahn.wamp.request import Publication
+from twisted.internet.defer import DeferredSemaphore
 from twisted.python.failure import Failure
 
 from mdstudio.api.api_result import APIResult
 from mdstudio.api.context import UserContext, GroupRoleContext, GroupContext
-from mdstudio.api.converter import convert_obj_to_json
 from mdstudio.api.exception import CallException
-from mdstudio.api.request_hash import request_hash
-from mdstudio.api.schema import validate_json_schema
+from mdstudio.api.request_hash import canonical_request
+from mdstudio.api.schema import validate_json_schema, ISchema
 from mdstudio.collection import merge_dicts, dict_property
+from mdstudio.component.impl.claim_signer import ClaimSigner
+from mdstudio.component.impl.startup_timeline import StartupTimeline
 from mdstudio.deferred.chainable import chainable, Chainable
+from mdstudio.deferred.gather import gather
 from mdstudio.deferred.return_value import return_value
 from mdstudio.logging.impl.session_observer import SessionLogObserver
 from mdstudio.logging.log_type import LogType
@@ -54,25 +56,34 @@ class CommonSession(ApplicationSession):
                 'settings': self.settings
             }
 
+    # the maximum number of endpoints of which the schemas are flattened or that are registered at the same time
+    startup_concurrency = 16
+
     def __init__(self, config=None):
         self.log = Logger(namespace=self.__class__.__name__)
         self.log_type = LogType.User
         self.default_call_context = None
+        self.startup_timeline = StartupTimeline()
 
         self.component_config = self.Config()
         self.function_scopes = self.extract_custom_scopes()  # @todo: register these
-        self.load_environment(self.session_env_mapping, attribute='session')
 
-        self.load_settings()
+        with self.startup_timeline.phase('load_settings'):
+            self.load_environment(self.session_env_mapping, attribute='session')
+            self.load_settings()
 
         self.pre_init()
 
         self.log_collector = SessionLogObserver(self, self.log_type)
 
+        # claims that are issued in the same reactor tick are signed in a single round trip
+        self.claim_signer = ClaimSigner(lambda uri, claims: super(CommonSession, self).call(uri, claims))
+
         super(CommonSession, self).__init__(config)
 
         # load config from env/file, check with schema
-        self.validate_settings()
+        with self.startup_timeline.phase('validate_settings'):
+            self.validate_settings()
 
         if config:
             config.realm = u'{}'.format(self.component_config.session.realm)
@@ -129,12 +140,9 @@ class CommonSession(ApplicationSession):
         claims['uri'] = procedure
         claims['action'] = 'call'
 
-        request = deepcopy(request)
-        convert_obj_to_json(request)
-
-        claims['requestHash'] = request_hash(request)
+        request, claims['requestHash'] = canonical_request(request)
 
-        signed_claims = yield super(CommonSession, self).call(u'mdstudio.auth.endpoint.sign', claims)
+        signed_claims = yield self.claim_signer.sign(claims)
 
         if signed_claims is None:
             claims.pop('requestHash')
@@ -149,7 +157,7 @@ class CommonSession(ApplicationSession):
             result = APIResult(error='Call to {uri} failed'.format(uri=procedure))
 
         if 'expired' in result:
-            signed_claims = yield super(CommonSession, self).call(u'mdstudio.auth.endpoint.sign', claims)
+            signed_claims = yield self.claim_signer.sign(claims)
 
             try:
                 result = yield make_original_call()
@@ -173,7 +181,7 @@ class CommonSession(ApplicationSession):
             context = self.default_call_context
         claims = context.get_claims(claims)
 
-        signed_claims = yield super(CommonSession, self).call(u'mdstudio.auth.endpoint.sign', claims)
+        signed_claims = yield self.claim_signer.sign(claims)
 
         options = options or PublishOptions(acknowledge=True, exclude_me=False)
 
@@ -206,32 +214,21 @@ class CommonSession(ApplicationSession):
 
     @chainable
     def _on_join(self):
-        yield self.upload_schemas()
+        yield self.startup_timeline.run('upload_schemas', self.upload_schemas)
 
-        yield self.on_run()
+        yield self.startup_timeline.run('on_run', self.on_run)
 
-        yield self.log_collector.start_flushing(self)
+        yield self.startup_timeline.run('log_flush', self.log_collector.start_flushing, self)
 
     @chainable
     def on_join(self):
-        failures = 0
-        successful = 0
-
+        self.startup_timeline.start('register')
         registrations = yield self.register(self)
-        for _, endpoint in self.__class__.__dict__.items():
-            from mdstudio.api.endpoint import WampEndpoint
-            if isinstance(endpoint, WampEndpoint):
-                yield endpoint.input_schema.flatten(self)
-                yield endpoint.output_schema.flatten(self)
-                for s in endpoint.claim_schemas:
-                    yield s.flatten(self)
-
-                endpoint.set_instance(self)
-                try:
-                    yield endpoint.register()
-                    successful += 1
-                except:
-                    failures += 1
+        registered = yield self.register_endpoints()
+        self.startup_timeline.stop('register')
+
+        successful = registered.count(True)
+        failures = registered.count(False)
 
         yield self._on_join()
 
@@ -249,9 +246,32 @@ class CommonSession(ApplicationSession):
         self.log.info("{class_name}: {procedures} procedures successfully registered",
                       procedures=successful, class_name=self.class_name())
 
+    @chainable
+    def register_endpoints(self):
+        from mdstudio.api.endpoint import WampEndpoint
+        endpoints = [endpoint for endpoint in self.__class__.__dict__.values() if isinstance(endpoint, WampEndpoint)]
+        semaphore = DeferredSemaphore(self.startup_concurrency)
+
+        def register(endpoint):
+            # the schemas were flattened by flatten_endpoint_schemas on join
+            try:
+                endpoint.compile_validators()
+            except NotImplementedError:
+                # schemas that could not be retrieved fail on the first validation instead
+                pass
+
+            endpoint.set_instance(self)
+            return endpoint.register()
+
+        # returns for each endpoint whether it was registered
+        registered = yield gather([semaphore.run(register, endpoint).addCallbacks(lambda _: True, lambda _: False)
+                                   for endpoint in endpoints])
+        return_value(registered)
+
     @chainable
     def onJoin(self, details):
-        yield self.flatten_endpoint_schemas()
+        ISchema.cache.path = self.schema_cache_path()
+        yield self.startup_timeline.run('flatten', self.flatten_endpoint_schemas)
 
         # Update session config, they may have been changed by the application authentication method
         for var, details_var in self.session_update_vars.items():
@@ -259,6 +279,17 @@ class CommonSession(ApplicationSession):
 
         yield self.on_join()
 
+        self.log.info('{class_name} came online in {total:.3f}s ({phases})', class_name=self.class_name(),
+                      total=self.startup_timeline.total, phases=self.startup_timeline.summary())
+
+        # lets the components waiting for this one continue, without them having to poll its status
+        self.event(self.online_topic(self.component_config.static.vendor, self.component_config.static.component))
+
+    @staticmethod
+    def online_topic(vendor, component):
+        # type: (str, str) -> str
+        return u'{}.{}.event.online'.format(vendor, component)
+
     # @chainable
     # def on_leave(self, details):
     #     self.log.info('{class_name} is leaving realm {realm}', class_name=self.class_name(),
@@ -326,64 +357,121 @@ class CommonSession(ApplicationSession):
 
     @chainable
     def upload_schemas(self):
+        files = {
+            'endpoints': self._schema_files('endpoints'),
+            'resources': self._schema_files('resources')
+        }
+
+        if not (files['endpoints'] or files['resources']):
+            return
+
+        context = self.group_context(self.component_config.static.vendor)
+
+        # the schema service tells which schemas it already has, so only new or changed schemas are uploaded
+        try:
+            known = yield context.call(u'mdstudio.schema.endpoint.known', {
+                'component': self.component_config.static.component,
+                'hashes': [f['hash'] for f in files['endpoints'] + files['resources']]
+            }, claims={'vendor': self.component_config.static.vendor})
+        except CallException:
+            # the schema service does not keep the schema hashes, so everything is uploaded without them
+            known = None
+
+        known_hashes = set(known['hashes']) if known is not None else set()
         schemas = {
-            'endpoints': self._collect_schemas('endpoints'),
-            'resources': self._collect_schemas('resources')
+            sub_path: [self._schema_entry(f, with_hash=known is not None) for f in sub_files if f['hash'] not in known_hashes]
+            for sub_path, sub_files in files.items()
         }
 
-        if schemas['endpoints'] or schemas['resources']:
-            try:
-                yield self.group_context(self.component_config.static.vendor).call(u'mdstudio.schema.endpoint.upload', {
-                    'component': self.component_config.static.component,
-                    'schemas': schemas
-                }, claims={'vendor': self.component_config.static.vendor})
-            except CallException as e:
-                self.log.error('Error during schema uploading: {message}', message=str(e))
-            else:
-                self.log.info('Uploaded schemas for {package}', package=self.class_name())
+        if not (schemas['endpoints'] or schemas['resources']):
+            self.log.info('Schemas for {package} are up to date', package=self.class_name())
+            return
+
+        try:
+            yield context.call(u'mdstudio.schema.endpoint.upload', {
+                'component': self.component_config.static.component,
+                'schemas': schemas
+            }, claims={'vendor': self.component_config.static.vendor})
+        except CallException as e:
+            self.log.error('Error during schema uploading: {message}', message=str(e))
+        else:
+            self.log.info('Uploaded {count} schemas for {package}', count=len(schemas['endpoints']) + len(schemas['resources']),
+                          package=self.class_name())
 
     def _collect_schemas(self, *sub_paths):
-        schemas = []
+        return [self._schema_entry(f) for f in self._schema_files(*sub_paths)]
+
+    def _schema_files(self, *sub_paths):
+        files = []
         root_dir = os.path.join(self.component_schemas_path(), *sub_paths)
 
         if os.path.isdir(root_dir):
-            for root, dirs, files in os.walk(root_dir):
-                if files:
-                    for file in files:
-                        path = os.path.join(root, file)
-                        rel_path = os.path.relpath(path, root_dir).replace('\\', '/')
-                        path_decomposition = re.match('(.*?)\\.?(v\\d+)?\\.json', rel_path)
-
-                        with open(path, 'r') as f:
-                            schema_entry = {
-                                'schema': json.load(f),
-                                'name': path_decomposition.group(1)
-                            }
+            for root, dirs, file_names in os.walk(root_dir):
+                for file_name in file_names:
+                    path = os.path.join(root, file_name)
+                    rel_path = os.path.relpath(path, root_dir).replace('\\', '/')
+                    path_decomposition = re.match('(.*?)\\.?(v\\d+)?\\.json', rel_path)
+
+                    with open(path, 'rb') as f:
+                        data = f.read()
+
+                    schema_file = {
+                        'name': path_decomposition.group(1),
+                        'data': data,
+                        # the hash covers the location of the schema, so a moved schema is uploaded again
+                        'hash': sha256('/'.join(sub_paths + (rel_path,)).encode('utf-8') + b'\0' + data).hexdigest()
+                    }
+
+                    if path_decomposition.group(2):
+                        schema_file['version'] = int(path_decomposition.group(2).strip('v'))
+
+                    files.append(schema_file)
+
+        return files
+
+    @staticmethod
+    def _schema_entry(schema_file, with_hash=False):
+        schema_entry = {
+            'schema': json.loads(schema_file['data'].decode('utf-8')),
+            'name': schema_file['name']
+        }
 
-                        if path_decomposition.group(2):
-                            schema_entry['version'] = int(path_decomposition.group(2).strip('v'))
+        if 'version' in schema_file:
+            schema_entry['version'] = schema_file['version']
 
-                        schemas.append(schema_entry)
+        if with_hash:
+            schema_entry['hash'] = schema_file['hash']
 
-        return schemas
+        return schema_entry
 
     @chainable
     def flatten_endpoint_schemas(self):
-        # Scan for input/output schemas on registrations
+        # Scan for input/output schemas on registrations, where each schema is flattened once
+        schemas = OrderedDict()
         for key, f in self.__class__.__dict__.items():
             func = getattr(self, key)
+            found = [getattr(func, attribute, None) for attribute in ['input_schema', 'output_schema', 'claims_schema']]
+            claim_schemas = getattr(func, 'claim_schemas', None)
+            if isinstance(claim_schemas, list):
+                found.extend(claim_schemas)
+
+            for schema in found:
+                if schema is not None:
+                    schemas[id(schema)] = schema
+
+        # the schemas are independent, so they are flattened concurrently
+        semaphore = DeferredSemaphore(self.startup_concurrency)
+
+        # the semaphore is taken here, since DeferredSemaphore.run does not wait for the chainable flatten
+        @chainable
+        def flatten(schema):
+            yield semaphore.acquire()
             try:
-                yield func.input_schema.flatten(self)
-            except AttributeError:
-                pass
-            try:
-                yield func.output_schema.flatten(self)
-            except AttributeError:
-                pass
-            try:
-                yield func.claims_schema.flatten(self)
-            except AttributeError:
-                pass
+                yield schema.flatten(self)
+            finally:
+                semaphore.release()
+
+        yield gather([flatten(schema) for schema in schemas.values()])
 
     # @todo
     @chainable
@@ -453,6 +541,11 @@ class CommonSession(ApplicationSession):
     def environments(cls):
         return os.getenv('MD_CONFIG_ENVIRONMENTS', '').split(',')
 
+    @classmethod
+    def schema_cache_path(cls):
+        # an empty MDSTUDIO_SCHEMA_CACHE disables persisting the flattened schemas
+        return os.getenv('MDSTUDIO_SCHEMA_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'mdstudio', 'schemas')) or None
+
     @classmethod
     def settings_schemas(cls):
         return [os.path.join(cls.component_schemas_path(), 'settings.json'),
@@ -1,4 +1,6 @@
 from autobahn.wamp import auth
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, succeed
 
 from mdstudio.api.exception import CallException
 from mdstudio.cache.session_cache import SessionCacheWrapper
@@ -6,8 +8,8 @@ from mdstudio.component.impl.common import CommonSession
 from mdstudio.db.connection_type import ConnectionType
 from mdstudio.db.session_database import SessionDatabaseWrapper
 from mdstudio.deferred.chainable import chainable
+from mdstudio.deferred.gather import gather
 from mdstudio.deferred.return_value import return_value
-from mdstudio.deferred.sleep import sleep
 from mdstudio.logging.log_type import LogType
 from mdstudio.logging.logger import Logger
 
@@ -16,41 +18,81 @@ class CoreComponentSession(CommonSession):
     class ComponentWaiter(object):
         log = Logger()
 
-        def __init__(self, session, component, context=None):
+        # the status is polled as a fallback for missed online events, where the interval between the polls
+        # starts at `min_interval` and doubles after each poll up to `max_interval`
+        min_interval = 0.1
+        max_interval = 5.0
+
+        def __init__(self, session, component, context=None, clock=None):
             # type: (CoreComponentSession, str) -> None
             self.session = session
             self.component = component
             self.context = context
+            self.clock = clock or reactor
+            self._online = Deferred()
 
         @chainable
         def wait(self):
-            online = False
-            tried = False
+            # subscribed before the first status call, so the component cannot come online unnoticed in between
+            try:
+                subscription = yield self.session.on_event(self._on_online, self.session.online_topic(u'mdstudio', self.component))
+            except Exception as e:
+                self.log.warn('Failed to subscribe to online events of {component}, falling back to polling: {exc}',
+                              component=self.component, exc=e)
+                subscription = None
 
-            def status_call():
-                return self.session.call('mdstudio.auth.endpoint.ring0.get-status', {'component': self.component}, context=self.context)
+            try:
+                online = yield self._status(quiet=True)
+                if not online:
+                    self.log.info('{waiter} is waiting for {waitee}', waiter=self.session.class_name(), waitee=self.component)
+
+                    interval = self.min_interval
+                    while not online:
+                        online = yield self._wait_online(interval)
+                        if not online:
+                            online = yield self._status()
+                        interval = min(interval * 2, self.max_interval)
+
+                    self.log.info('{waitee} is now online, continuing '
+                                  'execution for {waiter}', waitee=self.component, waiter=self.session.class_name())
+            finally:
+                if subscription is not None:
+                    yield subscription.unsubscribe()
 
+        @chainable
+        def _status(self, quiet=False):
             try:
-                online = yield status_call()
-            except:
-                self.log.info('{waiter} is waiting for {waitee}', waiter=self.session.class_name(), waitee=self.component)
-                tried = True
-
-            while not online:
-                try:
-                    online = yield status_call()
-                except CallException:
-                    yield sleep(0.1)
-                except Exception as e:
+                online = yield self.session.call('mdstudio.auth.endpoint.ring0.get-status', {'component': self.component}, context=self.context)
+            except CallException:
+                online = False
+            except Exception as e:
+                if not quiet:
                     self.log.error('Component {component} not online, and caught '
                                    'unrecognized exception {exc}.', component=self.component, exc=e)
-                    yield sleep(1)
-                else:
-                    yield sleep(0.1)
+                online = False
+
+            return_value(online)
+
+        def _wait_online(self, interval):
+            # fires with True as soon as the component publishes it came online, or with False after `interval` seconds
+            if self._online.called:
+                return succeed(True)
+
+            d = Deferred()
+            timeout = self.clock.callLater(interval, d.callback, False)
+
+            def online(result):
+                if timeout.active():
+                    timeout.cancel()
+                    d.callback(True)
+                return result
+
+            self._online.addCallback(online)
+            return d
 
-            if tried:
-                self.log.info('{waitee} is now online, continuing '
-                              'execution for {waiter}', waitee=self.component, waiter=self.session.class_name())
+        def _on_online(self, *args, **kwargs):
+            if not self._online.called:
+                self._online.callback(True)
 
     def __init__(self, config=None):
         self.component_waiters = []
@@ -83,8 +125,9 @@ class CoreComponentSession(CommonSession):
     def _on_join(self):
         print('{} is waiting for {}'.format(self.class_name(), [waiter.component for waiter in self.component_waiters]))
 
-        for waiter in self.component_waiters:
-            yield waiter.wait()
+        self.startup_timeline.start('waiters')
+        yield gather([waiter.wait() for waiter in self.component_waiters])
+        self.startup_timeline.stop('waiters')
 
         yield super(CoreComponentSession, self)._on_join()
 
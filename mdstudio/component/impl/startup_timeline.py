@@ -0,0 +1,73 @@
+# coding=utf-8
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+from twisted.internet.defer import Deferred, maybeDeferred
+
+
+class StartupTimeline(object):
+    """
+    Records how long each startup phase of a session took, relative to the creation of the timeline,
+    so it can be found out why a component takes long to come online. A phase that runs more than
+    once (e.g. on a rejoin) keeps its last timing.
+    """
+
+    def __init__(self, clock=time.time):
+        # type: (Callable[[], float]) -> None
+        self._clock = clock
+        self.started = clock()
+        # phase -> [start, end], in the order the phases started
+        self._phases = OrderedDict()
+
+    def start(self, name):
+        # type: (str) -> None
+        self._phases.pop(name, None)
+        self._phases[name] = [self._clock(), None]
+
+    def stop(self, name):
+        # type: (str) -> None
+        if name in self._phases:
+            self._phases[name][1] = self._clock()
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def run(self, name, f, *args, **kwargs):
+        # type: (str, Callable[..., Any], *Any, **Any) -> Deferred
+        """
+        Runs `f` as the phase `name`, where the phase ends when the deferred returned by `f` fires.
+        """
+        self.start(name)
+
+        def stop(result):
+            self.stop(name)
+            return result
+
+        return maybeDeferred(f, *args, **kwargs).addBoth(stop)
+
+    @property
+    def phases(self):
+        # type: () -> List[Dict[str, Any]]
+        return [{
+            'phase': name,
+            'start': start - self.started,
+            'duration': end - start if end is not None else None
+        } for name, (start, end) in self._phases.items()]
+
+    @property
+    def total(self):
+        # type: () -> float
+        ends = [end for _, end in self._phases.values() if end is not None]
+        return max(ends) - self.started if ends else 0.0
+
+    def summary(self):
+        # type: () -> str
+        return ', '.join('{}: {}'.format(p['phase'], '{:.3f}s'.format(p['duration']) if p['duration'] is not None else 'running')
+                         for p in self.phases)
@@ -0,0 +1,66 @@
+# coding=utf-8
+from threading import Lock
+from typing import Any, Callable, List, Optional, TypeVar
+
+from twisted.internet import reactor
+
+T = TypeVar('T')
+
+
+class CryptoPool(object):
+    """
+    Encrypts or decrypts batches of documents on a pool of worker threads.
+
+    Fernet spends most of its time in OpenSSL, which releases the GIL, so batches of at least
+    `threshold` documents are split in chunks of `chunk_size` that are processed in parallel.
+    The results are returned in the order of the documents. Smaller batches are processed in
+    the calling thread, and `workers=0` disables the pool. After shutdown, everything is processed in
+    the calling thread as well.
+    """
+
+    def __init__(self, threshold=256, chunk_size=64, workers=None):
+        # type: (int, int, Optional[int]) -> None
+        assert chunk_size > 0
+
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+        self._lock = Lock()
+        self._executor = None
+        self._closed = False
+
+    def map(self, func, documents):
+        # type: (Callable[[Any], T], List[Any]) -> List[T]
+        executor = None
+        if self.workers != 0 and len(documents) >= self.threshold:
+            executor = self._get_executor()
+
+        if executor is not None:
+            chunks = [documents[i:i + self.chunk_size] for i in range(0, len(documents), self.chunk_size)]
+            try:
+                results = executor.map(lambda chunk: [func(document) for document in chunk], chunks)
+            except RuntimeError:
+                # the executor was shut down in the meantime
+                pass
+            else:
+                return [result for chunk in results for result in chunk]
+
+        return [func(document) for document in documents]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._closed = True
+        if executor is not None:
+            executor.shutdown()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and not self._closed:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                # the executor is created on a database thread, while the reactor is not thread safe
+                # noinspection PyUnresolvedReferences
+                reactor.callFromThread(reactor.addSystemEventTrigger, 'during', 'shutdown', self.shutdown)
+            return self._executor
@@ -6,7 +6,7 @@ from asq.initiators import query
 from asq.queryables import Queryable
 from twisted.internet.defer import succeed
 
-from mdstudio.db.fields import Fields
+from mdstudio.db.fields import Fields, LazyDecryptedDocument
 from mdstudio.deferred.chainable import chainable, Chainable
 from mdstudio.deferred.return_value import return_value
 
@@ -34,6 +34,9 @@ class Cursor:
     # type: Fields
     _fields = None
 
+    # type: int
+    _batch_size = None
+
     def __init__(self, wrapper, response, fields=None):
         self.wrapper = wrapper
         self._id = response.get('cursorId', None)
@@ -91,6 +94,24 @@ class Cursor:
             o = yield o
             func(o)
 
+    def batch_size(self, size):
+        # type: (int) -> Cursor
+        """
+        Sets the number of documents that are fetched for each following batch
+        """
+        self._batch_size = size
+        return self
+
+    @staticmethod
+    def decrypt_fields(document):
+        # type: (Union[dict, LazyDecryptedDocument]) -> dict
+        """
+        Decrypts the fields a lazily decrypting database left encrypted, and returns the plain document
+        """
+        if isinstance(document, LazyDecryptedDocument):
+            return document.decrypt_all()
+        return document
+
     def query(self):
         # type: () -> Queryable
         return self.to_list().addCallback(lambda l: query(l))
@@ -121,7 +142,10 @@ class Cursor:
 
     @chainable
     def _refresh(self):
-        more = yield self.wrapper.more(cursor_id=self._id)
+        if self._batch_size:
+            more = yield self.wrapper.more(cursor_id=self._id, batch_size=self._batch_size)
+        else:
+            more = yield self.wrapper.more(cursor_id=self._id)
         self._id = more.get('cursorId', None)
         last_entry = self._data.popleft()
         if self._fields:
@@ -30,8 +30,8 @@ IndexKeys = Union[List[Tuple[str, SortMode]], Tuple[str, SortMode]]
 class IDatabase(object):
 
     @abc.abstractmethod
-    def more(self, cursor_id):
-        # type: (str) -> Any
+    def more(self, cursor_id, batch_size=None):
+        # type: (str, Optional[int]) -> Any
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -75,8 +75,9 @@ class IDatabase(object):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None):
-        # type: (CollectionType, DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields]) -> Any
+    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None,
+                  batch_size=None, batch_bytes=None):
+        # type: (CollectionType, DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields], Optional[int], Optional[int]) -> Any
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -102,8 +103,8 @@ class IDatabase(object):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def aggregate(self, collection, pipeline):
-        # type: (CollectionType, List[AggregationOperator]) -> Any
+    def aggregate(self, collection, pipeline, batch_size=None, batch_bytes=None):
+        # type: (CollectionType, List[AggregationOperator], Optional[int], Optional[int]) -> Any
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -116,6 +117,11 @@ class IDatabase(object):
         # type: (CollectionType, DocumentType, Optional[Fields]) -> Any
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def bulk_write(self, collection, requests, ordered=True, fields=None):
+        # type: (CollectionType, List[Dict[str, DocumentType]], bool, Optional[Fields]) -> Any
+        raise NotImplementedError
+
     @abc.abstractmethod
     def create_indexes(self, collection, indices):
         # type: (CollectionType, List[Index]) -> Any
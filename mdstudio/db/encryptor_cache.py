@@ -0,0 +1,90 @@
+# coding=utf-8
+import json
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Callable, Dict, Optional
+
+
+class EncryptorCache(object):
+    """
+    Caches the encryptors created from the keys of a key repository, so the key is not looked up
+    and the encryptor is not rebuilt for every call on an encrypted collection.
+
+    The encryptors are keyed by the repository and the claims that identify the key owner, where
+    the claims that differ for every request (e.g. the request hash) are ignored. Entries expire
+    after `ttl` seconds, and the least recently used entries are evicted above `max_size`. When
+    a key is rotated, `invalidate` drops the encryptors that were created with the old key.
+    """
+
+    # claims that are set per request, and do not influence the key
+    volatile_claims = frozenset(['requestHash', 'uri', 'action', 'exp', 'iat', 'nbf', 'jti'])
+
+    def __init__(self, ttl=5 * 60, max_size=1000):
+        # type: (float, int) -> None
+        assert max_size > 0
+
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = RLock()
+        # cache key -> (repository, claims, encryptor, expiry time), ordered from least to most recently used
+        self._entries = OrderedDict()
+
+    def get(self, repository, claims, create):
+        # type: (Any, dict, Callable[[], Any]) -> Any
+        key = self._key(repository, claims)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] is repository and entry[3] > time.time():
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        # the encryptor is created outside the lock, since the key lookup may be remote
+        encryptor = create()
+
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_size:
+                self._entries.popitem(last=False)
+            self._entries[key] = (repository, claims, encryptor, time.time() + self.ttl)
+
+        return encryptor
+
+    def invalidate(self, claims=None, repository=None):
+        # type: (Optional[dict], Optional[Any]) -> int
+        """
+        Drops the cached encryptors of the key owner identified by `claims` and/or of `repository`,
+        or all of them when neither is given. Returns the number of dropped encryptors.
+        """
+        identity = self._identity(claims) if claims is not None else None
+        with self._lock:
+            keys = [key for key, entry in self._entries.items()
+                    if (identity is None or key[1] == identity) and (repository is None or entry[0] is repository)]
+            for key in keys:
+                del self._entries[key]
+
+        return len(keys)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries)
+            }
+
+    def _key(self, repository, claims):
+        return id(repository), self._identity(claims)
+
+    def _identity(self, claims):
+        # type: (dict) -> str
+        return json.dumps({key: value for key, value in claims.items() if key not in self.volatile_claims},
+                          sort_keys=True, default=str)
@@ -0,0 +1,141 @@
+# coding=utf-8
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import sys
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from twisted.internet import reactor
+
+
+def derive_hash(value, iterations=50000):
+    # type: (bytes, int) -> str
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=hashlib.sha512(value).digest(),
+        iterations=iterations,
+        backend=default_backend()
+    )
+    return base64.urlsafe_b64encode(kdf.derive(value)).decode('utf-8')
+
+
+class FieldHasher(object):
+    """
+    Derives the PBKDF2 hashes of hashed fields.
+
+    The derived hashes are memoized in a bounded LRU memo, so repeated values (e.g. the email in
+    the filter of a lookup) are only derived once. The memo is keyed by an HMAC of the value with
+    a per process secret, so no plaintext is kept. Values that are not memoized are derived in a
+    process pool when there are at least `min_parallel` of them, so large batches are hashed on
+    all cores. The pool is created on first use, and `processes=0` derives everything in process.
+    The workers are spawned rather than forked, since forking a process that already runs the
+    reactor and thread pools can leave the workers deadlocked on locks held by those threads. On
+    python versions that cannot spawn the workers, and after shutdown, everything is derived in
+    process.
+    """
+
+    def __init__(self, processes=None, memo_size=10000, min_parallel=2):
+        # type: (Optional[int], int, int) -> None
+        self.processes = processes
+        self.memo_size = memo_size
+        self.min_parallel = min_parallel
+
+        self.hits = 0
+        self.misses = 0
+
+        self._secret = os.urandom(32)
+        self._lock = Lock()
+        # keyed digest -> derived hash, ordered from least to most recently used
+        self._memo = OrderedDict()
+        self._pool = None
+        self._closed = False
+
+    def derive(self, values):
+        # type: (List[bytes]) -> List[str]
+        digests = [self._digest(value) for value in values]
+
+        results = {}
+        missing = OrderedDict()
+        with self._lock:
+            for digest, value in zip(digests, values):
+                if digest in results or digest in missing:
+                    continue
+                derived = self._memo.pop(digest, None)
+                if derived is not None:
+                    self._memo[digest] = derived
+                    results[digest] = derived
+                    self.hits += 1
+                else:
+                    missing[digest] = value
+                    self.misses += 1
+
+        if missing:
+            derived = self._map(list(missing.values()))
+            with self._lock:
+                for digest, value in zip(missing.keys(), derived):
+                    self._memo.pop(digest, None)
+                    if len(self._memo) >= self.memo_size > 0:
+                        self._memo.popitem(last=False)
+                    if self.memo_size > 0:
+                        self._memo[digest] = value
+                    results[digest] = value
+
+        return [results[digest] for digest in digests]
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._closed = True
+        if pool is not None:
+            pool.shutdown()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._memo)
+            }
+
+    def _map(self, values):
+        # type: (List[bytes]) -> List[str]
+        pool = None
+        if self.processes != 0 and len(values) >= self.min_parallel:
+            pool = self._get_pool()
+
+        if pool is not None:
+            try:
+                return list(pool.map(derive_hash, values))
+            except RuntimeError:
+                # the pool was shut down in the meantime
+                pass
+
+        return [derive_hash(value) for value in values]
+
+    def _get_pool(self):
+        # ProcessPoolExecutor only takes the start method since python 3.7
+        if sys.version_info < (3, 7):
+            return None
+
+        with self._lock:
+            if self._pool is None and not self._closed:
+                from concurrent.futures import ProcessPoolExecutor
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+                # the pool is created on a database thread, while the reactor is not thread safe
+                # noinspection PyUnresolvedReferences
+                reactor.callFromThread(reactor.addSystemEventTrigger, 'during', 'shutdown', self.shutdown)
+            return self._pool
+
+    def _digest(self, value):
+        # type: (bytes) -> bytes
+        return hmac.new(self._secret, value, hashlib.sha256).digest()
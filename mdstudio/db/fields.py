@@ -1,20 +1,21 @@
 import collections
 import datetime
-from typing import List, Callable, Optional, Union, Iterable, Mapping
+from typing import Any, List, Callable, Optional, Union, Iterable, Mapping, Sequence, Tuple
 
-import base64
-import hashlib
 import pytz
 import six
-from copy import deepcopy
-
-import six
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
 
+from mdstudio.db.crypto_pool import CryptoPool
+from mdstudio.db.encryptor_cache import EncryptorCache
 from mdstudio.db.exception import DatabaseException
+from mdstudio.db.field_hasher import FieldHasher
 from mdstudio.utc import from_utc_string, from_date_string
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 
 def timestamp_properties(prefixes=None):
     suffixes = ['createdAt', 'updatedAt', 'deletedAt']
@@ -58,6 +59,25 @@ class Fields(object):
     _key_repository = None
     _encrypted_prefix = '__encrypted__'
 
+    # the encryptors are shared by all instances, since the fields are recreated for every request
+    encryptor_cache = EncryptorCache()
+
+    # derives the hashes of the hashed fields, replace it to configure the process pool and memo
+    hasher = FieldHasher()
+
+    # encrypts and decrypts large batches of documents in parallel
+    crypto_pool = CryptoPool()
+
+    _conversion_operators = frozenset(['$eq', '$gt', '$gte', '$in', '$lt', '$lte', '$ne', '$nin',
+                                       '$and', '$not', '$nor', '$or',
+                                       '$all', '$elemMatch',
+                                       '$set', '$setOnInsert',
+                                       '$addToSet', '$pull', '$push',
+                                       '$each'])
+
+    # the maximum number of compiled field path plans kept per instance
+    _max_plans = 128
+
     def __init__(self, date_times=None, dates=None, encrypted=None, hashed=None, key_repository=None):
         # type: (Optional[Union[List[str],str]], Optional[Union[List[str],str]], Optional[Union[List[str],str]], Optional[Union[List[str],str]], Optional[KeyRepository]) -> None
         if date_times and not isinstance(date_times, list):
@@ -75,6 +95,7 @@ class Fields(object):
         self.hashed = hashed if hashed else self.hashed
 
         self._key_repository = key_repository
+        self._plans = {}
 
     def __eq__(self, other):
         # type: (Fields) -> bool
@@ -92,17 +113,70 @@ class Fields(object):
         # type: (dict, Optional[List[str]], Optional[dict]) -> None
         self.transform_to_object(obj, self.date_times, Fields.parse_date_time, prefixes)
         self.transform_to_object(obj, self.dates, Fields.parse_date, prefixes)
-        self.transform_to_object(obj, self.hashed, Fields.parse_hashed, prefixes)
+        self.hash_fields(obj, prefixes)
 
         if claims and self.uses_encryption:
             encryptor = self.get_encryptor(claims)
             self.transform_to_object(obj, self.encrypted, Fields.parse_encrypted, prefixes, **{'encryptor': encryptor})
 
-    def parse_result(self, obj, claims=None):
-        # type: (dict, dict) -> None
+    def encrypt_documents(self, documents, claims=None):
+        # type: (List[dict], Optional[dict]) -> None
         if claims and self.uses_encryption:
             encryptor = self.get_encryptor(claims)
-            self.transform_to_object(obj, self.encrypted, Fields.decrypt, None, **{'encryptor': encryptor})
+            self.crypto_pool.map(lambda document: self.transform_to_object(document, self.encrypted,
+                                                                           Fields.parse_encrypted, None,
+                                                                           **{'encryptor': encryptor}), documents)
+
+    def hash_fields(self, obj, prefixes=None):
+        # type: (dict, Optional[List[str]]) -> None
+        if not self.hashed:
+            return
+
+        # collect the values first, so they can be derived as one batch
+        pending = []
+        self.transform_to_object(obj, self.hashed, Fields.collect_hashed, prefixes, **{'pending': pending})
+        if pending:
+            derived = self.hasher.derive([value for _, _, value in pending])
+            for (sub, key, _), value in zip(pending, derived):
+                sub['__hashed__:{}'.format(key)] = value
+
+    def parse_result(self, obj, claims=None, lazy=False):
+        # type: (dict, dict, bool) -> Union[dict, LazyDecryptedDocument]
+        if claims and self.uses_encryption:
+            if lazy:
+                # leave the ciphertext in place, and only decrypt the fields that are actually read
+                if isinstance(obj, dict):
+                    return LazyDecryptedDocument(obj, [f.split('.') for f in self.encrypted],
+                                                 self.lazy_decryptor(claims))
+            else:
+                encryptor = self.get_encryptor(claims)
+                self.transform_to_object(obj, self.encrypted, Fields.decrypt, None, **{'encryptor': encryptor})
+        return obj
+
+    def parse_results(self, documents, claims=None, lazy=False):
+        # type: (List[dict], Optional[dict], bool) -> List[Union[dict, LazyDecryptedDocument]]
+        if lazy or not claims or not self.uses_encryption:
+            return [self.parse_result(document, claims, lazy) for document in documents]
+
+        encryptor = self.get_encryptor(claims)
+
+        def decrypt(document):
+            self.transform_to_object(document, self.encrypted, Fields.decrypt, None, **{'encryptor': encryptor})
+            return document
+
+        return self.crypto_pool.map(decrypt, documents)
+
+    def lazy_decryptor(self, claims):
+        # type: (dict) -> Callable[[Any, dict, str], Any]
+        # the key is only retrieved once the first field is decrypted
+        encryptor = []
+
+        def decrypt(val, sub, key):
+            if not encryptor:
+                encryptor.append(self.get_encryptor(claims))
+            return self.decrypt(val, sub, key, encryptor=encryptor[0])
+
+        return decrypt
 
     def is_empty(self):
         # type: () -> bool
@@ -134,23 +208,33 @@ class Fields(object):
 
     def transform_to_object(self, document, fields, parser, prefixes, **kwargs):
         # type: (dict, List[str], Callable, Optional[List[str]]) -> None
-        if prefixes is None:
-            prefixes = ['']
-
-        nfields = []
-        for f in fields:
-            for p in prefixes:
-                if p and not f.startswith('{}.'.format(p)):
-                    nfields.append('{}.{}'.format(p, f))
-                else:
-                    nfields.append(f)
-
-        for field in nfields:
-            split_fields = field.split('.')
-            self.transform_docfield_to_object(document, split_fields, parser, **kwargs)
+        for field in self._compile(fields, prefixes):
+            self.transform_docfield_to_object(document, field, parser, **kwargs)
+
+    def _compile(self, fields, prefixes):
+        # type: (List[str], Optional[List[str]]) -> List[Tuple[str, ...]]
+        # the split field paths only depend on the fields and prefixes, so they are reused for every document
+        key = (tuple(fields), tuple(prefixes) if prefixes is not None else None)
+        plan = self._plans.get(key)
+        if plan is None:
+            if prefixes is None:
+                prefixes = ['']
+
+            plan = []
+            for f in fields:
+                for p in prefixes:
+                    if p and not f.startswith('{}.'.format(p)):
+                        plan.append(tuple('{}.{}'.format(p, f).split('.')))
+                    else:
+                        plan.append(tuple(f.split('.')))
+
+            if len(self._plans) >= self._max_plans:
+                self._plans.clear()
+            self._plans[key] = plan
+        return plan
 
     def transform_docfield_to_object(self, doc, field, parser, **kwargs):
-        # type: (dict, Optional[List[str]], Callable) -> None
+        # type: (dict, Sequence[str], Callable) -> None
 
         subdoc = doc
         for i, level in enumerate(field[:-1]):
@@ -163,9 +247,8 @@ class Fields(object):
                             self.transform_docfield_to_object(val, field[i:], parser, **kwargs)
                         elif '.' in key:
                             accessor = None
-                            keys = key.split('.')
-                            nfields = deepcopy(field[i:])
-                            for vkey in deepcopy(keys):
+                            nfields = list(field[i:])
+                            for vkey in key.split('.'):
 
                                 if not nfields:
                                     break
@@ -192,7 +275,7 @@ class Fields(object):
 
         if isinstance(subdoc, dict):
             for key, val in subdoc.items():
-                if key.startswith('$') and key in self.conversion_operators:
+                if key.startswith('$') and key in self._conversion_operators:
                     self.transform_docfield_to_object(val, [field[-1]], parser, **kwargs)
 
         if subdoc is None:
@@ -210,7 +293,7 @@ class Fields(object):
             if key in subdoc:
                 if isinstance(subdoc[key], dict):
                     for dkey, val in subdoc[key].items():
-                        if dkey.startswith('$') and dkey in self.conversion_operators:
+                        if dkey.startswith('$') and dkey in self._conversion_operators:
                             subdoc[key][dkey] = parser(self, val, subdoc, key, **kwargs)
                 elif isinstance(subdoc[key], list):
                     for i, e in enumerate(subdoc[key]):
@@ -255,24 +338,18 @@ class Fields(object):
             return val
 
     def parse_hashed(self, val, sub, key, *args, **kwargs):
+        sub['__hashed__:{}'.format(key)] = self.hasher.derive([self._hash_value(val)])[0]
+        return val
+
+    def collect_hashed(self, val, sub, key, *args, **kwargs):
+        kwargs['pending'].append((sub, key, self._hash_value(val)))
+        return val
+
+    @staticmethod
+    def _hash_value(val):
         if isinstance(val, (six.text_type, str)):
-            sval = val.encode()
-        else:
-            sval = deepcopy(val)
-        try:
-            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=hashlib.sha512(sval).digest(),
-                iterations=50000,
-                backend=default_backend()
-            )
-            sub['__hashed__:{}'.format(key)] = base64.urlsafe_b64encode(kdf.derive(sval)).decode('utf-8')
-        except Exception as ex:
-            raise ex
-        else:
-            return val
+            return val.encode()
+        return val
 
     def decrypt(self, val, sub, key, *args, **kwargs):
         if isinstance(val, (six.text_type, str)):
@@ -293,6 +370,9 @@ class Fields(object):
             raise DatabaseException("Failed to decrypt field '{}'".format(val))
 
     def get_encryptor(self, claims):
+        return self.encryptor_cache.get(self._key_repository, claims, lambda: self._create_encryptor(claims))
+
+    def _create_encryptor(self, claims):
         from cryptography.fernet import Fernet
         try:
             encryptor = Fernet(self._get_key(claims))
@@ -303,12 +383,87 @@ class Fields(object):
 
     @property
     def conversion_operators(self):
-        return ['$eq', '$gt', '$gte', '$in', '$lt', '$lte', '$ne', '$nin',
-                '$and', '$not', '$nor', '$or',
-                '$all', '$elemMatch',
-                '$set', '$setOnInsert',
-                '$addToSet', '$pull', '$push',
-                '$each']
+        return list(self._conversion_operators)
 
     def _get_key(self, claims):
         return self._key_repository.get_key(claims)
+
+
+class LazyDecryptedDocument(MutableMapping):
+    """
+    Mapping over a document of which the encrypted fields are only decrypted when they are read.
+    The plaintext replaces the ciphertext in the wrapped document, so every field is decrypted at most once,
+    and nested documents (or lists of them) that contain encrypted fields are returned as lazy documents too.
+    """
+
+    def __init__(self, document, paths, decrypt):
+        # type: (dict, List[List[str]], Callable[[Any, dict, str], Any]) -> None
+        self.document = document
+        self._decrypt = decrypt
+        self._encrypted = set(path[0] for path in paths if len(path) == 1)
+        self._nested = {}
+        for path in paths:
+            if len(path) > 1:
+                self._nested.setdefault(path[0], []).append(path[1:])
+        self._children = {}
+
+    def __getitem__(self, key):
+        if key in self._children:
+            return self._children[key]
+
+        value = self.document[key]
+        if key in self._encrypted:
+            if isinstance(value, list):
+                value = [self._decrypt(v, self.document, key) for v in value]
+            elif not isinstance(value, dict):
+                value = self._decrypt(value, self.document, key)
+            self.document[key] = value
+            self._encrypted.discard(key)
+
+        if key in self._nested:
+            paths = self._nested[key]
+            if isinstance(value, dict):
+                value = LazyDecryptedDocument(value, paths, self._decrypt)
+            elif isinstance(value, list):
+                value = [LazyDecryptedDocument(v, paths, self._decrypt) if isinstance(v, dict) else v for v in value]
+            self._children[key] = value
+
+        return value
+
+    def __setitem__(self, key, value):
+        self.document[key] = value
+        self._encrypted.discard(key)
+        self._nested.pop(key, None)
+        self._children.pop(key, None)
+
+    def __delitem__(self, key):
+        del self.document[key]
+        self._encrypted.discard(key)
+        self._nested.pop(key, None)
+        self._children.pop(key, None)
+
+    def __iter__(self):
+        return iter(self.document)
+
+    def __len__(self):
+        return len(self.document)
+
+    def __repr__(self):
+        return 'LazyDecryptedDocument({!r})'.format(self.document)
+
+    def decrypt_all(self):
+        # type: () -> dict
+        """
+        Decrypts all remaining encrypted fields, and returns the plain wrapped document
+        """
+        for key in list(self.document):
+            self[key]
+        for child in self._children_documents():
+            child.decrypt_all()
+        return self.document
+
+    def _children_documents(self):
+        for value in self._children.values():
+            for child in (value if isinstance(value, list) else [value]):
+                if isinstance(child, LazyDecryptedDocument):
+                    yield child
@@ -0,0 +1,54 @@
+# coding=utf-8
+from typing import Optional
+
+from bson import BSON
+
+
+class CursorBatch(object):
+    """
+    Decides how many documents a cursor returns per `more` call.
+
+    With only a size, every batch holds that number of documents. When a byte budget is
+    given as well, the size is used as a starting point and the batch grows (at most
+    doubling per call) until the observed document size fills the budget.
+    """
+
+    # only sample the first few documents of a batch to estimate the document size
+    sample_size = 10
+
+    max_size = 10000
+
+    def __init__(self, size=None, max_bytes=None):
+        # type: (Optional[int], Optional[int]) -> None
+        assert size is None or size > 0
+        assert max_bytes is None or max_bytes > 0
+
+        self.size = size or (50 if max_bytes else None)
+        self.max_bytes = max_bytes
+
+        self._sampled = 0
+        self._sampled_bytes = 0
+        self._batch_sampled = 0
+
+    @property
+    def adaptive(self):
+        # type: () -> bool
+        return self.max_bytes is not None
+
+    def observe(self, doc):
+        # type: (dict) -> None
+        if self.adaptive and self._batch_sampled < self.sample_size:
+            self._batch_sampled += 1
+            self._sampled += 1
+            self._sampled_bytes += len(BSON.encode(doc))
+
+    def adapt(self):
+        # type: () -> None
+        self._batch_sampled = 0
+
+        if not self.adaptive or not self._sampled:
+            return
+
+        average = max(1, self._sampled_bytes // self._sampled)
+        fits = max(1, self.max_bytes // average)
+        self.size = max(1, min(self.size * 2, fits, self.max_size))
@@ -0,0 +1,191 @@
+# coding=utf-8
+import time
+from collections import OrderedDict
+from threading import RLock, Thread, Event
+from typing import Any, Dict, Tuple
+
+from twisted.internet import reactor, task
+
+from mdstudio.logging.logger import Logger
+
+
+class CursorRegistry(object):
+    """
+    Keeps the server side cursors that are still being iterated by clients.
+
+    The number of live cursors is bounded both in total and per owner (the user or group
+    database the cursor was opened on), where the least recently used cursors are evicted
+    first. Cursors that have not been used for `max_age_seconds` are closed by a background
+    sweep, so abandoned cursors do not keep server resources alive. The sweep runs on its own
+    thread, or on the reactor with `sweep_in_reactor` for cursors that may only be closed from the
+    reactor thread (e.g. txmongo cursors). The cursors that are still open are closed when the
+    reactor shuts down.
+    """
+
+    _logger = Logger()
+
+    def __init__(self, max_cursors=1000, max_cursors_per_owner=100, max_age_seconds=10 * 60, sweep_interval=60,
+                 sweep_in_reactor=False):
+        # type: (int, int, float, float, bool) -> None
+        assert max_cursors > 0
+        assert max_cursors_per_owner > 0
+        assert max_age_seconds >= 0
+
+        self.max_cursors = max_cursors
+        self.max_cursors_per_owner = max_cursors_per_owner
+        self.max_age = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self.sweep_in_reactor = sweep_in_reactor
+        self.clock = reactor
+
+        self.evicted = 0
+        self.expired = 0
+
+        self._lock = RLock()
+        # cursor id -> (owner, cursor, state, last used), ordered from least to most recently used
+        self._entries = OrderedDict()
+        self._owners = {}
+
+        self._sweeper = None
+        self._stop_sweeping = Event()
+        self._started = False
+
+    def add(self, owner, cursor_id, cursor, state=None):
+        # type: (str, str, Any, Any) -> None
+        evicted = []
+        with self._lock:
+            if cursor_id in self._entries:
+                evicted.append(self._remove(cursor_id))
+
+            if self._owners.get(owner, 0) >= self.max_cursors_per_owner:
+                evicted.append(self._remove(next(cid for cid, entry in self._entries.items() if entry[0] == owner)))
+                self.evicted += 1
+            elif len(self._entries) >= self.max_cursors:
+                evicted.append(self._remove(next(iter(self._entries))))
+                self.evicted += 1
+
+            self._entries[cursor_id] = (owner, cursor, state, time.time())
+            self._owners[owner] = self._owners.get(owner, 0) + 1
+
+        for entry in evicted:
+            if entry[1] is not cursor:
+                self._close(entry)
+
+        self._start_sweeping()
+
+    def get(self, owner, cursor_id, pop=False):
+        # type: (str, str, bool) -> Tuple[Any, Any]
+        with self._lock:
+            entry = self._entries.get(cursor_id)
+            if entry is None or entry[0] != owner:
+                raise KeyError(cursor_id)
+
+            expired = time.time() - entry[3] >= self.max_age
+            self._remove(cursor_id)
+            if expired:
+                self.expired += 1
+            elif not pop:
+                # mark as most recently used and refresh the keep alive time
+                self._entries[cursor_id] = (owner, entry[1], entry[2], time.time())
+                self._owners[owner] = self._owners.get(owner, 0) + 1
+
+        if expired:
+            self._close(entry)
+            raise KeyError(cursor_id)
+
+        return entry[1], entry[2]
+
+    def remove(self, owner, cursor_id):
+        # type: (str, str) -> None
+        with self._lock:
+            entry = self._entries.get(cursor_id)
+            if entry is None or entry[0] != owner:
+                return
+            self._remove(cursor_id)
+
+        self._close(entry)
+
+    def sweep(self):
+        # type: () -> int
+        now = time.time()
+        with self._lock:
+            expired = [cid for cid, entry in self._entries.items() if now - entry[3] >= self.max_age]
+            entries = [self._remove(cid) for cid in expired]
+            self.expired += len(entries)
+
+        for entry in entries:
+            self._close(entry)
+
+        return len(entries)
+
+    def stop(self):
+        # the cursors that are still open are closed, since the server would keep them alive otherwise
+        with self._lock:
+            self._stop_sweeping.set()
+            sweeper = self._sweeper
+            entries = [self._remove(cid) for cid in list(self._entries)]
+
+        if isinstance(sweeper, task.LoopingCall) and sweeper.running:
+            sweeper.stop()
+
+        for entry in entries:
+            self._close(entry)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            return {
+                'live': len(self._entries),
+                'owners': dict(self._owners),
+                'evicted': self.evicted,
+                'expired': self.expired
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, cursor_id):
+        return cursor_id in self._entries
+
+    def _remove(self, cursor_id):
+        entry = self._entries.pop(cursor_id)
+        self._owners[entry[0]] -= 1
+        if not self._owners[entry[0]]:
+            del self._owners[entry[0]]
+        return entry
+
+    def _close(self, entry):
+        cursor = entry[1]
+        if hasattr(cursor, 'close'):
+            # noinspection PyBroadException
+            try:
+                cursor.close()
+            except Exception as e:
+                self._logger.warn('Failed to close cursor: {error}', error=str(e))
+
+    def _start_sweeping(self):
+        with self._lock:
+            if self._started or self._stop_sweeping.is_set():
+                return
+            self._started = True
+
+            # cursors are added on the database threads, while the reactor is not thread safe
+            # noinspection PyUnresolvedReferences
+            reactor.callFromThread(reactor.addSystemEventTrigger, 'during', 'shutdown', self.stop)
+
+            if self.sweep_interval is None:
+                return
+
+            if self.sweep_in_reactor:
+                self._sweeper = task.LoopingCall(self.sweep)
+                self._sweeper.clock = self.clock
+                self._sweeper.start(self.sweep_interval, now=False)
+            else:
+                self._sweeper = Thread(target=self._sweep_periodically, name='cursor-sweeper')
+                self._sweeper.daemon = True
+                self._sweeper.start()
+
+    def _sweep_periodically(self):
+        while not self._stop_sweeping.wait(self.sweep_interval):
+            self.sweep()
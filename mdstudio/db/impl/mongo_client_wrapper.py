@@ -1,25 +1,73 @@
 from pymongo import MongoClient
 
 import mdstudio.unittest.db as db
+from mdstudio.db.impl.cursor_registry import CursorRegistry
 from mdstudio.db.impl.mongo_database_wrapper import MongoDatabaseWrapper
+from mdstudio.db.impl.query_profiler import QueryProfiler
+from mdstudio.deferred.thread_pool import ThreadPools
 from mdstudio.logging.logger import Logger
 
 
 class MongoClientWrapper(object):
     logger = Logger()
 
-    def __init__(self, host, port):
+    def __init__(self, host, port, thread_pool_settings=None, cursor_settings=None, driver='pymongo',
+                 profiler_settings=None, lazy_decryption=False, guided_date_conversion=False):
+        if driver not in ('pymongo', 'txmongo'):
+            raise ValueError("Unknown mongo driver '{}', expected 'pymongo' or 'txmongo'".format(driver))
+
         self._host = host
         self._port = port
-        self._client = self.create_mongo_client(host, port)
+        # with txmongo the databases return deferreds straight from the driver instead of
+        # running blocking pymongo calls in the thread pools
+        self.driver = driver
+        if driver == 'txmongo':
+            self._client = self.create_txmongo_client(host, port)
+        else:
+            self._client = self.create_mongo_client(host, port)
         self._databases = {}
 
+        # the read, write and admin pools are shared by all databases of this client
+        self.thread_pools = ThreadPools('mongo', thread_pool_settings)
+
+        # cursors are bounded for the client as a whole, and per user or group database. The
+        # txmongo cursors may only be closed on the reactor thread, so they are swept there
+        cursor_settings = cursor_settings or {}
+        self.cursors = CursorRegistry(max_cursors=cursor_settings.get('maxCursors', 1000),
+                                      max_cursors_per_owner=cursor_settings.get('maxCursorsPerOwner', 100),
+                                      max_age_seconds=cursor_settings.get('maxAge', 10 * 60),
+                                      sweep_interval=cursor_settings.get('sweepInterval', 60),
+                                      sweep_in_reactor=driver == 'txmongo')
+
+        # when set, the encrypted fields of the results of all databases are only decrypted when they are read
+        self.lazy_decryption = lazy_decryption
+
+        # when set, only the declared date and datetime fields of the results get their timezone restored
+        self.guided_date_conversion = guided_date_conversion
+
+        # the query profiler is opt-in, and shared by all databases of this client
+        self.profiler = None
+        if profiler_settings is not None:
+            self.profiler = QueryProfiler(slow_threshold=profiler_settings.get('slowThreshold', 0.1),
+                                          max_entries=profiler_settings.get('maxEntries', 100),
+                                          explain=profiler_settings.get('explain', True))
+
     def get_database(self, database_name):
         if database_name not in self._databases:
-            if database_name not in self._client.database_names():
-                self.logger.info('Creating database "{database}"', database=database_name)
+            if self.driver == 'txmongo':
+                from mdstudio.db.impl.txmongo_database_wrapper import TxMongoDatabaseWrapper
+
+                database = TxMongoDatabaseWrapper(database_name, self._client[database_name], cursors=self.cursors,
+                                                  profiler=self.profiler, lazy_decryption=self.lazy_decryption,
+                                                  guided_date_conversion=self.guided_date_conversion)
+            else:
+                if database_name not in self._client.database_names():
+                    self.logger.info('Creating database "{database}"', database=database_name)
 
-            database = MongoDatabaseWrapper(database_name, self._client[database_name])
+                database = MongoDatabaseWrapper(database_name, self._client[database_name],
+                                               thread_pools=self.thread_pools, cursors=self.cursors,
+                                               profiler=self.profiler, lazy_decryption=self.lazy_decryption,
+                                               guided_date_conversion=self.guided_date_conversion)
             self._databases[database_name] = database
         else:
             database = self._databases[database_name]
@@ -32,3 +80,8 @@ class MongoClientWrapper(object):
             import mongomock
             return mongomock.MongoClient(host, port)
         return MongoClient(host, port)
+
+    @staticmethod
+    def create_txmongo_client(host, port):
+        from txmongo.connection import ConnectionPool
+        return ConnectionPool('mongodb://{}:{}'.format(host, port))
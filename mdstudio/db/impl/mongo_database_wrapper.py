@@ -1,24 +1,30 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime, date
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 import copy
 import hashlib
 import pytz
 import random
 import six
-from bson import ObjectId
-from pymongo import ReturnDocument, IndexModel
+import time
+from threading import RLock
+from bson import ObjectId, SON
+from pymongo import ReturnDocument, IndexModel, InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
 from pymongo.cursor import Cursor
+from pymongo.errors import BulkWriteError
 
 from mdstudio.api.context import ContextCallable
-from mdstudio.collection.cache_dict import CacheDict
 from mdstudio.db.database import IDatabase, CollectionType, DocumentType, Fields, SortOperators, \
     ProjectionOperators, AggregationOperator
 from mdstudio.db.exception import DatabaseException
+from mdstudio.db.impl.cursor_batch import CursorBatch
+from mdstudio.db.impl.cursor_registry import CursorRegistry
+from mdstudio.db.impl.query_profiler import QueryProfiler
 from mdstudio.db.index import Index
 from mdstudio.db.sort_mode import SortMode
 from mdstudio.deferred.make_deferred import make_deferred
+from mdstudio.deferred.thread_pool import ThreadPools
 from mdstudio.logging.logger import Logger
 
 
@@ -27,40 +33,88 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
     _database_name = None
     _db = None
 
-    # type: CacheDict
+    # type: CursorRegistry
     _cursors = None
 
     _internal_db = None
 
     _logger = Logger()
 
-    def __init__(self, database_name, db):
+    # the bulk write request types, with the arguments of the pymongo models they map to
+    _write_models = {
+        'insertOne': (InsertOne, ['document']),
+        'updateOne': (UpdateOne, ['filter', 'update', 'upsert']),
+        'updateMany': (UpdateMany, ['filter', 'update', 'upsert']),
+        'replaceOne': (ReplaceOne, ['filter', 'replacement', 'upsert']),
+        'deleteOne': (DeleteOne, ['filter']),
+        'deleteMany': (DeleteMany, ['filter'])
+    }
+
+    # type: ThreadPools
+    thread_pools = None
+
+    # type: QueryProfiler
+    profiler = None
+
+    # type: bool
+    lazy_decryption = False
+
+    # type: bool
+    guided_date_conversion = False
+
+    def __init__(self, database_name, db, collection_cache_ttl=60, thread_pools=None, cursors=None, profiler=None,
+                 lazy_decryption=False, guided_date_conversion=False):
+        # type: (str, Database, int, Optional[ThreadPools], Optional[CursorRegistry], Optional[QueryProfiler], bool, bool) -> None
         self._database_name = database_name
         self._db = db
 
+        # when set, only the date and datetime fields that are declared in the request fields get their
+        # timezone restored, instead of walking the whole result. Undeclared datetimes are left naive
+        self.guided_date_conversion = guided_date_conversion
+
+        # when set, the encrypted fields of results are only decrypted when they are read, which saves the
+        # decryption of fields nobody uses, but the results can only be used in process, not sent over the wire
+        self.lazy_decryption = lazy_decryption
+
+        # when given, the duration of the read operations is recorded, and slow queries are explained
+        self.profiler = profiler
+
+        # run the read, write and admin calls in their own pools, or in the global twisted pool if not given
+        self.thread_pools = thread_pools
+
+        # cache the collection names of this database, so we do not need a `listCollections`
+        # round trip before every operation. Unknown names always trigger a refresh, so the
+        # ttl only bounds how long a collection that was dropped elsewhere is still reported
+        self._collection_cache_ttl = collection_cache_ttl
+        self._collection_cache_lock = RLock()
+        self._collection_names = None
+        self._collection_names_refreshed = 0
+        self.collection_cache_hits = 0
+        self.collection_cache_misses = 0
+
         # store the cursors for 10 minutes as described here
         # https://docs.mongodb.com/v3.0/core/cursors/
-        # @TODO:  this method is really insecure since we can ask arbitrary cursors,
-        #         and should be fixed ASAP
-        self._cursors = CacheDict(max_age_seconds=10 * 60)
+        # the registry may be shared between databases, but cursors can only be
+        # retrieved from the database they were opened on
+        self._cursors = cursors if cursors is not None else CursorRegistry()
         ContextCallable.__init__(self)
 
-    @make_deferred
-    def more(self, cursor_id, claims=None):
-        # type: (str) -> Dict[str, Any]
-        return self._more(cursor_id, claims)
+    @make_deferred(pool='read')
+    def more(self, cursor_id, claims=None, batch_size=None):
+        # type: (str, Optional[dict], Optional[int]) -> Dict[str, Any]
+        return self._more(cursor_id, claims, batch_size)
 
-    @make_deferred
+    @make_deferred(pool='read')
     def rewind(self, cursor_id, claims=None):
         # type: (str) -> Dict[str, Any]
         try:
-            self._cursors[cursor_id][0].rewind()
+            self._cursors.get(self._database_name, cursor_id)[0].rewind()
 
             return self._more(cursor_id, claims)
         except KeyError:
             raise DatabaseException("Cursor with id '{}' is unknown".format(cursor_id))
 
-    @make_deferred
+    @make_deferred(pool='write')
     def insert_one(self, collection, insert, fields=None, claims=None):
         # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection, True)
@@ -72,19 +126,19 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             'id': str(db_collection.insert_one(insert).inserted_id)
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def insert_many(self, collection, insert, fields=None, claims=None):
         # type: (CollectionType, List[DocumentType], Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection, True)
 
-        self._convert_fields(fields, {'insert': insert}, ['insert'], claims)
+        self._convert_documents(fields, insert, 'insert', claims)
         insert = self._prepare_for_mongo(insert)
 
         return {
             'ids': [str(oid) for oid in db_collection.insert_many(insert).inserted_ids]
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def replace_one(self, collection, filter, replacement, upsert=False, fields=None, claims=None):
         # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection, upsert)
@@ -101,13 +155,13 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._update_response(upsert, result=replace_result)
 
-    @make_deferred
+    @make_deferred(pool='read')
     def count(self, collection=None, filter=None, skip=None, limit=None, fields=None, claims=None, cursor_id=None,
               with_limit_and_skip=False):
         # type: (CollectionType, Optional[DocumentType], Optional[int], Optional[int], Optional[Optional[Fields]], Optional[str]) -> Dict[str, Any]
         total = 0
         if cursor_id:
-            total = self._cursors[cursor_id][0].count(with_limit_and_skip)
+            total = self._cursors.get(self._database_name, cursor_id)[0].count(with_limit_and_skip)
         else:
             db_collection = self._get_collection(collection)
 
@@ -118,13 +172,20 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
                 self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
                 filter = self._prepare_for_mongo(filter)
 
+                started = time.time()
                 total = db_collection.count(filter, skip=skip, limit=limit)
+                self._profile('count', db_collection, filter, started, total, {
+                    'count': db_collection.name,
+                    'query': filter or {},
+                    'skip': skip,
+                    'limit': limit
+                })
 
         return {
             'total': total
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def update_one(self, collection, filter, update, upsert=False, fields=None, claims=None):
         # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Optional[Fields]]) -> Dict[str, Any]
         db_collection = self._get_collection(collection, upsert)
@@ -141,7 +202,7 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._update_response(upsert, result=result)
 
-    @make_deferred
+    @make_deferred(pool='write')
     def update_many(self, collection, filter, update, upsert=False, fields=None, claims=None):
         # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection, upsert)
@@ -157,7 +218,7 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._update_response(upsert, result=result)
 
-    @make_deferred
+    @make_deferred(pool='read')
     def find_one(self, collection, filter, projection=None, skip=None, sort=None, fields=None, claims=None):
         # type: (CollectionType, DocumentType, ProjectionOperators, Optional[int], SortOperators, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
@@ -170,17 +231,22 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
             filter = self._prepare_for_mongo(filter)
 
-            result = db_collection.find_one(filter, projection, skip=skip, sort=self._prepare_sortmode(sort))
+            started = time.time()
+            sort = self._prepare_sortmode(sort)
+            result = db_collection.find_one(filter, projection, skip=skip, sort=sort)
+            self._profile('find_one', db_collection, filter, started, 0 if result is None else 1,
+                          self._find_command(db_collection, filter, projection, skip, 1, sort))
 
-            self._prepare_result(claims, fields, result)
+            result = self._prepare_result(claims, fields, result)
 
         return {
             'result': result
         }
 
-    @make_deferred
-    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None, claims=None):
-        # type: (CollectionType, DocumentType, ProjectionOperators, Optional[int], Optional[int], SortOperators, Optional[Fields]) -> Dict[str, Any]
+    @make_deferred(pool='read')
+    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None, claims=None,
+                  batch_size=None, batch_bytes=None):
+        # type: (CollectionType, DocumentType, ProjectionOperators, Optional[int], Optional[int], SortOperators, Optional[Fields], Optional[dict], Optional[int], Optional[int]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
 
         skip = 0 if not skip else skip
@@ -196,10 +262,19 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
         self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
         filter = self._prepare_for_mongo(filter)
 
-        cursor = db_collection.find(filter, projection, skip=skip, limit=limit, sort=self._prepare_sortmode(sort))
-        return self._get_cursor(cursor, fields=fields, claims=claims)
+        # fixed batches are also used as server side batch size, adaptive batches use the server default
+        batch = CursorBatch(batch_size, batch_bytes)
+        started = time.time()
+        sort = self._prepare_sortmode(sort)
+        cursor = db_collection.find(filter, projection, skip=skip, limit=limit, sort=sort,
+                                    batch_size=batch.size if batch.size and not batch.adaptive else 0)
+        result = self._get_cursor(cursor, fields=fields, claims=claims, batch=batch)
+        self._profile('find_many', db_collection, filter, started, result['size'],
+                      self._find_command(db_collection, filter, projection, skip, limit, sort))
+
+        return result
 
-    @make_deferred
+    @make_deferred(pool='write')
     def find_one_and_update(self, collection, filter, update, upsert=False, projection=None, sort=None,
                             return_updated=False, fields=None, claims=None):
         # type: (CollectionType, DocumentType, DocumentType, bool, ProjectionOperators, SortOperators, bool, Optional[Fields]) -> Dict[str, Any]
@@ -216,13 +291,13 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             result = db_collection.find_one_and_update(filter, update, projection, sort=self._prepare_sortmode(sort),
                                                        upsert=upsert, return_document=return_document)
 
-            self._prepare_result(claims, fields, result)
+            result = self._prepare_result(claims, fields, result)
 
         return {
             'result': result
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def find_one_and_replace(self, collection, filter, replacement, upsert=False, projection=None, sort=None,
                              return_updated=False, fields=None, claims=None):
         # type: (CollectionType, DocumentType, DocumentType, bool, ProjectionOperators, SortOperators, bool, Optional[Fields]) -> Dict[str, Any]
@@ -240,13 +315,13 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
                                                         sort=self._prepare_sortmode(sort), upsert=upsert,
                                                         return_document=return_document)
 
-            self._prepare_result(claims, fields, result)
+            result = self._prepare_result(claims, fields, result)
 
         return {
             'result': result
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def find_one_and_delete(self, collection, filter, projection=None, sort=None, fields=None, claims=None):
         # type: (CollectionType, DocumentType, ProjectionOperators, SortOperators, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
@@ -259,13 +334,13 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
             result = db_collection.find_one_and_delete(filter, projection, sort=self._prepare_sortmode(sort))
 
-            self._prepare_result(claims, fields, result)
+            result = self._prepare_result(claims, fields, result)
 
         return {
             'result': result
         }
 
-    @make_deferred
+    @make_deferred(pool='read')
     def distinct(self, collection, field, filter=None, fields=None, claims=None):
         # type: (CollectionType, str, Optional[DocumentType], Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
@@ -277,7 +352,13 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
 
             filter = self._prepare_for_mongo(filter)
 
+            started = time.time()
             results = db_collection.distinct(field, filter)
+            self._profile('distinct', db_collection, filter, started, len(results), {
+                'distinct': db_collection.name,
+                'key': field,
+                'query': filter or {}
+            })
 
             for result in results:
                 self._prepare_for_json(result)
@@ -287,9 +368,9 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             'total': len(results)
         }
 
-    @make_deferred
-    def aggregate(self, collection, pipeline):
-        # type: (CollectionType, List[AggregationOperator]) -> Dict[str, Any]
+    @make_deferred(pool='read')
+    def aggregate(self, collection, pipeline, batch_size=None, batch_bytes=None):
+        # type: (CollectionType, List[AggregationOperator], Optional[int], Optional[int]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
 
         if not db_collection:
@@ -299,11 +380,23 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
                 'size': 0
             }
 
-        cursor = db_collection.aggregate(pipeline)
+        batch = CursorBatch(batch_size, batch_bytes)
+        started = time.time()
+        if batch.size and not batch.adaptive:
+            cursor = db_collection.aggregate(pipeline, batchSize=batch.size)
+        else:
+            cursor = db_collection.aggregate(pipeline)
+
+        result = self._get_cursor(cursor, batch=batch)
+        self._profile('aggregate', db_collection, pipeline, started, result['size'], {
+            'aggregate': db_collection.name,
+            'pipeline': pipeline,
+            'cursor': {}
+        })
 
-        return self._get_cursor(cursor)
+        return result
 
-    @make_deferred
+    @make_deferred(pool='write')
     def delete_one(self, collection, filter, fields=None, claims=None):
         # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
@@ -319,7 +412,7 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             'count': count
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
     def delete_many(self, collection=None, filter=None, fields=None, claims=None):
         # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
         db_collection = self._get_collection(collection)
@@ -335,7 +428,25 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             'count': count
         }
 
-    @make_deferred
+    @make_deferred(pool='write')
+    def bulk_write(self, collection, requests, ordered=True, fields=None, claims=None):
+        # type: (CollectionType, List[Dict[str, DocumentType]], bool, Optional[Fields]) -> Dict[str, Any]
+        operations = [self._parse_write_request(request) for request in requests]
+
+        if not operations:
+            return self._bulk_write_response(operations, ordered)
+
+        db_collection = self._get_collection(collection, True)
+        models = self._prepare_write_models(operations, fields, claims)
+
+        try:
+            result = db_collection.bulk_write(models, ordered=ordered).bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+
+        return self._bulk_write_response(operations, ordered, result)
+
+    @make_deferred(pool='admin')
     def create_indexes(self, collection, indexes):
         # type: (CollectionType, str, List[Index]) -> Any
         db_collection = self._get_collection(collection)
@@ -351,7 +462,7 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             'names': names
         }
 
-    @make_deferred
+    @make_deferred(pool='admin')
     def drop_indexes(self, collection, indexes):
         # type: (CollectionType, str, List[Index]) -> Any
         db_collection = self._get_collection(collection)
@@ -364,7 +475,7 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
                 else:
                     db_collection.drop_index(**i.to_dict(create=False, to_mongo=True))
 
-    @make_deferred
+    @make_deferred(pool='admin')
     def drop_all_indexes(self, collection):
         # type: (CollectionType, str) -> Any
         db_collection = self._get_collection(collection)
@@ -372,13 +483,23 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
         if db_collection:
             db_collection.drop_indexes()
 
-    def _prepare_for_json(self, doc):
+    def _prepare_for_json(self, doc, fields=None):
         if doc:
             # convert _id from ObjectId to str representation
             if isinstance(doc, dict) and '_id' in doc:
                 doc['_id'] = str(doc['_id'])
 
-            self._convert_to_utc(doc)
+            if self.guided_date_conversion and fields and (fields.date_times or fields.dates):
+                fields.transform_to_object(doc, fields.date_times + fields.dates, MongoDatabaseWrapper._field_to_utc,
+                                           None)
+            else:
+                self._convert_to_utc(doc)
+
+    @staticmethod
+    def _field_to_utc(fields, value, *args, **kwargs):
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=pytz.utc)
+        return value
 
     def _convert_to_utc(self, document):
         if isinstance(document, dict):
@@ -397,38 +518,51 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
                 self._convert_to_utc(value)
 
     def _prepare_for_mongo(self, doc):
-        def _prepare_obj(obj):
-            if obj and '_id' in obj:
-                # convert json _id from str to ObjectId
-                obj['_id'] = ObjectId(obj['_id'])
-
-        doc = copy.deepcopy(doc)
+        # the top level documents are always shallow copied, since pymongo adds the
+        # generated _id to inserted documents. Nested containers are only copied when
+        # one of their values is actually converted
         if isinstance(doc, list):
-
-            for d in doc:
-                _prepare_obj(d)
-        else:
-            _prepare_obj(doc)
-
-        def _recurse(document):
-            if isinstance(document, dict):
-                iter = document.items()
-            elif isinstance(document, list):
-                iter = enumerate(document)
-            else:
-                return
-
-            for key, value in iter:
-
-                if isinstance(value, date) and not isinstance(value, datetime):
-                    document[key] = datetime(document[key].year, document[key].month, document[key].day, tzinfo=pytz.utc)
-                if isinstance(value, datetime):
-                    pass
-                else:
-                    _recurse(value)
-
-        _recurse(doc)
-        return doc
+            return [self._prepare_document_for_mongo(d) for d in doc]
+
+        return self._prepare_document_for_mongo(doc)
+
+    def _prepare_document_for_mongo(self, doc):
+        if not isinstance(doc, dict):
+            return self._convert_to_mongo(doc)
+
+        prepared = {}
+        for key, value in doc.items():
+            prepared[key] = self._convert_to_mongo(value)
+
+        if prepared and '_id' in prepared:
+            # convert json _id from str to ObjectId
+            prepared['_id'] = ObjectId(prepared['_id'])
+
+        return prepared
+
+    def _convert_to_mongo(self, value):
+        if isinstance(value, dict):
+            converted = None
+            for key, sub in value.items():
+                new = self._convert_to_mongo(sub)
+                if new is not sub:
+                    if converted is None:
+                        converted = dict(value)
+                    converted[key] = new
+            return value if converted is None else converted
+        elif isinstance(value, list):
+            converted = None
+            for i, sub in enumerate(value):
+                new = self._convert_to_mongo(sub)
+                if new is not sub:
+                    if converted is None:
+                        converted = list(value)
+                    converted[i] = new
+            return value if converted is None else converted
+        elif isinstance(value, date) and not isinstance(value, datetime):
+            return datetime(value.year, value.month, value.day, tzinfo=pytz.utc)
+
+        return value
 
     def _prepare_sortmode(self, sort):
         if not sort:
@@ -447,60 +581,165 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
             sort = [(sort[0], _convert_mode(sort[1]))]
         return sort
 
-    def _get_cursor(self, cursor, fields=None, claims=None, max_size=50):
-        # type: (Cursor, Fields, dict, int) -> dict
+    def _get_cursor(self, cursor, fields=None, claims=None, max_size=50, batch=None):
+        # type: (Cursor, Fields, dict, int, Optional[CursorBatch]) -> dict
 
         results = []
 
-        # We have to deal with mock cursors and command cursors
-        try:
-            # noinspection PyProtectedMember
-            size = cursor._refresh()
-
-            for _ in range(size):
-                doc = cursor.next()
-                self._prepare_for_json(doc)
-                if fields and claims:
-                    fields.parse_result(doc, claims)
-                results.append(doc)
-        except AttributeError:
+        if batch is None:
+            batch = CursorBatch()
+
+        if batch.size:
             for doc in cursor:
-                self._prepare_for_json(doc)
-                if fields and claims:
-                    fields.parse_result(doc, claims)
+                batch.observe(doc)
+                self._prepare_for_json(doc, fields)
                 results.append(doc)
-                if len(results) >= max_size:
+                if len(results) >= batch.size:
                     break
             size = len(results)
-
-        # cache the cursor for later use
-        # by default it will be available for 10 minutes we also
-        # hash the cursor id to make random guessing a lot harder
-        id = getattr(cursor, '_id', getattr(cursor, 'cursor_id', random.randint(1, 999999999)))
-        cursor_hash = hashlib.sha256('{}{}'.format(id, random.randint(1, 999999999)).encode()).hexdigest()
-        self._cursors[cursor_hash] = (cursor, fields)
+            batch.adapt()
+        else:
+            # We have to deal with mock cursors and command cursors
+            try:
+                # noinspection PyProtectedMember
+                size = cursor._refresh()
+
+                for _ in range(size):
+                    doc = cursor.next()
+                    self._prepare_for_json(doc, fields)
+                    results.append(doc)
+            except AttributeError:
+                for doc in cursor:
+                    self._prepare_for_json(doc, fields)
+                    results.append(doc)
+                    if len(results) >= max_size:
+                        break
+                size = len(results)
+
+        # decrypt the whole batch at once, so large batches are decrypted in parallel
+        results = self._parse_results(fields, claims, results)
 
         return {
             'results': results,
             'size': size,
-            'cursorId': cursor_hash,
+            'cursorId': self._register_cursor(cursor, fields, batch),
             'alive': getattr(cursor, 'alive', True) and len(results) > 0
         }
 
-    def _more(self, cursor_id, claims):
-        # type: (str) -> Dict[str, Any]
+    def _register_cursor(self, cursor, fields, batch):
+        # type: (Any, Optional[Fields], CursorBatch) -> str
 
-        try:
-            cursor, fields = self._cursors[cursor_id]
+        # cache the cursor for later use
+        # by default it will be available for 10 minutes we also
+        # hash the cursor id to make random guessing a lot harder
+        id = getattr(cursor, '_id', getattr(cursor, 'cursor_id', random.randint(1, 999999999)))
+        cursor_hash = hashlib.sha256('{}{}'.format(id, random.randint(1, 999999999)).encode()).hexdigest()
+        self._cursors.add(self._database_name, cursor_hash, cursor, (fields, batch))
 
-            # refresh cursor keep alive time
-            self._cursors[cursor_id] = (cursor, fields)
+        return cursor_hash
 
-            return self._get_cursor(cursor, fields=fields, claims=claims)
+    def _more(self, cursor_id, claims, batch_size=None):
+        # type: (str, Optional[dict], Optional[int]) -> Dict[str, Any]
 
+        try:
+            # the cursor is registered again under a new id for the next batch
+            cursor, (fields, batch) = self._cursors.get(self._database_name, cursor_id, pop=True)
         except KeyError:
             raise DatabaseException("Cursor with id '{}' is unknown".format(cursor_id))
 
+        if batch_size:
+            batch.size = batch_size
+
+        try:
+            return self._get_cursor(cursor, fields=fields, claims=claims, batch=batch)
+        except Exception:
+            # the cursor is no longer registered, so nobody would close it otherwise
+            cursor.close()
+            raise
+
+    def _parse_write_request(self, request):
+        # type: (Dict[str, DocumentType]) -> Tuple[type, Dict[str, Any]]
+        if not isinstance(request, dict) or len(request) != 1:
+            raise DatabaseException("A bulk write request should contain exactly one operation, "
+                                    "got '{}'".format(request))
+
+        operation, arguments = next(iter(request.items()))
+        if operation not in self._write_models:
+            raise DatabaseException("Unknown bulk write operation '{}'".format(operation))
+
+        model, names = self._write_models[operation]
+        unknown = set(arguments.keys()) - set(names)
+        if unknown:
+            raise DatabaseException("Unknown arguments {} for bulk write operation '{}'".format(sorted(unknown),
+                                                                                              operation))
+
+        missing = [name for name in names if name != 'upsert' and name not in arguments]
+        if missing:
+            raise DatabaseException("Missing arguments {} for bulk write operation '{}'".format(missing, operation))
+
+        return model, dict(arguments)
+
+    def _prepare_write_models(self, operations, fields, claims):
+        # type: (List[Tuple[type, Dict[str, Any]]], Optional[Fields], Optional[dict]) -> list
+
+        # convert the documents of all operations in a single call, so the encryptor is only created once
+        var_map = {}
+        for i, (_, arguments) in enumerate(operations):
+            for key in ['document', 'filter', 'update', 'replacement']:
+                if key in arguments:
+                    var_map['{}{}'.format(key, i)] = arguments[key]
+        self._convert_fields(fields, var_map, list(var_map.keys()), claims)
+
+        models = []
+        for i, (model, arguments) in enumerate(operations):
+            for key in ['document', 'filter', 'update', 'replacement']:
+                if key in arguments:
+                    arguments[key] = self._prepare_for_mongo(var_map['{}{}'.format(key, i)])
+            models.append(model(**arguments))
+
+        return models
+
+    def _bulk_write_response(self, operations, ordered, result=None):
+        # type: (List[Tuple[type, Dict[str, Any]]], bool, Optional[dict]) -> Dict[str, Any]
+        response = {
+            'inserted': 0,
+            'matched': 0,
+            'modified': 0,
+            'deleted': 0,
+            'upserted': 0,
+            'errors': 0,
+            'results': [{'executed': False} for _ in operations]
+        }
+
+        if result is None:
+            return response
+
+        failed = {error['index']: error for error in result['writeErrors']}
+        # an ordered bulk write stops at the first error
+        last = min(failed) if ordered and failed else len(operations) - 1
+
+        results = response['results']
+        for i, (_, arguments) in enumerate(operations[:last + 1]):
+            if i in failed:
+                results[i]['error'] = failed[i]['errmsg']
+            else:
+                results[i]['executed'] = True
+                if 'document' in arguments:
+                    results[i]['id'] = str(arguments['document']['_id'])
+
+        for upserted in result['upserted']:
+            results[upserted['index']]['upsertedId'] = str(upserted['_id'])
+
+        response.update({
+            'inserted': result['nInserted'],
+            'matched': result['nMatched'],
+            'modified': result['nModified'],
+            'deleted': result['nRemoved'],
+            'upserted': result['nUpserted'],
+            'errors': len(failed)
+        })
+        return response
+
     def _update_response(self, upsert, result=None):
         if result is None:
             return {
@@ -524,21 +763,98 @@ class MongoDatabaseWrapper(IDatabase, ContextCallable):
         else:
             collection_name = collection
 
-        if collection_name not in self._db.collection_names():
+        if not self._has_collection(collection_name):
             if create:
                 self._logger.info('Creating collection {collection} in {database}', collection=collection_name,
                                   database=self._database_name)
+                # the collection only exists after the first write, so fetch the names again next time
+                self.invalidate_collection_cache()
             else:
                 return None
 
         return self._db[collection_name]
 
+    def _has_collection(self, collection_name):
+        with self._collection_cache_lock:
+            if self._is_cached_collection(collection_name):
+                return True
+
+            return self._update_collection_names(self._db.collection_names(), collection_name)
+
+    def _is_cached_collection(self, collection_name):
+        with self._collection_cache_lock:
+            expired = time.time() - self._collection_names_refreshed >= self._collection_cache_ttl
+            if self._collection_names is not None and not expired and collection_name in self._collection_names:
+                self.collection_cache_hits += 1
+                return True
+
+            self.collection_cache_misses += 1
+            return False
+
+    def _update_collection_names(self, names, collection_name):
+        with self._collection_cache_lock:
+            self._collection_names = set(names)
+            self._collection_names_refreshed = time.time()
+
+            return collection_name in self._collection_names
+
+    def invalidate_collection_cache(self):
+        with self._collection_cache_lock:
+            self._collection_names = None
+
+    @property
+    def collection_cache_stats(self):
+        with self._collection_cache_lock:
+            return {
+                'hits': self.collection_cache_hits,
+                'misses': self.collection_cache_misses
+            }
+
+    def _profile(self, operation, db_collection, filter, started, count, command):
+        if self.profiler is None:
+            return
+
+        def explain():
+            return self._db.command('explain', command, verbosity='queryPlanner')
+
+        self.profiler.record(self._database_name, operation, db_collection.name, filter, time.time() - started, count,
+                             explain=explain)
+
+    @staticmethod
+    def _find_command(db_collection, filter, projection, skip, limit, sort):
+        command = SON([('find', db_collection.name), ('filter', filter or {})])
+        if projection:
+            command['projection'] = projection
+        if skip:
+            command['skip'] = skip
+        if limit:
+            command['limit'] = limit
+        if sort:
+            command['sort'] = SON(sort)
+        return command
+
     @staticmethod
     def _convert_fields(fields, var_map, prefixes, claims=None):
         if fields:
             fields.convert_call(var_map, prefixes, claims)
 
-    def _prepare_result(self, claims, fields, result):
+    @staticmethod
+    def _convert_documents(fields, documents, prefix, claims=None):
+        # the documents are encrypted separately, so large batches are encrypted in parallel
         if fields:
-            fields.parse_result(result, claims)
-        self._prepare_for_json(result)
+            fields.convert_call({prefix: documents}, [prefix])
+            fields.encrypt_documents(documents, claims)
+
+    def _prepare_result(self, claims, fields, result):
+        self._prepare_for_json(result, fields)
+        return self._parse_result(fields, claims, result)
+
+    def _parse_result(self, fields, claims, doc):
+        if fields and claims:
+            return fields.parse_result(doc, claims, lazy=self.lazy_decryption)
+        return doc
+
+    def _parse_results(self, fields, claims, docs):
+        if fields and claims:
+            return fields.parse_results(docs, claims, lazy=self.lazy_decryption)
+        return docs
@@ -0,0 +1,138 @@
+# coding=utf-8
+import json
+from collections import deque, OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+import six
+
+from mdstudio.logging.logger import Logger
+from mdstudio.utc import now, to_utc_string
+
+
+class QueryProfiler(object):
+    """
+    Records the duration, filter shape and number of returned documents of database
+    operations. Filter values are stripped, so only the structure of a query is kept,
+    and the statistics are aggregated per database, operation, collection and shape.
+
+    Operations that take longer than `slow_threshold` seconds are logged and kept in a
+    bounded list together with their query plan, which shows whether an index was used
+    or the whole collection had to be scanned.
+    """
+
+    _logger = Logger()
+
+    # the plan keys that contain query values
+    _plan_values = ['filter', 'parsedQuery', 'indexBounds']
+
+    def __init__(self, slow_threshold=0.1, max_entries=100, max_shapes=1000, explain=True):
+        # type: (float, int, int, bool) -> None
+        self.slow_threshold = slow_threshold
+        self.max_shapes = max_shapes
+        self.explain = explain
+
+        self._lock = Lock()
+        self._operations = OrderedDict()
+        self._slow = deque(maxlen=max_entries)
+
+    def record(self, database, operation, collection, filter, duration, count, explain=None):
+        # type: (str, str, str, Any, float, int, Optional[Callable[[], dict]]) -> None
+        shape = self.shape(filter)
+        key = (database, operation, collection, json.dumps(shape, sort_keys=True))
+
+        with self._lock:
+            stats = self._operations.get(key)
+            if stats is None and len(self._operations) < self.max_shapes:
+                stats = self._operations[key] = {
+                    'database': database,
+                    'operation': operation,
+                    'collection': collection,
+                    'filter': shape,
+                    'calls': 0,
+                    'documents': 0,
+                    'totalDuration': 0.0,
+                    'maxDuration': 0.0
+                }
+            if stats is not None:
+                stats['calls'] += 1
+                stats['documents'] += count
+                stats['totalDuration'] += duration
+                stats['maxDuration'] = max(stats['maxDuration'], duration)
+
+        if duration < self.slow_threshold:
+            return
+
+        plan = self._explain(explain) if self.explain and explain else None
+        scan = plan is not None and 'COLLSCAN' in json.dumps(plan)
+
+        with self._lock:
+            self._slow.append({
+                'time': to_utc_string(now()),
+                'database': database,
+                'operation': operation,
+                'collection': collection,
+                'filter': shape,
+                'duration': duration,
+                'documents': count,
+                'collectionScan': scan,
+                'plan': plan
+            })
+
+        self._logger.warn('Slow {operation} on {database}.{collection} took {duration:.3f}s for {documents} documents '
+                          '(collection scan: {scan}), filter {filter}', operation=operation, database=database,
+                          collection=collection, duration=duration, documents=count, scan=scan,
+                          filter=json.dumps(shape, sort_keys=True))
+
+    def report(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            return {
+                'slowThreshold': self.slow_threshold,
+                'operations': [dict(stats) for stats in self._operations.values()],
+                'slow': list(self._slow)
+            }
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+            self._slow.clear()
+
+    @classmethod
+    def shape(cls, filter):
+        # type: (Any) -> Any
+        if isinstance(filter, dict):
+            return {key: cls.shape(value) for key, value in filter.items()}
+        elif isinstance(filter, (list, tuple)):
+            # lists of conditions, e.g. for $or, keep their structure
+            if filter and all(isinstance(value, dict) for value in filter):
+                return [cls.shape(value) for value in filter]
+            return '?'
+        elif filter is None:
+            return None
+
+        return '?'
+
+    def _explain(self, explain):
+        # type: (Callable[[], dict]) -> Optional[dict]
+        # noinspection PyBroadException
+        try:
+            plan = explain()
+        except Exception as e:
+            self._logger.debug('Failed to explain query: {error}', error=str(e))
+            return None
+
+        return self._strip_plan(plan.get('queryPlanner', {}).get('winningPlan', plan))
+
+    @classmethod
+    def _strip_plan(cls, plan):
+        # type: (Any) -> Any
+        if isinstance(plan, dict):
+            return {key: cls.shape(value) if key in cls._plan_values else cls._strip_plan(value)
+                    for key, value in plan.items()}
+        elif isinstance(plan, list):
+            return [cls._strip_plan(value) for value in plan]
+        elif isinstance(plan, (six.string_types, bool, int, float)) or plan is None:
+            return plan
+
+        return str(plan)
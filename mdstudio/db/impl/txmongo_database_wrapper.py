@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+import time
+from typing import Optional, Dict, Any, List
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from twisted.internet.defer import succeed
+
+from mdstudio.db.database import CollectionType, DocumentType, Fields, SortOperators, ProjectionOperators, \
+    AggregationOperator
+from mdstudio.db.exception import DatabaseException
+from mdstudio.db.impl.cursor_batch import CursorBatch
+from mdstudio.db.impl.cursor_registry import CursorRegistry
+from mdstudio.db.impl.mongo_database_wrapper import MongoDatabaseWrapper
+from mdstudio.db.impl.query_profiler import QueryProfiler
+from mdstudio.db.index import Index
+from mdstudio.deferred.chainable import chainable
+from mdstudio.deferred.return_value import return_value
+
+
+class TxMongoCursor(object):
+    """
+    Buffers the batches of a txmongo cursor, so clients can page through the results
+    in batches of their own size. Aggregations are fetched as a whole by txmongo, in
+    which case the cursor only pages through the given documents.
+    """
+
+    def __init__(self, collection=None, filter=None, projection=None, skip=0, limit=0, sort=None, batch_size=0,
+                 documents=None):
+        self._collection = collection
+        self._query = {
+            'filter': filter,
+            'projection': projection,
+            'skip': skip,
+            'limit': limit,
+            'batch_size': batch_size
+        }
+        self._sort = sort
+        self._documents = documents
+
+        self._cursor = None
+        self._buffer = []
+        self.rewind()
+
+    @property
+    def alive(self):
+        # type: () -> bool
+        return bool(self._buffer) or (self._cursor is not None and not self._cursor.exhausted)
+
+    @chainable
+    def next(self, size):
+        # type: (int) -> List[dict]
+        while len(self._buffer) < size and self._cursor is not None and not self._cursor.exhausted:
+            batch = yield self._cursor.next_batch()
+            self._buffer.extend(batch)
+
+        results, self._buffer = self._buffer[:size], self._buffer[size:]
+        return_value(results)
+
+    def rewind(self):
+        self.close()
+
+        if self._documents is not None:
+            self._buffer = list(self._documents)
+        else:
+            self._buffer = []
+            self._cursor = self._collection.find(**self._query)
+            if self._sort:
+                self._cursor.sort(self._sort)
+
+    def count(self, with_limit_and_skip=False):
+        if self._documents is not None:
+            return succeed(len(self._documents))
+
+        if with_limit_and_skip:
+            return self._collection.count_documents(self._query['filter'] or {},
+                                                    skip=self._query['skip'] or None,
+                                                    limit=self._query['limit'] or None)
+
+        return self._collection.count_documents(self._query['filter'] or {})
+
+    def close(self):
+        if self._cursor is not None:
+            cursor, self._cursor = self._cursor, None
+            return cursor.close()
+
+
+# noinspection PyShadowingBuiltins
+class TxMongoDatabaseWrapper(MongoDatabaseWrapper):
+    """
+    Database wrapper on top of the twisted native txmongo driver. Instead of running
+    blocking pymongo calls in a thread pool, every call returns the deferred of the driver,
+    so many concurrent queries do not contend for pool threads.
+
+    The field conversions, cursors and responses are the same as for the `MongoDatabaseWrapper`.
+    """
+
+    def __init__(self, database_name, db, collection_cache_ttl=60, cursors=None, profiler=None, lazy_decryption=False,
+                 guided_date_conversion=False):
+        # type: (str, Database, int, Optional[CursorRegistry], Optional[QueryProfiler], bool, bool) -> None
+        super(TxMongoDatabaseWrapper, self).__init__(database_name, db, collection_cache_ttl=collection_cache_ttl,
+                                                     cursors=cursors, profiler=profiler,
+                                                     lazy_decryption=lazy_decryption,
+                                                     guided_date_conversion=guided_date_conversion)
+
+    @chainable
+    def more(self, cursor_id, claims=None, batch_size=None):
+        # type: (str, Optional[dict], Optional[int]) -> Dict[str, Any]
+        result = yield self._more(cursor_id, claims, batch_size)
+        return_value(result)
+
+    @chainable
+    def rewind(self, cursor_id, claims=None):
+        # type: (str) -> Dict[str, Any]
+        try:
+            self._cursors.get(self._database_name, cursor_id)[0].rewind()
+        except KeyError:
+            raise DatabaseException("Cursor with id '{}' is unknown".format(cursor_id))
+
+        result = yield self._more(cursor_id, claims)
+        return_value(result)
+
+    @chainable
+    def insert_one(self, collection, insert, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, True)
+
+        self._convert_fields(fields, {'insert': insert}, ['insert'], claims)
+        insert = self._prepare_for_mongo(insert)
+
+        result = yield db_collection.insert_one(insert)
+        return_value({
+            'id': str(result.inserted_id)
+        })
+
+    @chainable
+    def insert_many(self, collection, insert, fields=None, claims=None):
+        # type: (CollectionType, List[DocumentType], Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, True)
+
+        self._convert_documents(fields, insert, 'insert', claims)
+        insert = self._prepare_for_mongo(insert)
+
+        result = yield db_collection.insert_many(insert)
+        return_value({
+            'ids': [str(oid) for oid in result.inserted_ids]
+        })
+
+    @chainable
+    def replace_one(self, collection, filter, replacement, upsert=False, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, upsert)
+
+        if not db_collection:
+            return_value(self._update_response(upsert))
+
+        self._convert_fields(fields, {'filter': filter, 'replacement': replacement}, ['filter', 'replacement'], claims)
+
+        filter = self._prepare_for_mongo(filter)
+        replacement = self._prepare_for_mongo(replacement)
+
+        replace_result = yield db_collection.replace_one(filter, replacement, upsert)
+
+        return_value(self._update_response(upsert, result=replace_result))
+
+    @chainable
+    def count(self, collection=None, filter=None, skip=None, limit=None, fields=None, claims=None, cursor_id=None,
+              with_limit_and_skip=False):
+        # type: (CollectionType, Optional[DocumentType], Optional[int], Optional[int], Optional[Optional[Fields]], Optional[str]) -> Dict[str, Any]
+        total = 0
+        if cursor_id:
+            try:
+                cursor = self._cursors.get(self._database_name, cursor_id)[0]
+            except KeyError:
+                raise DatabaseException("Cursor with id '{}' is unknown".format(cursor_id))
+
+            total = yield cursor.count(with_limit_and_skip)
+        else:
+            db_collection = yield self._get_collection(collection)
+
+            if db_collection:
+                self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+                filter = self._prepare_for_mongo(filter)
+
+                started = time.time()
+                total = yield db_collection.count_documents(filter or {}, skip=skip or None, limit=limit or None)
+                self._profile('count', db_collection, filter, started, total)
+
+        return_value({
+            'total': total
+        })
+
+    @chainable
+    def update_one(self, collection, filter, update, upsert=False, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Optional[Fields]]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, upsert)
+
+        if not db_collection:
+            return_value(self._update_response(upsert))
+
+        self._convert_fields(fields, {'filter': filter, 'update': update}, ['filter', 'update'], claims)
+
+        filter = self._prepare_for_mongo(filter)
+        update = self._prepare_for_mongo(update)
+
+        result = yield db_collection.update_one(filter, update, upsert)
+
+        return_value(self._update_response(upsert, result=result))
+
+    @chainable
+    def update_many(self, collection, filter, update, upsert=False, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, DocumentType, bool, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, upsert)
+
+        if not db_collection:
+            return_value(self._update_response(upsert))
+
+        self._convert_fields(fields, {'filter': filter, 'update': update}, ['filter', 'update'], claims)
+        filter = self._prepare_for_mongo(filter)
+        update = self._prepare_for_mongo(update)
+
+        result = yield db_collection.update_many(filter, update, upsert)
+
+        return_value(self._update_response(upsert, result=result))
+
+    @chainable
+    def find_one(self, collection, filter, projection=None, skip=None, sort=None, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, ProjectionOperators, Optional[int], SortOperators, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        result = None
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+
+            started = time.time()
+            result = yield db_collection.find_one(filter, projection, skip=skip or 0, sort=self._prepare_sort(sort))
+            self._profile('find_one', db_collection, filter, started, 0 if result is None else 1)
+
+            result = self._prepare_result(claims, fields, result)
+
+        return_value({
+            'result': result
+        })
+
+    @chainable
+    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None, claims=None,
+                  batch_size=None, batch_bytes=None):
+        # type: (CollectionType, DocumentType, ProjectionOperators, Optional[int], Optional[int], SortOperators, Optional[Fields], Optional[dict], Optional[int], Optional[int]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        if not db_collection:
+            return_value({
+                'results': [],
+                'alive': False,
+                'size': 0
+            })
+
+        self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+        filter = self._prepare_for_mongo(filter)
+
+        # fixed batches are also used as server side batch size, adaptive batches use the server default
+        batch = CursorBatch(batch_size, batch_bytes)
+        started = time.time()
+        cursor = TxMongoCursor(db_collection, filter, projection, skip=skip or 0, limit=limit or 0,
+                               sort=self._prepare_sortmode(sort),
+                               batch_size=batch.size if batch.size and not batch.adaptive else 0)
+
+        result = yield self._get_cursor(cursor, fields=fields, claims=claims, batch=batch)
+        self._profile('find_many', db_collection, filter, started, result['size'])
+        return_value(result)
+
+    @chainable
+    def find_one_and_update(self, collection, filter, update, upsert=False, projection=None, sort=None,
+                            return_updated=False, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, DocumentType, bool, ProjectionOperators, SortOperators, bool, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, upsert)
+
+        result = None
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter, 'update': update}, ['filter', 'update'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+            update = self._prepare_for_mongo(update)
+
+            return_document = ReturnDocument.BEFORE if not return_updated else ReturnDocument.AFTER
+            result = yield db_collection.find_one_and_update(filter, update, projection, sort=self._prepare_sort(sort),
+                                                             upsert=upsert, return_document=return_document)
+
+            result = self._prepare_result(claims, fields, result)
+
+        return_value({
+            'result': result
+        })
+
+    @chainable
+    def find_one_and_replace(self, collection, filter, replacement, upsert=False, projection=None, sort=None,
+                             return_updated=False, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, DocumentType, bool, ProjectionOperators, SortOperators, bool, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection, upsert)
+
+        result = None
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter, 'replacement': replacement}, ['filter', 'replacement'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+            replacement = self._prepare_for_mongo(replacement)
+
+            return_document = ReturnDocument.BEFORE if not return_updated else ReturnDocument.AFTER
+            result = yield db_collection.find_one_and_replace(filter, replacement, projection,
+                                                              sort=self._prepare_sort(sort), upsert=upsert,
+                                                              return_document=return_document)
+
+            result = self._prepare_result(claims, fields, result)
+
+        return_value({
+            'result': result
+        })
+
+    @chainable
+    def find_one_and_delete(self, collection, filter, projection=None, sort=None, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, ProjectionOperators, SortOperators, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        result = None
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+
+            result = yield db_collection.find_one_and_delete(filter, projection, sort=self._prepare_sort(sort))
+
+            result = self._prepare_result(claims, fields, result)
+
+        return_value({
+            'result': result
+        })
+
+    @chainable
+    def distinct(self, collection, field, filter=None, fields=None, claims=None):
+        # type: (CollectionType, str, Optional[DocumentType], Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        results = []
+        if db_collection:
+
+            self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+
+            started = time.time()
+            results = yield db_collection.distinct(field, filter)
+            self._profile('distinct', db_collection, filter, started, len(results))
+
+            for result in results:
+                self._prepare_for_json(result)
+
+        return_value({
+            'results': results,
+            'total': len(results)
+        })
+
+    @chainable
+    def aggregate(self, collection, pipeline, batch_size=None, batch_bytes=None):
+        # type: (CollectionType, List[AggregationOperator], Optional[int], Optional[int]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        if not db_collection:
+            return_value({
+                'results': [],
+                'alive': False,
+                'size': 0
+            })
+
+        started = time.time()
+        documents = yield db_collection.aggregate(pipeline)
+
+        result = yield self._get_cursor(TxMongoCursor(documents=documents),
+                                        batch=CursorBatch(batch_size, batch_bytes))
+        self._profile('aggregate', db_collection, pipeline, started, result['size'])
+        return_value(result)
+
+    @chainable
+    def delete_one(self, collection, filter, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        count = 0
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+
+            result = yield db_collection.delete_one(filter)
+            count = result.deleted_count
+        return_value({
+            'count': count
+        })
+
+    @chainable
+    def delete_many(self, collection=None, filter=None, fields=None, claims=None):
+        # type: (CollectionType, DocumentType, Optional[Fields]) -> Dict[str, Any]
+        db_collection = yield self._get_collection(collection)
+
+        count = 0
+        if db_collection:
+            self._convert_fields(fields, {'filter': filter}, ['filter'], claims)
+
+            filter = self._prepare_for_mongo(filter)
+
+            result = yield db_collection.delete_many(filter)
+            count = result.deleted_count
+        return_value({
+            'count': count
+        })
+
+    @chainable
+    def bulk_write(self, collection, requests, ordered=True, fields=None, claims=None):
+        # type: (CollectionType, List[Dict[str, DocumentType]], bool, Optional[Fields]) -> Dict[str, Any]
+        operations = [self._parse_write_request(request) for request in requests]
+
+        if not operations:
+            return_value(self._bulk_write_response(operations, ordered))
+
+        db_collection = yield self._get_collection(collection, True)
+        models = self._prepare_write_models(operations, fields, claims)
+
+        try:
+            result = yield db_collection.bulk_write(models, ordered=ordered)
+            result = result.bulk_api_result
+        except BulkWriteError as e:
+            result = e.details
+
+        return_value(self._bulk_write_response(operations, ordered, result))
+
+    @chainable
+    def create_indexes(self, collection, indexes):
+        # type: (CollectionType, List[Index]) -> Any
+        from txmongo import filter as qf
+
+        db_collection = yield self._get_collection(collection)
+
+        names = []
+        if db_collection:
+            for i in indexes:
+                kwargs = i.to_dict(create=True, to_mongo=True)
+                name = yield db_collection.create_index(qf.sort(kwargs.pop('keys')), **kwargs)
+                names.append(name)
+
+        return_value({
+            'names': names
+        })
+
+    @chainable
+    def drop_indexes(self, collection, indexes):
+        # type: (CollectionType, List[Index]) -> Any
+        from txmongo import filter as qf
+
+        db_collection = yield self._get_collection(collection)
+
+        if db_collection:
+            for i in indexes:
+                yield db_collection.drop_index(i.name if i.name else qf.sort(i.keys))
+
+    @chainable
+    def drop_all_indexes(self, collection):
+        # type: (CollectionType) -> Any
+        db_collection = yield self._get_collection(collection)
+
+        if db_collection:
+            yield db_collection.drop_indexes()
+
+    @chainable
+    def _get_cursor(self, cursor, fields=None, claims=None, max_size=50, batch=None):
+        # type: (TxMongoCursor, Fields, dict, int, Optional[CursorBatch]) -> dict
+        if batch is None:
+            batch = CursorBatch()
+
+        results = yield cursor.next(batch.size or max_size)
+        for doc in results:
+            batch.observe(doc)
+            self._prepare_for_json(doc, fields)
+        batch.adapt()
+
+        results = self._parse_results(fields, claims, results)
+
+        return_value({
+            'results': results,
+            'size': len(results),
+            'cursorId': self._register_cursor(cursor, fields, batch),
+            'alive': cursor.alive and len(results) > 0
+        })
+
+    @chainable
+    def _more(self, cursor_id, claims, batch_size=None):
+        # type: (str, Optional[dict], Optional[int]) -> Dict[str, Any]
+        try:
+            # the cursor is registered again under a new id for the next batch
+            cursor, (fields, batch) = self._cursors.get(self._database_name, cursor_id, pop=True)
+        except KeyError:
+            raise DatabaseException("Cursor with id '{}' is unknown".format(cursor_id))
+
+        if batch_size:
+            batch.size = batch_size
+
+        try:
+            result = yield self._get_cursor(cursor, fields=fields, claims=claims, batch=batch)
+        except Exception:
+            # the cursor is no longer registered, so nobody would close it otherwise
+            cursor.close()
+            raise
+
+        return_value(result)
+
+    @chainable
+    def _get_collection(self, collection=None, create=False):
+        if isinstance(collection, dict):
+            collection_name = collection['name']
+        else:
+            collection_name = collection
+
+        if not self._is_cached_collection(collection_name):
+            names = yield self._db.collection_names()
+            if not self._update_collection_names(names, collection_name):
+                if create:
+                    self._logger.info('Creating collection {collection} in {database}', collection=collection_name,
+                                      database=self._database_name)
+                    # the collection only exists after the first write, so fetch the names again next time
+                    self.invalidate_collection_cache()
+                else:
+                    return_value(None)
+
+        return_value(self._db[collection_name])
+
+    def _profile(self, operation, db_collection, filter, started, count, command=None):
+        if self.profiler is None:
+            return
+
+        # the profiler explains slow queries synchronously, while txmongo only returns a deferred of the plan,
+        # so only the durations are recorded
+        self.profiler.record(self._database_name, operation, db_collection.name, filter, time.time() - started, count)
+
+    def _prepare_sort(self, sort):
+        sort = self._prepare_sortmode(sort)
+        if not sort:
+            return None
+
+        from txmongo import filter as qf
+        return qf.sort(sort)
@@ -1,4 +1,5 @@
 # coding=utf-8
+from typing import List
 
 
 class UpdateManyResponse(object):
@@ -44,3 +45,30 @@ class ReplaceOneResponse(object):
         self.matched = response['matched']
         self.modified = response['modified']
         self.upserted_id = response.get('upsertedId', None)
+
+
+class BulkWriteResponse(object):
+    # type: int
+    inserted = 0
+    # type: int
+    matched = 0
+    # type: int
+    modified = 0
+    # type: int
+    deleted = 0
+    # type: int
+    upserted = 0
+    # type: int
+    errors = 0
+    # type: List[dict]
+    results = None
+
+    def __init__(self, response):
+        # type: (dict) -> None
+        self.inserted = response['inserted']
+        self.matched = response['matched']
+        self.modified = response['modified']
+        self.deleted = response['deleted']
+        self.upserted = response['upserted']
+        self.errors = response.get('errors', 0)
+        self.results = response['results']
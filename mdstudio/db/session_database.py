@@ -25,12 +25,15 @@ class SessionDatabaseWrapper(IDatabase, ContextCallable):
         self.connection_type = connection_type
         ContextCallable.__init__(self, session)
 
-    def more(self, cursor_id):
-        # type: (str) -> Dict[str, Any]
-
-        return self._call('more', {
+    def more(self, cursor_id, batch_size=None):
+        # type: (str, Optional[int]) -> Dict[str, Any]
+        request = {
             'cursorId': cursor_id
-        })
+        }
+        if batch_size:
+            request['batchSize'] = batch_size
+
+        return self._call('more', request)
 
     def rewind(self, cursor_id):
         # type: (str) -> Dict[str, Any]
@@ -142,8 +145,9 @@ class SessionDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._call('find_one', request)
 
-    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None):
-        # type: (CollectionType, DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields]) -> Dict[str, Any]
+    def find_many(self, collection, filter, projection=None, skip=None, limit=None, sort=None, fields=None,
+                  batch_size=None, batch_bytes=None):
+        # type: (CollectionType, DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields], Optional[int], Optional[int]) -> Dict[str, Any]
         request = {
             'collection': collection,
             'filter': filter
@@ -159,6 +163,10 @@ class SessionDatabaseWrapper(IDatabase, ContextCallable):
             request['sort'] = self._prepare_sortmode(sort)
         if fields:
             request['fields'] = fields.to_dict()
+        if batch_size:
+            request['batchSize'] = batch_size
+        if batch_bytes:
+            request['batchBytes'] = batch_bytes
 
         return self._call('find_many', request)
 
@@ -232,12 +240,16 @@ class SessionDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._call('distinct', request)
 
-    def aggregate(self, collection, pipeline):
-        # type: (CollectionType, List[AggregationOperator]) -> Dict[str, Any]
+    def aggregate(self, collection, pipeline, batch_size=None, batch_bytes=None):
+        # type: (CollectionType, List[AggregationOperator], Optional[int], Optional[int]) -> Dict[str, Any]
         request = {
             'collection': collection,
             'pipeline': pipeline
         }
+        if batch_size:
+            request['batchSize'] = batch_size
+        if batch_bytes:
+            request['batchBytes'] = batch_bytes
 
         return self._call('aggregate', request)
 
@@ -263,6 +275,19 @@ class SessionDatabaseWrapper(IDatabase, ContextCallable):
 
         return self._call('delete_many', request)
 
+    def bulk_write(self, collection, requests, ordered=True, fields=None):
+        # type: (CollectionType, List[Dict[str, DocumentType]], bool, Optional[Fields]) -> Dict[str, Any]
+        request = {
+            'collection': collection,
+            'requests': requests
+        }
+        if not ordered:
+            request['ordered'] = ordered
+        if fields:
+            request['fields'] = fields.to_dict()
+
+        return self._call('bulk_write', request)
+
     def create_indexes(self, collection, indexes):
         # type: (CollectionType, str, List[Index]) -> Any
         indexes = []
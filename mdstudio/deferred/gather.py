@@ -0,0 +1,10 @@
+from twisted.internet.defer import Deferred, gatherResults, succeed
+
+
+def gather(results):
+    """
+    Waits for the deferreds in `results` concurrently, and fires with the list of their results in order.
+    Values that are not deferreds are passed through, and the first failure is passed on unwrapped.
+    """
+    deferreds = [result if isinstance(result, Deferred) else succeed(result) for result in results]
+    return gatherResults(deferreds, consumeErrors=True).addErrback(lambda failure: failure.value.subFailure)
@@ -1,23 +1,38 @@
 from threading import currentThread
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 
 from twisted.internet.threads import deferToThread
 
 from mdstudio.deferred.chainable import Chainable
 
 
-def make_deferred(method):
-    # type: (Callable) -> Callable[Any, Chainable]
+def make_deferred(method=None, pool=None):
+    # type: (Optional[Callable], Optional[str]) -> Callable[Any, Chainable]
     """
     Anyone with a love for their job, should NOT, and I repeat NOT touch this function.
     It has caused me endless frustration, and I hope you should never endure it :)
 
+    When a pool name is given, and the instance the method is bound to has `thread_pools`, the call
+    is run in that named pool instead of the global twisted thread pool.
+
     :param method:
+    :param pool:
     :return:
     """
 
-    def wrapper(*args, **kwargs):
-        assert currentThread().getName() == 'MainThread'
-        return Chainable(deferToThread(method, *args, **kwargs))
+    def decorator(method):
+        def wrapper(*args, **kwargs):
+            assert currentThread().getName() == 'MainThread'
+
+            thread_pools = getattr(args[0], 'thread_pools', None) if pool and args else None
+            if thread_pools is not None:
+                return Chainable(thread_pools.get(pool).defer(method, *args, **kwargs))
+
+            return Chainable(deferToThread(method, *args, **kwargs))
+
+        return wrapper
+
+    if method is None:
+        return decorator
 
-    return wrapper
+    return decorator(method)
@@ -0,0 +1,130 @@
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from twisted.internet import reactor
+from twisted.internet.defer import fail
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool as _ThreadPool
+
+
+class ThreadPoolFullException(Exception):
+    pass
+
+
+class ThreadPool(object):
+    """
+    A named thread pool with a bounded queue, that keeps track of its queue depth,
+    active workers and the time calls spent waiting for a worker.
+    """
+
+    def __init__(self, name, min_threads=1, max_threads=5, max_queue=1000):
+        # type: (str, int, int, Optional[int]) -> None
+        self.name = name
+        self.max_queue = max_queue
+
+        self._pool = _ThreadPool(min_threads, max_threads, name)
+        self._lock = Lock()
+
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def defer(self, method, *args, **kwargs):
+        # type: (Callable, *Any, **Any) -> Deferred
+        with self._lock:
+            if self.max_queue is not None and self.queued >= self.max_queue:
+                self.rejected += 1
+                return fail(ThreadPoolFullException('Thread pool "{}" has reached its queue limit of {} '
+                                                    'calls'.format(self.name, self.max_queue)))
+            self.queued += 1
+
+        if not self._pool.started:
+            self.start()
+
+        queued_at = time.time()
+
+        def run():
+            waited = time.time() - queued_at
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return deferToThreadPool(reactor, self._pool, run)
+
+    def start(self):
+        if not self._pool.started:
+            self._pool.start()
+            # noinspection PyUnresolvedReferences
+            reactor.addSystemEventTrigger('during', 'shutdown', self.stop)
+
+    def stop(self):
+        if self._pool.started:
+            self._pool.stop()
+
+    @property
+    def metrics(self):
+        # type: () -> Dict[str, Any]
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                'queued': self.queued,
+                'active': self.active,
+                'workers': len(self._pool.threads),
+                'maxWorkers': self._pool.max,
+                'maxQueue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'averageWait': self.total_wait / started if started else 0.0,
+                'maxWait': self.max_wait
+            }
+
+
+class ThreadPools(object):
+    """
+    Named thread pools for a single wrapper, configured by a settings dictionary of the form
+    `{'read': {'minThreads': 1, 'maxThreads': 10, 'maxQueue': 1000}, ...}`.
+    """
+
+    def __init__(self, prefix, settings=None):
+        # type: (str, Optional[Dict[str, Dict[str, int]]]) -> None
+        self.prefix = prefix
+        self.settings = settings or {}
+        self._pools = {}
+        self._lock = Lock()
+
+    def get(self, name):
+        # type: (str) -> ThreadPool
+        with self._lock:
+            if name not in self._pools:
+                settings = self.settings.get(name, {})
+                self._pools[name] = ThreadPool('{}-{}'.format(self.prefix, name),
+                                               min_threads=settings.get('minThreads', 1),
+                                               max_threads=settings.get('maxThreads', 5),
+                                               max_queue=settings.get('maxQueue', 1000))
+
+            return self._pools[name]
+
+    def stop(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.stop()
+
+    @property
+    def metrics(self):
+        # type: () -> Dict[str, Dict[str, Any]]
+        with self._lock:
+            pools = list(self._pools.items())
+
+        return {name: pool.metrics for name, pool in pools}
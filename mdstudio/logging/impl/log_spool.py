@@ -0,0 +1,122 @@
+# coding=utf-8
+import json
+import os
+import re
+from typing import Any, List, Optional
+
+
+class LogSpool(object):
+    """
+    Append-only spool of log records on disk, in segments of at most `segment_size` records stored as
+    newline delimited JSON. Records are read back in order from the oldest segment, and a segment is
+    deleted once all its records are acknowledged. Records that were read but not acknowledged before
+    a crash are read again, so every record is delivered at least once.
+    """
+
+    segment_pattern = re.compile(r'^(\d+)\.ndjson$')
+
+    def __init__(self, path, segment_size=1000):
+        # type: (str, int) -> None
+        self.path = path
+        self.segment_size = segment_size
+
+        # the segment that is appended to, where a partially written line of a crashed process is never appended to
+        self._tail = None  # type: Optional[int]
+        self._tail_size = 0
+        self._next = 0
+
+        # the oldest segment, with the offset of its first unacknowledged record, and of the records read after it
+        self._head = None  # type: Optional[int]
+        self._offset = 0
+        self._read_offset = 0
+
+    def append(self, records):
+        # type: (List[Any]) -> None
+        records = list(records)
+        if not records:
+            return
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        while records:
+            if self._tail is None or self._tail_size >= self.segment_size:
+                segments = self._segments()
+                self._tail = max([self._next] + [s + 1 for s in segments])
+                self._tail_size = 0
+                self._next = self._tail + 1
+
+            chunk, records = records[:self.segment_size - self._tail_size], records[self.segment_size - self._tail_size:]
+            with open(self._file(self._tail), 'a') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in chunk))
+            self._tail_size += len(chunk)
+
+    def read(self, count):
+        # type: (int) -> List[Any]
+        """
+        Reads at most `count` records from the oldest segment, starting at the first record that was
+        not acknowledged yet.
+        """
+        for segment in self._segments():
+            if segment != self._head:
+                self._head = segment
+                self._offset = 0
+
+            records = []
+            with open(self._file(segment), 'rb') as f:
+                f.seek(self._offset)
+                while len(records) < count:
+                    line = f.readline()
+                    if not line:
+                        break
+
+                    try:
+                        records.append(json.loads(line.decode('utf-8')))
+                    except ValueError:
+                        # lines that were only partially written by a crashed process are skipped
+                        pass
+
+                self._read_offset = f.tell()
+
+            if records:
+                return records
+
+            # the segment only held lines that were skipped
+            self.ack()
+
+        return []
+
+    def ack(self):
+        """
+        Acknowledges the records that were read last, deleting their segment once all its records are acknowledged.
+        """
+        if self._head is None:
+            return
+
+        self._offset = self._read_offset
+        path = self._file(self._head)
+        if self._offset >= os.path.getsize(path):
+            os.remove(path)
+            if self._head == self._tail:
+                self._tail = None
+
+            self._head = None
+            self._offset = 0
+            self._read_offset = 0
+
+    @property
+    def empty(self):
+        # type: () -> bool
+        return not self._segments()
+
+    def _segments(self):
+        # type: () -> List[int]
+        if not os.path.isdir(self.path):
+            return []
+
+        matches = (self.segment_pattern.match(name) for name in os.listdir(self.path))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def _file(self, segment):
+        # type: (int) -> str
+        return os.path.join(self.path, '{:010d}.ndjson'.format(segment))
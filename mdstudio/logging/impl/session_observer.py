@@ -1,13 +1,17 @@
 # coding=utf-8
 import json
+from collections import deque
 from datetime import datetime
+from enum import Enum
 
 import os
 import pytz
 import six
+from typing import Optional
 import twisted
 from autobahn.wamp.exception import ApplicationError, TransportLost
 from twisted.internet import task, reactor
+from twisted.internet.defer import Deferred, succeed
 from twisted.python.failure import Failure
 
 from mdstudio.api.exception import CallException
@@ -18,6 +22,8 @@ from mdstudio.logging.log_type import LogType
 from mdstudio.logging.logger import Logger
 from mdstudio.utc import to_utc_string
 from mdstudio.deferred.lock import Lock
+from mdstudio.deferred.return_value import return_value
+from mdstudio.logging.impl.log_spool import LogSpool
 
 # Python 2 compatibility.
 try:
@@ -27,16 +33,49 @@ except NameError:
     TimeoutError = socket.timeout
 
 
+class OverflowPolicy(Enum):
+    # the oldest buffered record is dropped to make room for a new one
+    DropOldest = 'drop-oldest'
+    # new records wait until a flush made room for them
+    Block = 'block'
+
+
 @six.add_metaclass(Singleton)
 class SessionLogObserver(object):
+    """
+    Collects the twisted log records in a bounded buffer, and pushes them through the session in
+    batches of at most `batch_size` records. The buffer is flushed every `flush_interval` seconds, and
+    as soon as it holds `flush_size` records. Once `capacity` records are buffered, new records are
+    handled according to the `policy`.
+    """
+
     log = Logger()
 
-    def __init__(self, session, log_type=LogType.User):
+    def __init__(self, session, log_type=LogType.User, capacity=10000, flush_size=100, batch_size=500,
+                 flush_interval=1, policy=OverflowPolicy.DropOldest):
         self.session = None
         self.sessions = []
         self.log_type = log_type
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.clock = reactor
+
+        self.dropped = 0
+        self.flushed = 0
+
+        self._buffer = deque()
+        # records that are being pushed, and still count towards the capacity
+        self._in_flight = 0
+        # records and their deferreds that wait for room in the buffer, with the block policy
+        self._waiting = deque()
+        self._scheduled_flush = None
+        # the records that could not be flushed, which is set when flushing starts
+        self.spool = None  # type: Optional[LogSpool]
+
         self.lock = Lock()
-        self.logs = []
         self.flusher_lock = Lock()
         self.flushing = False
 
@@ -64,57 +103,181 @@ class SessionLogObserver(object):
         # else:
         #     raise NotImplementedError('No message')
 
+    @property
+    def logs(self):
+        return list(self._buffer)
+
+    @logs.setter
+    def logs(self, logs):
+        self._buffer.clear()
+        for log in logs:
+            self._buffer.append(log)
+            if len(self._buffer) > self.capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+
+    @property
+    def stats(self):
+        return {
+            'size': len(self._buffer),
+            'waiting': len(self._waiting),
+            'dropped': self.dropped,
+            'flushed': self.flushed
+        }
+
     @chainable
     def store_recovery(self):
         yield self.lock.acquire()
-        if len(self.logs) > 0:
-            dirname = os.path.dirname(self.recovery_file(self.session))
-            if not os.path.exists(dirname):
-                os.makedirs(dirname)
-            with open(self.recovery_file(self.session), 'w') as recovery_file:
-                json.dump(self.logs, recovery_file)
-                self.logs = []
+        logs = self.logs + [log for log, _ in self._waiting]
+        if len(logs) > 0:
+            if self.spool is None:
+                self.spool = LogSpool(self.spool_path(self.session))
+            self.spool.append(logs)
+            self._buffer.clear()
+            self._waiting.clear()
         yield self.lock.release()
 
-    @chainable
     def append_log(self, log):
-        yield self.lock.acquire()
-        self.logs.append(log)
-        yield self.lock.release()
+        """
+        Buffers the log record, where the returned deferred fires with whether the record was buffered
+        or dropped, once that is known.
+        """
+        if len(self._buffer) + self._in_flight < self.capacity:
+            self._buffer.append(log)
+            d = succeed(True)
+        elif self.policy == OverflowPolicy.Block and len(self._waiting) < self.capacity:
+            d = Deferred()
+            self._waiting.append((log, d))
+        elif self.policy == OverflowPolicy.Block or not self._buffer:
+            # the waiting records are bounded too, since the twisted log observer cannot wait for room
+            self.dropped += 1
+            d = succeed(False)
+        else:
+            self._buffer.popleft()
+            self._buffer.append(log)
+            self.dropped += 1
+            d = succeed(True)
+
+        if len(self._buffer) >= self.flush_size or self._waiting:
+            self._schedule_flush()
+
+        return d
+
+    def _schedule_flush(self):
+        # the flush is postponed to the next reactor iteration, so a burst of records is flushed at once
+        if self.flushing and self._scheduled_flush is None:
+            self._scheduled_flush = self.clock.callLater(0, self._flush_scheduled)
+
+    def _flush_scheduled(self):
+        self._scheduled_flush = None
+        return self.flush_logs()
+
+    def _requeue(self, batch):
+        if self.spool is not None:
+            # the failed batch and the records buffered after it are spooled, to be streamed back once the
+            # logger is reachable again
+            try:
+                self.spool.append(batch + self.logs)
+            except (IOError, OSError) as e:
+                self.log.warn('Failed to spool logs: {error}', error=str(e))
+            else:
+                self._buffer.clear()
+                return
+
+        # failed batches are put back in front, since they hold the oldest records
+        self._buffer.extendleft(reversed(batch))
+
+    def _admit_waiting(self):
+        while self._waiting and len(self._buffer) + self._in_flight < self.capacity:
+            log, d = self._waiting.popleft()
+            self._buffer.append(log)
+            d.callback(True)
 
     @chainable
     def flush_logs(self):
         yield self.lock.acquire()
-        count = len(self.logs)
 
-        if count > 0:
-            # noinspection PyBroadException
+        # only the records buffered up till now are flushed, so a log storm cannot keep the flush going
+        remaining = len(self._buffer)
+        backoff = None
+
+        try:
+            # the spooled records are older than the buffered ones, so these are pushed first
+            backoff = yield self._flush_spool()
+            if backoff is not None:
+                self._requeue([])
+                remaining = 0
+
+            while remaining > 0:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, remaining, len(self._buffer)))]
+                if not batch:
+                    break
+
+                remaining -= len(batch)
+                self._in_flight = len(batch)
+
+                try:
+                    backoff = yield self._push(batch)
+                finally:
+                    self._in_flight = 0
+
+                if backoff is not None:
+                    self._requeue(batch)
+                    break
+
+                self._admit_waiting()
+        finally:
+            self._admit_waiting()
+            self.lock.release()
+
+        # the lock is released first, so backing off does not hold up storing the logs on shutdown
+        if backoff:
+            yield self.sleep(backoff)
+
+    @chainable
+    def _flush_spool(self):
+        # streams the spooled records back in batches, where a batch is only removed from the spool once it is pushed
+        if self.spool is None:
+            return_value(None)
+
+        while True:
             try:
-                yield self.session.flush_logs(self.logs)
-                self.logs = []
-            except TimeoutError as e:
-                yield self.lock.release()
-                print(e)
-                # The crossbar router is down, wait a few seconds to see if it is back up
-                yield self.sleep(3)
-            except (ApplicationError, TransportLost, CallException) as e:
-                yield self.lock.release()
-                print(e)
-                # The log or db component is probably not awake yet, wait a bit longer
-                yield self.sleep(1)
-            except Exception as e:
-                yield self.lock.release()
-                self.log.error('Unrecognized exception during logging {failure}', failure=e)
-            except:
-                yield self.lock.release()
-                raise
-            else:
-                yield self.lock.release()
+                batch = self.spool.read(self.batch_size)
+            except (IOError, OSError) as e:
+                self.log.warn('Failed to read spooled logs: {error}', error=str(e))
+                return_value(0)
+
+            if not batch:
+                return_value(None)
+
+            backoff = yield self._push(batch)
+            if backoff is not None:
+                return_value(backoff)
+
+            self.spool.ack()
+
+    @chainable
+    def _push(self, batch):
+        # returns None when the batch was pushed, and otherwise the seconds to back off before flushing again
+        # noinspection PyBroadException
+        try:
+            yield self.session.flush_logs(batch)
+        except TimeoutError as e:
+            print(e)
+            # The crossbar router is down, wait a few seconds to see if it is back up
+            backoff = 3
+        except (ApplicationError, TransportLost, CallException) as e:
+            print(e)
+            # The log or db component is probably not awake yet, wait a bit longer
+            backoff = 1
+        except Exception as e:
+            self.log.error('Unrecognized exception during logging {failure}', failure=e)
+            backoff = 0
         else:
-            yield self.lock.release()
+            self.flushed += len(batch)
+            backoff = None
 
-        if count < 10:
-            yield self.sleep(1)
+        return_value(backoff)
 
     @chainable
     def sleep(self, time):
@@ -124,15 +287,19 @@ class SessionLogObserver(object):
     def start_flushing(self, session):
         yield self.lock.acquire()
 
+        if self.spool is None:
+            self.spool = LogSpool(self.spool_path(session))
+
         recovery = self.recovery_file(session)
 
         if os.path.isfile(recovery):
+            # recovery files of earlier versions are moved to the spool
             # noinspection PyBroadException
             try:
                 with open(recovery, 'r') as recovery_file:
-                    self.logs = json.load(recovery_file)
+                    self.spool.append(json.load(recovery_file))
             except:
-                self.logs = []
+                pass
             finally:
                 os.remove(recovery)
 
@@ -142,7 +309,7 @@ class SessionLogObserver(object):
 
         if not self.flushing:
             self.session = session
-            self.flusher.start(1)
+            self.flusher.start(self.flush_interval)
             self.flushing = True
         else:
             self.sessions.append(session)
@@ -169,8 +336,16 @@ class SessionLogObserver(object):
                 self.flusher.stop()
                 self.flushing = False
 
+                if self._scheduled_flush is not None:
+                    self._scheduled_flush.cancel()
+                    self._scheduled_flush = None
+
         yield self.flusher_lock.release()
 
     @staticmethod
     def recovery_file(session):
         return os.path.join(session.component_root_path(), 'logs', 'recovery.json')
+
+    @staticmethod
+    def spool_path(session):
+        return os.path.join(session.component_root_path(), 'logs', 'spool')
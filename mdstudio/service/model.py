@@ -10,7 +10,7 @@ from mdstudio.db.database import DocumentType, ProjectionOperators, SortOperator
 from mdstudio.db.fields import Fields
 from mdstudio.db.impl.connection import GlobalConnection
 from mdstudio.db.index import Index
-from mdstudio.db.response import ReplaceOneResponse, UpdateOneResponse, UpdateManyResponse
+from mdstudio.db.response import ReplaceOneResponse, UpdateOneResponse, UpdateManyResponse, BulkWriteResponse
 from mdstudio.deferred.chainable import chainable, Chainable
 from mdstudio.deferred.return_value import return_value
 from mdstudio.api.context import ContextCallable
@@ -144,8 +144,9 @@ class Model(ContextCallable):
             fields.convert_call(result)
         return_value(result)
 
-    def find_many(self, filter, projection=None, skip=None, limit=None, sort=None, fields=None):
-        # type: (DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields]) -> Cursor
+    def find_many(self, filter, projection=None, skip=None, limit=None, sort=None, fields=None, batch_size=None,
+                  batch_bytes=None):
+        # type: (DocumentType, Optional[ProjectionOperators], Optional[int], Optional[int], SortOperators, Optional[Fields], Optional[int], Optional[int]) -> Cursor
         fields = self.fields(fields)
         results = self.wrapper.find_many(self.collection,
                                          filter=filter,
@@ -153,7 +154,8 @@ class Model(ContextCallable):
                                          skip=skip,
                                          limit=limit,
                                          sort=sort,
-                                         fields=fields)
+                                         fields=fields,
+                                         **self._batch_arguments(batch_size, batch_bytes))
 
         return self.wrapper.make_cursor(results, fields)
 
@@ -216,10 +218,11 @@ class Model(ContextCallable):
                                         fields=fields)
         return self.wrapper.extract(results, 'results')
 
-    def aggregate(self, pipeline):
-        # type: (List[AggregationOperator]) -> Cursor
+    def aggregate(self, pipeline, batch_size=None, batch_bytes=None):
+        # type: (List[AggregationOperator], Optional[int], Optional[int]) -> Cursor
         results = self.wrapper.aggregate(self.collection,
-                                         pipeline=pipeline)
+                                         pipeline=pipeline,
+                                         **self._batch_arguments(batch_size, batch_bytes))
         return self.wrapper.make_cursor(results, None)
 
     def delete_one(self, filter, fields=None):
@@ -238,6 +241,15 @@ class Model(ContextCallable):
                                                fields=fields)
         return self.wrapper.extract(delete_many, 'count')
 
+    def bulk_write(self, requests, ordered=True, fields=None):
+        # type: (List[Dict[str, DocumentType]], bool, Optional[Fields]) -> Union[BulkWriteResponse, Chainable]
+        fields = self.fields(fields)
+        bulk_write = self.wrapper.bulk_write(self.collection,
+                                             requests=requests,
+                                             ordered=ordered,
+                                             fields=fields)
+        return self.wrapper.transform(bulk_write, BulkWriteResponse)
+
     def create_indexes(self, collection, indexes):
         # type: (DocumentType, List[Index]) -> Any
 
@@ -269,6 +281,16 @@ class Model(ContextCallable):
     def _return_fields(self, fields):
         return fields
 
+    @staticmethod
+    def _batch_arguments(batch_size, batch_bytes):
+        # only pass the batch arguments when given, so wrappers are called exactly as before otherwise
+        arguments = {}
+        if batch_size:
+            arguments['batch_size'] = batch_size
+        if batch_bytes:
+            arguments['batch_bytes'] = batch_bytes
+        return arguments
+
     def _check_wrapper(self):
         assert isinstance(self._wrapper, IDatabase), 'Wrapper should inherit IDatabase'
         assert isinstance(self._wrapper, ContextCallable), 'Wrapper should inherit ContextCallable'
@@ -0,0 +1,74 @@
+import time
+
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.api.claims_cache import VerifiedClaimsCache
+
+
+class TestVerifiedClaimsCache(TestCase):
+    def setUp(self):
+        self.cache = VerifiedClaimsCache(ttl=60, max_size=2)
+        self.verified = {'claims': {'username': 'user', 'exp': time.time() + 600}}
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(self.cache.stats, {'hits': 0, 'misses': 1, 'expired': 0, 'size': 0, 'hitRatio': 0.0})
+
+    def test_get(self):
+        self.cache.put('token', self.verified)
+
+        self.assertEqual(self.cache.get('token'), self.verified)
+        self.assertIsNone(self.cache.get(b'other'))
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1, 'expired': 0, 'size': 1, 'hitRatio': 0.5})
+
+    def test_get_copy(self):
+        self.cache.put('token', self.verified)
+
+        self.cache.get('token')['claims']['username'] = 'other'
+        self.verified['claims']['username'] = 'other'
+
+        self.assertEqual(self.cache.get('token')['claims']['username'], 'user')
+
+    def test_put_failed(self):
+        self.cache.put('token', {'error': 'Invalid signature'})
+        self.cache.put('token2', {'expired': 'Claims have expired'})
+
+        self.assertEqual(self.cache.stats['size'], 0)
+
+    def test_put_expired(self):
+        self.cache.put('token', {'claims': {'exp': time.time() - 1}})
+
+        self.assertEqual(self.cache.stats['size'], 0)
+
+    def test_get_claims_expiry(self):
+        now = time.time()
+        self.cache.put('token', {'claims': {'exp': now + 10}})
+
+        with mock.patch('time.time', return_value=now + 11):
+            self.assertIsNone(self.cache.get('token'))
+
+        self.assertEqual(self.cache.stats, {'hits': 0, 'misses': 1, 'expired': 1, 'size': 0, 'hitRatio': 0.0})
+
+    def test_get_ttl(self):
+        now = time.time()
+        self.cache.put('token', self.verified)
+
+        with mock.patch('time.time', return_value=now + 61):
+            self.assertIsNone(self.cache.get('token'))
+
+    def test_put_evicts_least_recently_used(self):
+        self.cache.put('token', self.verified)
+        self.cache.put('token2', self.verified)
+        self.cache.get('token')
+        self.cache.put('token3', self.verified)
+
+        self.assertIsNotNone(self.cache.get('token'))
+        self.assertIsNone(self.cache.get('token2'))
+        self.assertIsNotNone(self.cache.get('token3'))
+
+    def test_clear(self):
+        self.cache.put('token', self.verified)
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get('token'))
@@ -3,7 +3,7 @@ from unittest import TestCase
 
 import pytz
 
-from mdstudio.api.converter import convert_obj_to_json
+from mdstudio.api.converter import convert_obj_to_json, convert_paths_to_json, date_paths
 
 
 class ConverterTest(TestCase):
@@ -113,3 +113,65 @@ class ConverterTest(TestCase):
             'date2': '2017-10-26',
             'date': '2017-10-26T09:16:00+00:00'
         })
+
+    def test_date_paths(self):
+        schema = {
+            'type': 'object',
+            'properties': {
+                'created': {'type': 'string', 'format': 'date-time'},
+                'day': {'type': 'string', 'format': 'date'},
+                'values': {'type': 'array', 'items': {'type': 'number'}},
+                'runs': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {'started': {'type': 'string', 'format': 'date-time'}}
+                    }
+                }
+            }
+        }
+        self.assertEqual(date_paths(schema), [('created',), ('day',), ('runs', 'started')])
+
+    def test_date_paths_combinators(self):
+        schema = {
+            'allOf': [
+                {'properties': {'a': {'format': 'date-time'}}},
+                {'properties': {'b': {'anyOf': [{'type': 'null'}, {'format': 'date'}]}}}
+            ],
+            'oneOf': [{'properties': {'a': {'format': 'date-time'}}}]
+        }
+        self.assertEqual(date_paths(schema), [('a',), ('b',)])
+
+    def test_date_paths_root(self):
+        self.assertEqual(date_paths({'type': 'string', 'format': 'date-time'}), [()])
+
+    def test_date_paths_none(self):
+        self.assertEqual(date_paths({'type': 'object', 'additionalProperties': {'type': 'number'}}), [])
+
+    def test_date_paths_reference(self):
+        self.assertIsNone(date_paths({'properties': {'a': {'$ref': 'resource://mdstudio/date/v1'}}}))
+
+    def test_date_paths_unnamed(self):
+        self.assertIsNone(date_paths({'additionalProperties': {'format': 'date-time'}}))
+        self.assertIsNone(date_paths({'patternProperties': {'^d': {'properties': {'a': {'format': 'date'}}}}}))
+
+    def test_convert_paths_to_json(self):
+        document = {
+            'created': datetime.datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc),
+            'other': datetime.datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc),
+            'runs': [
+                {'started': datetime.date(2017, 10, 26), 'values': [1, 2]},
+                {'started': [datetime.date(2017, 10, 26)]},
+                {'values': [3]}
+            ]
+        }
+        convert_paths_to_json(document, [('created',), ('runs', 'started'), ('missing', 'path')])
+        self.assertEqual(document, {
+            'created': '2017-10-26T09:16:00+00:00',
+            'other': datetime.datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc),
+            'runs': [
+                {'started': '2017-10-26', 'values': [1, 2]},
+                {'started': ['2017-10-26']},
+                {'values': [3]}
+            ]
+        })
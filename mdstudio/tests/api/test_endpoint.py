@@ -1 +1,106 @@
+import datetime
+import time
+
+import pytz
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.api.api_result import APIResult
+from mdstudio.api.claims_cache import VerifiedClaimsCache
 from mdstudio.api.endpoint import *
+
+
+class TestWampEndpoint(TestCase):
+    def setUp(self):
+        self.output_schema = {
+            'type': 'object',
+            'properties': {
+                'created': {'type': 'string', 'format': 'date-time'}
+            }
+        }
+        self.result = {
+            'created': datetime.datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc),
+            'other': datetime.date(2017, 10, 26)
+        }
+
+    def tearDown(self):
+        # the endpoints load the claims schema singleton, and share the verified claims
+        MDStudioClaimSchema._instance = None
+        WampEndpoint.verified_claims.clear()
+
+    def test_convert_result(self):
+        endpoint = WampEndpoint(lambda: None, 'test', {}, self.output_schema)
+
+        result = APIResult(self.result)
+        endpoint.convert_result(result)
+
+        self.assertEqual(result.data, {'created': '2017-10-26T09:16:00+00:00', 'other': '2017-10-26'})
+
+    def test_convert_result_schema_conversion(self):
+        endpoint = WampEndpoint(lambda: None, 'test', {}, self.output_schema, schema_conversion=True)
+
+        result = APIResult(self.result)
+        endpoint.convert_result(result)
+
+        self.assertEqual(result.data, {'created': '2017-10-26T09:16:00+00:00', 'other': datetime.date(2017, 10, 26)})
+
+    def test_convert_result_schema_conversion_fallback(self):
+        self.output_schema['properties']['other'] = {'$ref': 'resource://mdstudio/date/v1'}
+        endpoint = WampEndpoint(lambda: None, 'test', {}, self.output_schema, schema_conversion=True)
+
+        result = APIResult(self.result)
+        endpoint.convert_result(result)
+
+        self.assertEqual(result.data, {'created': '2017-10-26T09:16:00+00:00', 'other': '2017-10-26'})
+
+    def test_output_date_paths_cached(self):
+        endpoint = WampEndpoint(lambda: None, 'test', {}, self.output_schema, schema_conversion=True)
+        endpoint.output_schema = mock.MagicMock(wraps=endpoint.output_schema)
+
+        self.assertEqual(endpoint.output_date_paths(), [('created',)])
+        self.assertEqual(endpoint.output_date_paths(), [('created',)])
+
+        endpoint.output_schema.to_schema.assert_called_once_with()
+
+    @mock.patch('autobahn.twisted.wamp.ApplicationSession.call')
+    def test_execute_verified_claims_cached(self, call):
+        from mdstudio.component.impl.common import CommonSession
+
+        verified = {'claims': {'username': 'user', 'exp': time.time() + 600}}
+        call.return_value = verified
+        endpoint = WampEndpoint(lambda instance, request, claims: {'created': claims['username']}, 'test', {}, {})
+        endpoint.instance = CommonSession.__new__(CommonSession)
+        endpoint.validate_claims = mock.MagicMock(return_value=None)
+        endpoint.validate_result = mock.MagicMock(return_value=None)
+        self.patch(WampEndpoint, 'verified_claims', VerifiedClaimsCache())
+
+        for _ in range(3):
+            result = endpoint.execute({}, 'signed')
+            self.assertEqual(self.successResultOf(result), {'data': {'created': 'user'}})
+
+        call.assert_called_once_with(u'mdstudio.auth.endpoint.verify', 'signed')
+        self.assertEqual(endpoint.verified_claims.stats['hits'], 2)
+
+    def test_validate_request_compiled_once(self):
+        schema = {'type': 'object', 'properties': {'count': {'type': 'integer', 'default': 2}}}
+        endpoint = WampEndpoint(lambda: None, 'test', schema, {})
+
+        with mock.patch('mdstudio.api.endpoint.compile_validator', wraps=compile_validator) as compile:
+            request = {}
+            self.assertIsNone(endpoint.validate_request(request))
+            self.assertIsNotNone(endpoint.validate_request({'count': 'two'}))
+
+        self.assertEqual(request, {'count': 2})
+        compile.assert_any_call(schema, False)
+        self.assertEqual(compile.call_count, 2 + len(endpoint.claim_schemas))
+
+    def test_compile_validators(self):
+        endpoint = WampEndpoint(lambda: None, 'test', {}, {})
+        validators = endpoint.validators()
+
+        self.assertIs(endpoint.validators(), validators)
+        self.assertIsNot(endpoint.compile_validators(), validators)
+
+    def test_endpoint_fast_validation(self):
+        self.assertFalse(endpoint('test', {})(lambda: None).fast_validation)
+        self.assertTrue(endpoint('test', {}, fast_validation=True)(lambda: None).fast_validation)
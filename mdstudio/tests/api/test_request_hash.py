@@ -0,0 +1,86 @@
+# coding=utf-8
+import json
+from base64 import b64encode
+from collections import OrderedDict
+from datetime import datetime, date
+from hashlib import sha512
+
+import pytz
+from twisted.trial.unittest import TestCase
+
+from mdstudio.api.request_hash import request_hash, canonical_request
+
+
+def dumps_hash(request):
+    return b64encode(sha512(json.dumps(request, sort_keys=True).encode('utf8')).digest()).decode('utf8')
+
+
+class TestRequestHash(TestCase):
+    def test_request_hash(self):
+        request = {'b': [1, 2.5, None], 'a': {'d': True, 'c': u'ünïcode'}}
+
+        self.assertEqual(request_hash(request), dumps_hash(request))
+
+    def test_request_hash_dates(self):
+        request = {'created': datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc), 'day': date(2017, 10, 26)}
+
+        self.assertEqual(request_hash(request), dumps_hash({'created': '2017-10-26T09:16:00+00:00', 'day': '2017-10-26'}))
+
+
+class TestCanonicalRequest(TestCase):
+    def assertCanonical(self, request):
+        wire, hashed = canonical_request(request)
+
+        self.assertEqual(wire, request)
+        self.assertEqual(hashed, dumps_hash(request))
+
+    def test_scalars(self):
+        for value in [u'test', u'ünï\n"code"', 0, -12, 2 ** 70, 1.5, 1e-20, 1e100, True, False, None]:
+            self.assertCanonical(value)
+
+    def test_special_floats(self):
+        for value in [float('nan'), float('inf'), -float('inf')]:
+            self.assertEqual(canonical_request(value)[1], dumps_hash(value))
+
+    def test_nested(self):
+        self.assertCanonical({
+            'z': [{'b': 1, 'a': [1, [2, {}], []]}, u'ü'],
+            'a': {'c': {'e': None, 'd': False}},
+            'm': OrderedDict([('y', 1), ('x', 2)])
+        })
+
+    def test_keys(self):
+        self.assertCanonical({2: 'a', 10: 'b'})
+        self.assertCanonical({1.5: 'a', 2.5: 'b'})
+        self.assertCanonical({True: 'a', False: 'b'})
+        self.assertCanonical({None: 'a'})
+
+    def test_tuple(self):
+        wire, hashed = canonical_request({'a': (1, 2)})
+
+        self.assertEqual(wire, {'a': [1, 2]})
+        self.assertEqual(hashed, dumps_hash({'a': [1, 2]}))
+
+    def test_dates(self):
+        request = {
+            'created': datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc),
+            'days': [date(2017, 10, 26), {'day': date(2017, 10, 27)}]
+        }
+        wire, hashed = canonical_request(request)
+
+        expected = {'created': '2017-10-26T09:16:00+00:00', 'days': ['2017-10-26', {'day': '2017-10-27'}]}
+        self.assertEqual(wire, expected)
+        self.assertEqual(hashed, dumps_hash(expected))
+        self.assertEqual(hashed, request_hash(wire))
+
+    def test_request_untouched(self):
+        request = {'created': datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc), 'list': [{'a': 1}]}
+        wire, _ = canonical_request(request)
+
+        self.assertEqual(request['created'], datetime(2017, 10, 26, 9, 16, tzinfo=pytz.utc))
+        self.assertIsNot(wire['list'], request['list'])
+        self.assertIsNot(wire['list'][0], request['list'][0])
+
+    def test_unsupported(self):
+        self.assertRaises(TypeError, canonical_request, {'a': object()})
+        self.assertRaises(TypeError, canonical_request, {(1, 2): 'a'})
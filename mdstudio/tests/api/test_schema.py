@@ -1,14 +1,17 @@
 import json
 
 import os
+import unittest
 from faker import Faker
 from jsonschema import ValidationError
 from mock import mock
 from pyfakefs.fake_filesystem_unittest import Patcher, TestCase
+from twisted.internet.defer import Deferred
 
 from mdstudio.api.exception import RegisterException
 from mdstudio.api.schema import ISchema, ResourceSchema, EndpointSchema, HttpsSchema, InlineSchema, ClaimSchema, validate_json_schema, \
-    MDStudioClaimSchema
+    MDStudioClaimSchema, compile_validator, fastjsonschema
+from mdstudio.api.schema_cache import SchemaCache, file_digest
 from mdstudio.deferred.chainable import test_chainable
 from mdstudio.unittest.db import DBTestCase
 
@@ -257,6 +260,31 @@ class ISchemaTests(DBTestCase):
                 session.component_schemas_path = mock.MagicMock(return_value=base_path)
                 yield self.assertFailure(schema._recurse_subschemas(content, session), RegisterException)
 
+    def test_recurse_subschemas_concurrent(self):
+        flattens = {'a': Deferred(), 'b': Deferred()}
+        subschemas = {}
+        for name in flattens:
+            subschemas[name] = mock.MagicMock()
+            subschemas[name].flatten = mock.MagicMock(return_value=flattens[name])
+            subschemas[name].to_schema = mock.MagicMock(return_value={'type': name})
+            subschemas[name].dependencies = {'/{}.json'.format(name): name}
+
+        schema = ISchema()
+        schema._schema_factory = mock.MagicMock(side_effect=lambda schema_type, path: subschemas[path])
+        content = {'properties': {'a': {'$ref': 'endpoint://a'}, 'b': {'$ref': 'endpoint://b'}}}
+
+        out = schema._recurse_subschemas(content, None)
+        subschemas['a'].flatten.assert_called_once_with(None)
+        subschemas['b'].flatten.assert_called_once_with(None)
+
+        flattens['b'].callback(True)
+        flattens['a'].callback(True)
+        self.assertEqual(self.successResultOf(out), {
+            'schema': {'properties': {'a': {'type': 'a'}, 'b': {'type': 'b'}}},
+            'success': True
+        })
+        self.assertEqual(schema.dependencies, {'/a.json': 'a', '/b.json': 'b'})
+
     def test_schema_factory_resource(self):
 
         for i in range(50):
@@ -569,6 +597,46 @@ class EndpointSchemaTests(DBTestCase):
                 self.assertFalse((yield schema.flatten(session)))
 
 
+    @test_chainable
+    def test_flatten_dependencies(self):
+        base_path = self.mktemp()
+        os.makedirs(os.path.join(base_path, 'endpoints'))
+        with open(os.path.join(base_path, 'endpoints', 'test.v1.json'), 'w') as f:
+            f.write('{"type": "string"}')
+        session = mock.MagicMock()
+        session.component_schemas_path = mock.MagicMock(return_value=base_path)
+        self.patch(ISchema, 'cache', SchemaCache())
+
+        schema = EndpointSchema('test/v1')
+        self.assertTrue((yield schema.flatten(session)))
+
+        path = os.path.abspath(os.path.join(base_path, 'endpoints', 'test.v1.json'))
+        self.assertEqual(schema.cached, {1: {'type': 'string'}})
+        self.assertEqual(schema.dependencies, {path: file_digest(b'{"type": "string"}')})
+
+    @test_chainable
+    def test_flatten_persistent(self):
+        base_path = self.mktemp()
+        os.makedirs(os.path.join(base_path, 'endpoints'))
+        with open(os.path.join(base_path, 'endpoints', 'test.v1.json'), 'w') as f:
+            f.write('{"type": "string"}')
+        session = mock.MagicMock()
+        session.component_schemas_path = mock.MagicMock(return_value=base_path)
+        cache_path = self.mktemp()
+
+        self.patch(ISchema, 'cache', SchemaCache(cache_path))
+        self.assertTrue((yield EndpointSchema('test/v1').flatten(session)))
+
+        self.patch(ISchema, 'cache', SchemaCache(cache_path))
+        schema = EndpointSchema('test/v1')
+        schema._recurse_subschemas = mock.MagicMock()
+        self.assertTrue((yield schema.flatten(session)))
+
+        self.assertEqual(schema.cached, {1: {'type': 'string'}})
+        self.assertFalse(schema._recurse_subschemas.called)
+        self.assertEqual(ISchema.cache.stats['diskHits'], 1)
+
+
 class ClaimSchemaTests(DBTestCase):
     faker = Faker()
 
@@ -934,6 +1002,41 @@ class ResourceSchemaTests(DBTestCase):
                 self.assertFalse((yield schema.flatten(session)))
 
 
+    @test_chainable
+    def test_flatten_shared(self):
+        content = {'type': 'object'}
+        session = mock.MagicMock()
+        group_context = mock.MagicMock()
+        group_context.call = mock.MagicMock(return_value=content)
+        session.group_context = mock.MagicMock(return_value=group_context)
+        self.patch(ISchema, 'cache', SchemaCache())
+
+        schema = ResourceSchema('vendor/component/test/v1,2')
+        schema2 = ResourceSchema('vendor/component/test/v1,2')
+        self.assertTrue((yield schema.flatten(session)))
+        self.assertTrue((yield schema2.flatten(session)))
+
+        self.assertEqual(schema.cached, {1: content, 2: content})
+        self.assertEqual(schema2.cached, {1: content, 2: content})
+        self.assertEqual(group_context.call.call_count, 2)
+
+    def test_retrieve_wamp_concurrent(self):
+        calls = [Deferred(), Deferred()]
+        session = mock.MagicMock()
+        group_context = mock.MagicMock()
+        group_context.call = mock.MagicMock(side_effect=calls)
+        session.group_context = mock.MagicMock(return_value=group_context)
+
+        schema = ResourceSchema('vendor/component/test/v1,2')
+        retrieved = schema._retrieve_wamp(session)
+        self.assertEqual(group_context.call.call_count, 2)
+
+        calls[1].callback({'version': 2})
+        calls[0].callback({'version': 1})
+        self.successResultOf(retrieved)
+        self.assertEqual(schema.cached, {1: {'version': 1}, 2: {'version': 2}})
+
+
 class ValidateTests(TestCase):
     def test_validate_json_schema(self):
         validate_json_schema({'format': 'uri', 'type': 'string'}, 'https://example.com')
@@ -979,6 +1082,80 @@ class ValidateTests(TestCase):
     def test_validate_json_schema_fail2(self):
         self.assertRaises(ValidationError, validate_json_schema, {'format': 'uri', 'type': 'string'}, 'example')
 
+    def test_compile_validator(self):
+        validate = compile_validator({'format': 'ipv4', 'type': 'string'})
+
+        validate('127.0.0.1')
+        self.assertRaises(ValidationError, validate, 2)
+        self.assertRaises(ValidationError, validate, 'example')
+
+    def test_compile_validator_default(self):
+        validate = compile_validator({
+            'type': 'object',
+            'properties': {
+                'test': {
+                    'type': 'integer'
+                },
+                'test2': {
+                    'type': 'integer',
+                    'default': 5
+                }
+            }
+        })
+
+        doc = {'test': 2}
+        validate(doc)
+        self.assertEqual(doc, {
+            'test': 2,
+            'test2': 5
+        })
+        self.assertRaises(ValidationError, validate, {'test': 'string'})
+
+    @unittest.skipIf(fastjsonschema is None, 'fastjsonschema is not installed')
+    def test_compile_validator_fast(self):
+        validate = compile_validator({
+            'type': 'object',
+            'properties': {
+                'test': {
+                    'type': 'integer',
+                    'maximum': 3,
+                    'exclusiveMaximum': True
+                },
+                'test2': {
+                    'type': 'integer',
+                    'default': 5
+                }
+            }
+        }, fast=True)
+
+        doc = {'test': 2}
+        validate(doc)
+        self.assertEqual(doc, {
+            'test': 2,
+            'test2': 5
+        })
+        self.assertRaises(ValidationError, validate, {'test': 3})
+        self.assertRaises(ValidationError, validate, {'test': 'string'})
+
+    @unittest.skipIf(fastjsonschema is None, 'fastjsonschema is not installed')
+    def test_compile_validator_fast_error(self):
+        schema = {'type': 'object', 'properties': {'test': {'type': 'integer'}}}
+
+        with self.assertRaises(ValidationError) as fast_context:
+            compile_validator(schema, fast=True)({'test': 'string'})
+        with self.assertRaises(ValidationError) as context:
+            compile_validator(schema)({'test': 'string'})
+
+        self.assertEqual(list(fast_context.exception.schema_path), list(context.exception.schema_path))
+
+    @unittest.skipIf(fastjsonschema is None, 'fastjsonschema is not installed')
+    def test_compile_validator_fast_remote_ref(self):
+        with mock.patch('fastjsonschema.compile', side_effect=RegisterException('unsupported')):
+            validate = compile_validator({'type': 'string'}, fast=True)
+
+        validate('test')
+        self.assertRaises(ValidationError, validate, 2)
+
 
 class MDStudioClaimSchemaTests(TestCase):
     def test_construction(self):
@@ -0,0 +1,147 @@
+import json
+import os
+
+from mock import mock
+from twisted.internet.defer import Deferred, fail
+from twisted.trial.unittest import TestCase
+
+from mdstudio.api.schema_cache import SchemaCache, file_digest
+
+
+class TestSchemaCache(TestCase):
+    def setUp(self):
+        self.cache = SchemaCache()
+        self.entry = ({1: {'type': 'string'}}, {})
+
+    def test_flatten(self):
+        flatten = mock.MagicMock(return_value=self.entry)
+
+        self.assertEqual(self.successResultOf(self.cache.flatten('key', flatten)), self.entry)
+        self.assertEqual(self.successResultOf(self.cache.flatten('key', flatten)), self.entry)
+
+        flatten.assert_called_once_with()
+        self.assertEqual(self.cache.stats, {'hits': 1, 'diskHits': 0, 'misses': 1, 'size': 1})
+
+    def test_flatten_shared(self):
+        d = Deferred()
+        flatten = mock.MagicMock(return_value=d)
+
+        first = self.cache.flatten('key', flatten)
+        second = self.cache.flatten('key', flatten)
+        self.assertNoResult(first)
+        self.assertNoResult(second)
+
+        d.callback(self.entry)
+
+        self.assertEqual(self.successResultOf(first), self.entry)
+        self.assertEqual(self.successResultOf(second), self.entry)
+        flatten.assert_called_once_with()
+
+    def test_flatten_failed(self):
+        flatten = mock.MagicMock(return_value=None)
+
+        self.assertIsNone(self.successResultOf(self.cache.flatten('key', flatten)))
+        self.assertIsNone(self.successResultOf(self.cache.flatten('key', flatten)))
+
+        self.assertEqual(flatten.call_count, 2)
+        self.assertEqual(self.cache.stats['size'], 0)
+
+    def test_flatten_error(self):
+        d = Deferred()
+
+        first = self.cache.flatten('key', lambda: d)
+        second = self.cache.flatten('key', lambda: d)
+        d.errback(KeyError('test'))
+
+        self.failureResultOf(first, KeyError)
+        self.failureResultOf(second, KeyError)
+        self.assertEqual(self.successResultOf(self.cache.flatten('key', lambda: self.entry)), self.entry)
+
+    def test_flatten_error_sync(self):
+        self.failureResultOf(self.cache.flatten('key', lambda: fail(KeyError('test'))), KeyError)
+
+    def test_clear(self):
+        flatten = mock.MagicMock(return_value=self.entry)
+
+        self.cache.flatten('key', flatten)
+        self.cache.clear()
+        self.cache.flatten('key', flatten)
+
+        self.assertEqual(flatten.call_count, 2)
+
+
+class TestSchemaCacheDisk(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.dependency = os.path.abspath(self.mktemp())
+        with open(self.dependency, 'wb') as f:
+            f.write(b'{"type": "string"}')
+        self.entry = ({1: {'type': 'string'}}, {self.dependency: file_digest(b'{"type": "string"}')})
+
+    def test_store(self):
+        SchemaCache(self.path).flatten('key', lambda: self.entry)
+
+        files = os.listdir(self.path)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(self.path, files[0]), 'r') as f:
+            self.assertEqual(json.load(f), {
+                'key': 'key',
+                'versions': {'1': {'type': 'string'}},
+                'dependencies': self.entry[1]
+            })
+
+    def test_load(self):
+        SchemaCache(self.path).flatten('key', lambda: self.entry)
+
+        cache = SchemaCache(self.path)
+        flatten = mock.MagicMock(return_value=self.entry)
+
+        self.assertEqual(self.successResultOf(cache.flatten('key', flatten)), self.entry)
+        self.assertFalse(flatten.called)
+        self.assertEqual(cache.stats, {'hits': 0, 'diskHits': 1, 'misses': 0, 'size': 1})
+
+    def test_load_changed_dependency(self):
+        SchemaCache(self.path).flatten('key', lambda: self.entry)
+        with open(self.dependency, 'wb') as f:
+            f.write(b'{"type": "integer"}')
+
+        cache = SchemaCache(self.path)
+        flatten = mock.MagicMock(return_value=self.entry)
+        cache.flatten('key', flatten)
+
+        flatten.assert_called_once_with()
+
+    def test_load_removed_dependency(self):
+        SchemaCache(self.path).flatten('key', lambda: self.entry)
+        os.remove(self.dependency)
+
+        flatten = mock.MagicMock(return_value=self.entry)
+        SchemaCache(self.path).flatten('key', flatten)
+
+        flatten.assert_called_once_with()
+
+    def test_load_other_key(self):
+        SchemaCache(self.path).flatten('key', lambda: self.entry)
+
+        flatten = mock.MagicMock(return_value=self.entry)
+        SchemaCache(self.path).flatten('key2', flatten)
+
+        flatten.assert_called_once_with()
+
+    def test_load_corrupt(self):
+        cache = SchemaCache(self.path)
+        cache.flatten('key', lambda: self.entry)
+        with open(cache._file('key'), 'w') as f:
+            f.write('{"key": ')
+
+        flatten = mock.MagicMock(return_value=self.entry)
+        SchemaCache(self.path).flatten('key', flatten)
+
+        flatten.assert_called_once_with()
+
+    def test_store_failure(self):
+        with open(self.path, 'w') as f:
+            f.write('not a directory')
+
+        cache = SchemaCache(self.path)
+        self.assertEqual(self.successResultOf(cache.flatten('key', lambda: self.entry)), self.entry)
@@ -77,3 +77,14 @@ class TestCacheDict(TestCase):
 
         self.assertFalse('test' in self.d)
         self.assertFalse('test2' in self.d)
+
+    def test_purge(self):
+        self.d['test'] = 1
+
+        sleep(1)
+
+        self.d['test2'] = 2
+        self.d.purge()
+
+        self.assertEqual(list(self.d.keys()), ['test2'])
+        self.assertEqual(self.d['test2'], 2)
@@ -0,0 +1,127 @@
+# coding=utf-8
+from autobahn.wamp import ApplicationError
+from mock import mock
+from twisted.internet.defer import succeed, fail, Deferred
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.component.impl.claim_signer import ClaimSigner
+
+
+class TestClaimSigner(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.call = mock.MagicMock()
+        self.signer = ClaimSigner(self.call, clock=self.clock, max_batch_size=3)
+
+    def sign_batch(self, uri, claims):
+        if uri == ClaimSigner.sign_batch_uri:
+            return succeed(['signed-{}'.format(c['id']) for c in claims])
+        return succeed('signed-{}'.format(claims['id']))
+
+    def test_sign_single(self):
+        self.call.side_effect = self.sign_batch
+
+        d = self.signer.sign({'id': 1})
+        self.call.assert_not_called()
+        self.clock.advance(0)
+
+        self.call.assert_called_once_with(ClaimSigner.sign_uri, {'id': 1})
+        self.assertEqual(self.successResultOf(d), 'signed-1')
+
+    def test_sign_batch(self):
+        self.call.side_effect = self.sign_batch
+
+        d1 = self.signer.sign({'id': 1})
+        d2 = self.signer.sign({'id': 2})
+        self.clock.advance(0)
+
+        self.call.assert_called_once_with(ClaimSigner.sign_batch_uri, [{'id': 1}, {'id': 2}])
+        self.assertEqual(self.successResultOf(d1), 'signed-1')
+        self.assertEqual(self.successResultOf(d2), 'signed-2')
+        self.assertEqual(self.signer.stats, {
+            'batches': 1,
+            'claims': 2,
+            'maxBatchSize': 2,
+            'averageBatchSize': 2.0,
+            'roundTrips': 1,
+            'batching': True
+        })
+
+    def test_sign_window(self):
+        self.call.side_effect = self.sign_batch
+        self.signer.window = 0.01
+
+        self.signer.sign({'id': 1})
+        self.clock.advance(0.005)
+        self.signer.sign({'id': 2})
+        self.call.assert_not_called()
+        self.clock.advance(0.005)
+
+        self.call.assert_called_once_with(ClaimSigner.sign_batch_uri, [{'id': 1}, {'id': 2}])
+
+    def test_sign_max_batch_size(self):
+        self.call.side_effect = self.sign_batch
+
+        ds = [self.signer.sign({'id': i}) for i in range(4)]
+
+        self.call.assert_called_once_with(ClaimSigner.sign_batch_uri, [{'id': 0}, {'id': 1}, {'id': 2}])
+        self.clock.advance(0)
+
+        self.assertEqual([self.successResultOf(d) for d in ds], ['signed-{}'.format(i) for i in range(4)])
+        self.assertEqual(self.signer.stats['batches'], 2)
+        self.assertEqual(self.signer.stats['maxBatchSize'], 3)
+        self.assertFalse(self.clock.getDelayedCalls())
+
+    def test_sign_batch_not_supported(self):
+        def call(uri, claims):
+            if uri == ClaimSigner.sign_batch_uri:
+                return fail(ApplicationError(ApplicationError.NO_SUCH_PROCEDURE))
+            return succeed('signed-{}'.format(claims['id']))
+
+        self.call.side_effect = call
+
+        d1 = self.signer.sign({'id': 1})
+        d2 = self.signer.sign({'id': 2})
+        self.clock.advance(0)
+
+        self.assertEqual(self.successResultOf(d1), 'signed-1')
+        self.assertEqual(self.successResultOf(d2), 'signed-2')
+        self.assertFalse(self.signer.batching)
+
+        self.call.reset_mock()
+        self.signer.sign({'id': 3})
+        self.signer.sign({'id': 4})
+        self.clock.advance(0)
+
+        self.call.assert_has_calls([mock.call(ClaimSigner.sign_uri, {'id': 3}),
+                                    mock.call(ClaimSigner.sign_uri, {'id': 4})])
+
+    def test_sign_batch_fails(self):
+        self.call.return_value = fail(ApplicationError(u'mdstudio.error'))
+
+        d1 = self.signer.sign({'id': 1})
+        d2 = self.signer.sign({'id': 2})
+        self.clock.advance(0)
+
+        self.failureResultOf(d1, ApplicationError)
+        self.failureResultOf(d2, ApplicationError)
+        self.assertTrue(self.signer.batching)
+
+    def test_sign_batch_wrong_size(self):
+        self.call.return_value = succeed(['signed-1'])
+
+        d1 = self.signer.sign({'id': 1})
+        d2 = self.signer.sign({'id': 2})
+        self.clock.advance(0)
+
+        self.failureResultOf(d1, ApplicationError)
+        self.failureResultOf(d2, ApplicationError)
+
+    def test_sign_single_unsigned(self):
+        self.call.return_value = succeed(None)
+
+        d = self.signer.sign({'id': 1})
+        self.clock.advance(0)
+
+        self.assertIsNone(self.successResultOf(d))
@@ -1,12 +1,22 @@
 import os
+import shutil
+import tempfile
+
 from autobahn.wamp import ComponentConfig
 from faker import Faker
 from jsonschema import ValidationError
 from mock import mock, call
 from pyfakefs.fake_filesystem_unittest import Patcher
+from twisted.internet.defer import Deferred
 from unittest2 import TestCase
 
+from mdstudio.api.endpoint import WampEndpoint
+from mdstudio.api.exception import CallException, RegisterException
+from mdstudio.api.schema import MDStudioClaimSchema
+from mdstudio.component.impl.claim_signer import ClaimSigner
 from mdstudio.component.impl.common import CommonSession
+from mdstudio.component.impl.startup_timeline import StartupTimeline
+from mdstudio.deferred.chainable import Chainable
 
 
 # noinspection PyCompatibility
@@ -37,6 +47,9 @@ class TestCommonSession(TestCase):
         self.session.extract_custom_scopes.assert_called_once_with()
         self.assertEqual(self.session.function_scopes, {'scopes': True})
 
+    def test_construction_claim_signer(self):
+        self.assertIsInstance(self.session.claim_signer, ClaimSigner)
+
     def test_construction2(self):
         class TestSession(CommonSession):
             load_environment = mock.MagicMock()
@@ -289,6 +302,105 @@ class TestCommonSession(TestCase):
         self.assertEqual(self.session.mdstudio_schemas_path(),
                          os.path.realpath(os.path.join(os.path.dirname(__file__), '../../../schemas')))
 
+    def test_schema_cache_path(self):
+        with mock.patch.dict('os.environ', {'MDSTUDIO_SCHEMA_CACHE': '/tmp/schemas'}):
+            self.assertEqual(self.session.schema_cache_path(), '/tmp/schemas')
+
+    def test_schema_cache_path_default(self):
+        with mock.patch.dict('os.environ'):
+            os.environ.pop('MDSTUDIO_SCHEMA_CACHE', None)
+            self.assertEqual(self.session.schema_cache_path(),
+                             os.path.join(os.path.expanduser('~'), '.cache', 'mdstudio', 'schemas'))
+
+    def test_schema_cache_path_disabled(self):
+        with mock.patch.dict('os.environ', {'MDSTUDIO_SCHEMA_CACHE': ''}):
+            self.assertIsNone(self.session.schema_cache_path())
+
+    def test_flatten_endpoint_schemas(self):
+        shared = mock.MagicMock()
+        input_schema = mock.MagicMock()
+        input_schema2 = mock.MagicMock()
+
+        class TestSession(CommonSession):
+            load_settings = mock.MagicMock()
+            validate_settings = mock.MagicMock()
+            extract_custom_scopes = mock.MagicMock(return_value={'scopes': True})
+
+            endpoint = mock.Mock(spec=['input_schema', 'output_schema', 'claim_schemas'], input_schema=input_schema,
+                                 output_schema=shared, claim_schemas=[shared])
+            endpoint2 = mock.Mock(spec=['input_schema', 'output_schema'], input_schema=input_schema2, output_schema=shared)
+
+        # schema.flatten is chainable, which DeferredSemaphore.run would take as already fired
+        flattens = {schema: Deferred() for schema in [shared, input_schema, input_schema2]}
+        for schema, flattened in flattens.items():
+            schema.flatten.return_value = Chainable(flattened)
+
+        session = TestSession()
+        done = []
+        session.flatten_endpoint_schemas().addCallback(done.append)
+
+        input_schema.flatten.assert_called_once_with(session)
+        input_schema2.flatten.assert_called_once_with(session)
+        shared.flatten.assert_called_once_with(session)
+
+        for flattened in flattens.values():
+            self.assertEqual(done, [])
+            flattened.callback(True)
+
+        self.assertEqual(done, [None])
+
+    def test_flatten_endpoint_schemas_failure(self):
+        input_schema = mock.MagicMock()
+        flattened = Deferred()
+        input_schema.flatten.return_value = Chainable(flattened)
+
+        class TestSession(CommonSession):
+            load_settings = mock.MagicMock()
+            validate_settings = mock.MagicMock()
+            extract_custom_scopes = mock.MagicMock(return_value={'scopes': True})
+
+            endpoint = mock.Mock(spec=['input_schema'], input_schema=input_schema)
+
+        session = TestSession()
+        failures = []
+        session.flatten_endpoint_schemas().addErrback(failures.append)
+        self.assertEqual(failures, [])
+
+        flattened.errback(RegisterException('Schema does not exist'))
+
+        self.assertEqual(len(failures), 1)
+        self.assertIsInstance(failures[0].value, RegisterException)
+
+    def test_flatten_endpoint_schemas_concurrency(self):
+        schemas = [mock.MagicMock() for _ in range(3)]
+        flattens = [Deferred() for _ in schemas]
+        for schema, flattened in zip(schemas, flattens):
+            schema.flatten.return_value = Chainable(flattened)
+
+        class TestSession(CommonSession):
+            load_settings = mock.MagicMock()
+            validate_settings = mock.MagicMock()
+            extract_custom_scopes = mock.MagicMock(return_value={'scopes': True})
+            startup_concurrency = 2
+
+            endpoint = mock.Mock(spec=['input_schema'], input_schema=schemas[0])
+            endpoint2 = mock.Mock(spec=['input_schema'], input_schema=schemas[1])
+            endpoint3 = mock.Mock(spec=['input_schema'], input_schema=schemas[2])
+
+        session = TestSession()
+        done = []
+        session.flatten_endpoint_schemas().addCallback(done.append)
+        self.assertEqual(sum(schema.flatten.call_count for schema in schemas), 2)
+
+        next(flattened for schema, flattened in zip(schemas, flattens) if schema.flatten.called).callback(True)
+        self.assertEqual(sum(schema.flatten.call_count for schema in schemas), 3)
+
+        for flattened in flattens:
+            if not flattened.called:
+                flattened.callback(True)
+
+        self.assertEqual(done, [None])
+
     def test_settings_files(self):
 
         with mock.patch.dict('os.environ'):
@@ -406,3 +518,141 @@ class TestCommonSession(TestCase):
 
         with Patcher() as patcher:
             TestSession()
+
+    def create_schemas(self):
+        schemas_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, schemas_path)
+
+        os.makedirs(os.path.join(schemas_path, 'endpoints'))
+        os.makedirs(os.path.join(schemas_path, 'resources', 'nested'))
+        for path, content in [('endpoints/test.v1.json', '{"type": "string"}'),
+                              ('resources/nested/other.json', '{"type": "integer"}')]:
+            with open(os.path.join(schemas_path, path), 'w') as f:
+                f.write(content)
+
+        self.session.component_schemas_path = mock.MagicMock(return_value=schemas_path)
+        self.session.component_config.static['vendor'] = 'vendor'
+        self.session.component_config.static['component'] = 'component'
+        self.session.group_context = mock.MagicMock()
+
+        return self.session.group_context.return_value
+
+    def test_schema_files(self):
+        self.create_schemas()
+
+        files = self.session._schema_files('endpoints')
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0]['name'], 'test')
+        self.assertEqual(files[0]['version'], 1)
+        self.assertEqual(files[0]['data'], b'{"type": "string"}')
+        self.assertNotEqual(files[0]['hash'], self.session._schema_files('resources')[0]['hash'])
+
+    def test_collect_schemas(self):
+        self.create_schemas()
+
+        self.assertEqual(self.session._collect_schemas('endpoints'), [{'schema': {'type': 'string'}, 'name': 'test', 'version': 1}])
+        self.assertEqual(self.session._collect_schemas('resources'), [{'schema': {'type': 'integer'}, 'name': 'nested/other'}])
+
+    def test_upload_schemas_changed(self):
+        context = self.create_schemas()
+        endpoint_hash = self.session._schema_files('endpoints')[0]['hash']
+        resource_hash = self.session._schema_files('resources')[0]['hash']
+        context.call = mock.MagicMock(side_effect=[{'hashes': [resource_hash]}, None])
+
+        self.session.upload_schemas()
+
+        self.session.group_context.assert_called_once_with('vendor')
+        context.call.assert_has_calls([
+            call(u'mdstudio.schema.endpoint.known', {
+                'component': 'component',
+                'hashes': [endpoint_hash, resource_hash]
+            }, claims={'vendor': 'vendor'}),
+            call(u'mdstudio.schema.endpoint.upload', {
+                'component': 'component',
+                'schemas': {
+                    'endpoints': [{'schema': {'type': 'string'}, 'name': 'test', 'version': 1, 'hash': endpoint_hash}],
+                    'resources': []
+                }
+            }, claims={'vendor': 'vendor'})
+        ])
+
+    def test_upload_schemas_unchanged(self):
+        context = self.create_schemas()
+        hashes = [f['hash'] for f in self.session._schema_files('endpoints') + self.session._schema_files('resources')]
+        context.call = mock.MagicMock(return_value={'hashes': hashes})
+
+        self.session.upload_schemas()
+
+        self.assertEqual(context.call.call_count, 1)
+
+    def test_upload_schemas_unsupported(self):
+        context = self.create_schemas()
+        context.call = mock.MagicMock(side_effect=[CallException('Call to mdstudio.schema.endpoint.known failed'), None])
+
+        self.session.upload_schemas()
+
+        context.call.assert_called_with(u'mdstudio.schema.endpoint.upload', {
+            'component': 'component',
+            'schemas': {
+                'endpoints': [{'schema': {'type': 'string'}, 'name': 'test', 'version': 1}],
+                'resources': [{'schema': {'type': 'integer'}, 'name': 'nested/other'}]
+            }
+        }, claims={'vendor': 'vendor'})
+
+    def test_upload_schemas_none(self):
+        schemas_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, schemas_path)
+        self.session.component_schemas_path = mock.MagicMock(return_value=schemas_path)
+        self.session.group_context = mock.MagicMock()
+
+        self.session.upload_schemas()
+
+        self.assertFalse(self.session.group_context.called)
+
+    def test_construction_startup_timeline(self):
+        self.assertIsInstance(self.session.startup_timeline, StartupTimeline)
+        self.assertEqual([p['phase'] for p in self.session.startup_timeline.phases], ['load_settings', 'validate_settings'])
+
+    def test_register_endpoints(self):
+        # the endpoints load the claims schema singleton
+        self.addCleanup(setattr, MDStudioClaimSchema, '_instance', None)
+        registrations = [Deferred() for _ in range(3)]
+
+        class TestSession(CommonSession):
+            load_settings = mock.MagicMock()
+            validate_settings = mock.MagicMock()
+            extract_custom_scopes = mock.MagicMock(return_value={'scopes': True})
+            startup_concurrency = 2
+
+            endpoint = WampEndpoint(lambda: None, 'endpoint', {}, {})
+            endpoint2 = WampEndpoint(lambda: None, 'endpoint2', {}, {})
+            endpoint3 = WampEndpoint(lambda: None, 'endpoint3', {}, {})
+
+        session = TestSession()
+        session.component_config.static['vendor'] = 'vendor'
+        session.component_config.static['component'] = 'component'
+        endpoints = [TestSession.endpoint, TestSession.endpoint2, TestSession.endpoint3]
+        for endpoint, registration in zip(endpoints, registrations):
+            endpoint.register = mock.MagicMock(return_value=registration)
+
+        results = []
+        session.register_endpoints().addCallback(results.append)
+        self.assertEqual(sum(endpoint.register.call_count for endpoint in endpoints), 2)
+
+        started = [registration for endpoint, registration in zip(endpoints, registrations) if endpoint.register.called]
+        started[0].callback(None)
+        self.assertEqual(sum(endpoint.register.call_count for endpoint in endpoints), 3)
+
+        for registration in registrations:
+            if not registration.called:
+                registration.errback(Exception('Registration failed'))
+
+        self.assertEqual(sorted(results[0]), [False, False, True])
+        self.assertEqual(sorted(endpoint.uri for endpoint in endpoints), [
+            'vendor.component.endpoint.endpoint',
+            'vendor.component.endpoint.endpoint2',
+            'vendor.component.endpoint.endpoint3'
+        ])
+
+    def test_online_topic(self):
+        self.assertEqual(CommonSession.online_topic('vendor', 'component'), 'vendor.component.event.online')
@@ -1 +1,89 @@
+from mock import mock
+from twisted.internet.defer import succeed, fail, Deferred
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.api.exception import CallException
+from mdstudio.component.impl.common import CommonSession
 from mdstudio.component.impl.core import *
+
+
+class TestComponentWaiter(TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.subscription = mock.MagicMock()
+        self.subscription.unsubscribe.return_value = succeed(None)
+        self.session = mock.MagicMock()
+        self.session.online_topic = CommonSession.online_topic
+        self.session.on_event.return_value = succeed(self.subscription)
+        self.waiter = CoreComponentSession.ComponentWaiter(self.session, 'db', clock=self.clock)
+
+    def test_wait_online(self):
+        self.session.call.return_value = succeed(True)
+
+        self.successResultOf(self.waiter.wait())
+
+        self.session.on_event.assert_called_once_with(self.waiter._on_online, 'mdstudio.db.event.online')
+        self.session.call.assert_called_once_with('mdstudio.auth.endpoint.ring0.get-status', {'component': 'db'}, context=None)
+        self.subscription.unsubscribe.assert_called_once_with()
+
+    def test_wait_event(self):
+        self.session.call.return_value = succeed(False)
+
+        d = self.waiter.wait()
+        self.assertNoResult(d)
+
+        self.waiter._on_online()
+
+        self.successResultOf(d)
+        self.assertEqual(self.session.call.call_count, 1)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.subscription.unsubscribe.assert_called_once_with()
+
+    def test_wait_backoff(self):
+        self.session.call.return_value = succeed(False)
+        self.waiter.min_interval = 1
+        self.waiter.max_interval = 8
+
+        d = self.waiter.wait()
+        for interval in [1, 2, 4, 8, 8]:
+            self.clock.advance(interval - 0.5)
+            calls = self.session.call.call_count
+            self.clock.advance(0.5)
+            self.assertEqual(self.session.call.call_count, calls + 1)
+
+        self.session.call.return_value = succeed(True)
+        self.clock.advance(8)
+
+        self.successResultOf(d)
+
+    def test_wait_call_exception(self):
+        self.session.call.side_effect = [fail(CallException('Not online')), fail(Exception('Unrecognized')), succeed(True)]
+
+        d = self.waiter.wait()
+        self.clock.advance(0.1)
+        self.clock.advance(0.2)
+
+        self.successResultOf(d)
+        self.assertEqual(self.session.call.call_count, 3)
+
+    def test_wait_subscribe_failed(self):
+        self.session.on_event.return_value = fail(Exception('Not authorized'))
+        self.session.call.side_effect = [succeed(False), succeed(True)]
+
+        d = self.waiter.wait()
+        self.clock.advance(0.1)
+
+        self.successResultOf(d)
+        self.assertFalse(self.subscription.unsubscribe.called)
+
+    def test_wait_event_before_poll(self):
+        status = Deferred()
+        self.session.call.return_value = status
+
+        d = self.waiter.wait()
+        self.waiter._on_online()
+        status.callback(False)
+
+        self.successResultOf(d)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
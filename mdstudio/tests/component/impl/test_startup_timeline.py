@@ -0,0 +1,83 @@
+from mock import mock
+from twisted.internet.defer import Deferred, fail
+from twisted.trial.unittest import TestCase
+
+from mdstudio.component.impl.startup_timeline import StartupTimeline
+
+
+class TestStartupTimeline(TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.timeline = StartupTimeline(clock=lambda: self.now)
+
+    def test_start_stop(self):
+        self.now = 101.0
+        self.timeline.start('flatten')
+        self.now = 103.5
+        self.timeline.stop('flatten')
+
+        self.assertEqual(self.timeline.phases, [{'phase': 'flatten', 'start': 1.0, 'duration': 2.5}])
+        self.assertEqual(self.timeline.total, 3.5)
+
+    def test_running(self):
+        self.timeline.start('register')
+
+        self.assertEqual(self.timeline.phases, [{'phase': 'register', 'start': 0.0, 'duration': None}])
+        self.assertEqual(self.timeline.total, 0.0)
+        self.assertEqual(self.timeline.summary(), 'register: running')
+
+    def test_stop_unknown(self):
+        self.timeline.stop('register')
+
+        self.assertEqual(self.timeline.phases, [])
+
+    def test_restart(self):
+        self.timeline.start('register')
+        self.timeline.start('flatten')
+        self.now = 102.0
+        self.timeline.start('register')
+
+        self.assertEqual([p['phase'] for p in self.timeline.phases], ['flatten', 'register'])
+        self.assertEqual(self.timeline.phases[1]['start'], 2.0)
+
+    def test_phase(self):
+        with self.timeline.phase('load_settings'):
+            self.now = 100.25
+
+        self.assertEqual(self.timeline.phases, [{'phase': 'load_settings', 'start': 0.0, 'duration': 0.25}])
+
+    def test_phase_exception(self):
+        def load():
+            with self.timeline.phase('load_settings'):
+                self.now = 100.5
+                raise ValueError()
+
+        self.assertRaises(ValueError, load)
+        self.assertEqual(self.timeline.phases[0]['duration'], 0.5)
+
+    def test_run(self):
+        d = Deferred()
+        f = mock.MagicMock(return_value=d)
+
+        result = self.timeline.run('upload_schemas', f, 1, test=2)
+        f.assert_called_once_with(1, test=2)
+        self.assertEqual(self.timeline.phases[0]['duration'], None)
+
+        self.now = 102.0
+        d.callback('uploaded')
+        self.assertEqual(self.successResultOf(result), 'uploaded')
+        self.assertEqual(self.timeline.phases[0]['duration'], 2.0)
+
+    def test_run_failure(self):
+        result = self.timeline.run('upload_schemas', lambda: fail(ValueError()))
+
+        self.failureResultOf(result, ValueError)
+        self.assertEqual(self.timeline.phases[0]['duration'], 0.0)
+
+    def test_summary(self):
+        with self.timeline.phase('flatten'):
+            self.now = 100.5
+        with self.timeline.phase('register'):
+            self.now = 101.75
+
+        self.assertEqual(self.timeline.summary(), 'flatten: 0.500s, register: 1.250s')
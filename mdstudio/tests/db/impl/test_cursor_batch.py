@@ -0,0 +1,73 @@
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.impl.cursor_batch import CursorBatch
+
+
+class TestCursorBatch(TestCase):
+    def test_construct(self):
+        batch = CursorBatch()
+
+        self.assertIsNone(batch.size)
+        self.assertFalse(batch.adaptive)
+
+    def test_construct_size(self):
+        batch = CursorBatch(20)
+
+        self.assertEqual(batch.size, 20)
+        self.assertFalse(batch.adaptive)
+
+    def test_construct_adaptive(self):
+        batch = CursorBatch(max_bytes=1024)
+
+        self.assertEqual(batch.size, 50)
+        self.assertTrue(batch.adaptive)
+
+    def test_construct_assert(self):
+        with self.assertRaises(AssertionError):
+            CursorBatch(-1)
+        with self.assertRaises(AssertionError):
+            CursorBatch(max_bytes=-1)
+
+    def test_adapt_fixed(self):
+        batch = CursorBatch(20)
+        batch.observe({'test': 'x' * 100})
+        batch.adapt()
+
+        self.assertEqual(batch.size, 20)
+
+    def test_adapt_grows(self):
+        batch = CursorBatch(10, 100000)
+
+        for _ in range(10):
+            batch.observe({'test': 'x' * 100})
+        batch.adapt()
+        self.assertEqual(batch.size, 20)
+
+        batch.adapt()
+        self.assertEqual(batch.size, 40)
+
+    def test_adapt_budget(self):
+        batch = CursorBatch(100, 1000)
+
+        for _ in range(10):
+            batch.observe({'test': 'x' * 100})
+        batch.adapt()
+
+        # every document takes 116 bytes
+        self.assertEqual(batch.size, 8)
+
+    def test_adapt_max_size(self):
+        batch = CursorBatch(8000, 10 ** 9)
+
+        batch.observe({'test': 1})
+        batch.adapt()
+
+        self.assertEqual(batch.size, CursorBatch.max_size)
+
+    def test_observe_samples(self):
+        batch = CursorBatch(10, 100000)
+
+        for _ in range(20):
+            batch.observe({'test': 1})
+
+        self.assertEqual(batch._sampled, CursorBatch.sample_size)
@@ -0,0 +1,172 @@
+from time import sleep
+
+from mock import mock
+from twisted.internet.task import Clock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.impl.cursor_registry import CursorRegistry
+
+
+class TestCursorRegistry(TestCase):
+    def setUp(self):
+        self.d = CursorRegistry(max_cursors=3, max_cursors_per_owner=2, max_age_seconds=1, sweep_interval=None)
+
+        reactor_patch = mock.patch('mdstudio.db.impl.cursor_registry.reactor')
+        self.reactor = reactor_patch.start()
+        self.addCleanup(reactor_patch.stop)
+
+    def test_construct(self):
+        self.assertEqual(self.d.max_cursors, 3)
+        self.assertEqual(self.d.max_cursors_per_owner, 2)
+        self.assertEqual(self.d.max_age, 1)
+        self.assertEqual(self.d.stats, {'live': 0, 'owners': {}, 'evicted': 0, 'expired': 0})
+
+    def test_construct_assert(self):
+        with self.assertRaises(AssertionError):
+            CursorRegistry(max_cursors=0)
+        with self.assertRaises(AssertionError):
+            CursorRegistry(max_cursors_per_owner=0)
+        with self.assertRaises(AssertionError):
+            CursorRegistry(max_age_seconds=-1)
+
+    def test_get(self):
+        cursor = mock.MagicMock()
+        state = mock.MagicMock()
+        self.d.add('owner', 'id', cursor, state)
+
+        self.assertEqual(self.d.get('owner', 'id'), (cursor, state))
+        self.assertIn('id', self.d)
+        self.assertEqual(self.d.stats['owners'], {'owner': 1})
+        cursor.close.assert_not_called()
+
+    def test_get_unknown(self):
+        with self.assertRaises(KeyError):
+            self.d.get('owner', 'id')
+
+    def test_get_other_owner(self):
+        self.d.add('owner', 'id', mock.MagicMock())
+
+        with self.assertRaises(KeyError):
+            self.d.get('owner2', 'id')
+
+    def test_get_pop(self):
+        cursor = mock.MagicMock()
+        self.d.add('owner', 'id', cursor)
+
+        self.assertEqual(self.d.get('owner', 'id', pop=True), (cursor, None))
+        self.assertNotIn('id', self.d)
+        self.assertEqual(self.d.stats['owners'], {})
+        cursor.close.assert_not_called()
+
+    def test_get_expired(self):
+        cursor = mock.MagicMock()
+        self.d.add('owner', 'id', cursor)
+
+        sleep(1)
+
+        with self.assertRaises(KeyError):
+            self.d.get('owner', 'id')
+        cursor.close.assert_called_once_with()
+        self.assertEqual(self.d.stats, {'live': 0, 'owners': {}, 'evicted': 0, 'expired': 1})
+
+    def test_remove(self):
+        cursor = mock.MagicMock()
+        self.d.add('owner', 'id', cursor)
+
+        self.d.remove('owner2', 'id')
+        self.assertIn('id', self.d)
+
+        self.d.remove('owner', 'id')
+        self.assertNotIn('id', self.d)
+        cursor.close.assert_called_once_with()
+
+    def test_evict_owner_quota(self):
+        cursors = [mock.MagicMock() for _ in range(3)]
+        self.d.add('owner', 'id0', cursors[0])
+        self.d.add('owner', 'id1', cursors[1])
+        self.d.get('owner', 'id0')
+        self.d.add('owner', 'id2', cursors[2])
+
+        self.assertEqual(len(self.d), 2)
+        self.assertNotIn('id1', self.d)
+        cursors[1].close.assert_called_once_with()
+        cursors[0].close.assert_not_called()
+        self.assertEqual(self.d.stats['evicted'], 1)
+
+    def test_evict_least_recently_used(self):
+        cursors = [mock.MagicMock() for _ in range(4)]
+        self.d.add('owner', 'id0', cursors[0])
+        self.d.add('owner2', 'id1', cursors[1])
+        self.d.add('owner3', 'id2', cursors[2])
+        self.d.get('owner', 'id0')
+        self.d.add('owner4', 'id3', cursors[3])
+
+        self.assertEqual(len(self.d), 3)
+        self.assertNotIn('id1', self.d)
+        cursors[1].close.assert_called_once_with()
+        self.assertEqual(self.d.stats['owners'], {'owner': 1, 'owner3': 1, 'owner4': 1})
+
+    def test_sweep(self):
+        cursor = mock.MagicMock()
+        self.d.add('owner', 'id', cursor)
+
+        self.assertEqual(self.d.sweep(), 0)
+
+        sleep(1)
+        cursor2 = mock.MagicMock()
+        self.d.add('owner', 'id2', cursor2)
+
+        self.assertEqual(self.d.sweep(), 1)
+        cursor.close.assert_called_once_with()
+        cursor2.close.assert_not_called()
+        self.assertEqual(self.d.stats, {'live': 1, 'owners': {'owner': 1}, 'evicted': 0, 'expired': 1})
+
+    def test_close_failure(self):
+        cursor = mock.MagicMock()
+        cursor.close.side_effect = ValueError()
+        self.d._logger = mock.MagicMock()
+        self.d.add('owner', 'id', cursor)
+
+        self.d.remove('owner', 'id')
+
+        self.d._logger.warn.assert_called_once()
+
+    def test_stop(self):
+        cursors = [mock.MagicMock(), mock.MagicMock()]
+        self.d.add('owner', 'id', cursors[0])
+        self.d.add('owner2', 'id2', cursors[1])
+
+        self.d.stop()
+
+        cursors[0].close.assert_called_once_with()
+        cursors[1].close.assert_called_once_with()
+        self.assertEqual(self.d.stats['live'], 0)
+
+    def test_shutdown_trigger(self):
+        self.d.add('owner', 'id', mock.MagicMock())
+        self.d.add('owner', 'id2', mock.MagicMock())
+
+        self.reactor.callFromThread.assert_called_once_with(self.reactor.addSystemEventTrigger, 'during', 'shutdown',
+                                                            self.d.stop)
+
+    def test_add_after_stop(self):
+        self.d.stop()
+        self.d.add('owner', 'id', mock.MagicMock())
+
+        self.reactor.callFromThread.assert_not_called()
+        self.assertIsNone(self.d._sweeper)
+
+    def test_sweep_in_reactor(self):
+        d = CursorRegistry(max_age_seconds=0, sweep_interval=10, sweep_in_reactor=True)
+        d.clock = Clock()
+        cursor = mock.MagicMock()
+        d.add('owner', 'id', cursor)
+
+        cursor.close.assert_not_called()
+        d.clock.advance(10)
+        cursor.close.assert_called_once_with()
+        self.assertEqual(d.stats['expired'], 1)
+
+        d.stop()
+        self.assertFalse(d._sweeper.running)
+        self.assertEqual(d.clock.getDelayedCalls(), [])
@@ -4,6 +4,8 @@ from mock import mock
 
 from mdstudio.db.impl.mongo_client_wrapper import MongoClientWrapper
 from mdstudio.db.impl.mongo_database_wrapper import MongoDatabaseWrapper
+from mdstudio.db.impl.query_profiler import QueryProfiler
+from mdstudio.db.impl.txmongo_database_wrapper import TxMongoDatabaseWrapper
 from mdstudio.unittest import db
 from mdstudio.unittest.db import DBTestCase
 
@@ -48,3 +50,66 @@ class TestMongoClientWrapper(DBTestCase):
         db.create_mock_client = True
 
         self.assertIsInstance(MongoClientWrapper.create_mongo_client('localhost', 2), mongomock.MongoClient)
+
+    def test_construction_unknown_driver(self):
+        with self.assertRaises(ValueError):
+            MongoClientWrapper("localhost", 27127, driver='motor')
+
+    def test_get_database_txmongo(self):
+        client = mock.MagicMock()
+        with mock.patch.object(MongoClientWrapper, 'create_txmongo_client', return_value=client):
+            d = MongoClientWrapper("localhost", 27127, driver='txmongo')
+
+        ldb = d.get_database('database_name')
+
+        self.assertIsInstance(ldb, TxMongoDatabaseWrapper)
+        self.assertIs(ldb._db, client['database_name'])
+        self.assertIs(ldb._cursors, d.cursors)
+        self.assertTrue(d.cursors.sweep_in_reactor)
+        self.assertEqual(ldb, d.get_database('database_name'))
+
+    def test_sweep_in_thread(self):
+        self.assertFalse(self.d.cursors.sweep_in_reactor)
+
+    def test_profiler(self):
+        self.assertIsNone(self.d.profiler)
+        self.assertIsNone(self.d.get_database('database_name').profiler)
+
+    def test_profiler_settings(self):
+        d = MongoClientWrapper("localhost", 27127, profiler_settings={'slowThreshold': 0.5, 'explain': False})
+
+        self.assertIsInstance(d.profiler, QueryProfiler)
+        self.assertEqual(d.profiler.slow_threshold, 0.5)
+        self.assertFalse(d.profiler.explain)
+        self.assertIs(d.get_database('database_name').profiler, d.profiler)
+
+    def test_profiler_settings_txmongo(self):
+        with mock.patch.object(MongoClientWrapper, 'create_txmongo_client', return_value=mock.MagicMock()):
+            d = MongoClientWrapper("localhost", 27127, driver='txmongo', profiler_settings={})
+
+        self.assertIsInstance(d.profiler, QueryProfiler)
+        self.assertIs(d.get_database('database_name').profiler, d.profiler)
+
+    def test_lazy_decryption(self):
+        self.assertFalse(self.d.get_database('database_name').lazy_decryption)
+
+        d = MongoClientWrapper("localhost", 27127, lazy_decryption=True)
+        self.assertTrue(d.get_database('database_name').lazy_decryption)
+
+    def test_lazy_decryption_txmongo(self):
+        with mock.patch.object(MongoClientWrapper, 'create_txmongo_client', return_value=mock.MagicMock()):
+            d = MongoClientWrapper("localhost", 27127, driver='txmongo', lazy_decryption=True)
+
+        self.assertTrue(d.get_database('database_name').lazy_decryption)
+
+    def test_guided_date_conversion(self):
+        self.assertFalse(self.d.get_database('database_name').guided_date_conversion)
+
+        d = MongoClientWrapper("localhost", 27127, guided_date_conversion=True)
+        self.assertTrue(d.get_database('database_name').guided_date_conversion)
+
+    def test_guided_date_conversion_txmongo(self):
+        with mock.patch.object(MongoClientWrapper, 'create_txmongo_client', return_value=mock.MagicMock()):
+            d = MongoClientWrapper("localhost", 27127, driver='txmongo', guided_date_conversion=True)
+
+        self.assertTrue(d.get_database('database_name').guided_date_conversion)
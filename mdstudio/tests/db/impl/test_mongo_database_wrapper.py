@@ -6,14 +6,19 @@ import mongomock
 import pytz
 import twisted
 from bson import ObjectId
+from cryptography.fernet import Fernet
 from faker import Faker
 from mock import mock, call
+from pymongo import UpdateOne
 from twisted.internet import reactor
 
+from mdstudio.db.crypto_pool import CryptoPool
 from mdstudio.db.cursor import Cursor, query
 from mdstudio.db.exception import DatabaseException
 from mdstudio.db.fields import Fields
+from mdstudio.db.impl.cursor_batch import CursorBatch
 from mdstudio.db.impl.mongo_client_wrapper import MongoClientWrapper
+from mdstudio.db.impl.query_profiler import QueryProfiler
 from mdstudio.service.model import Model
 from mdstudio.db.sort_mode import SortMode
 from mdstudio.deferred.chainable import test_chainable
@@ -180,6 +185,56 @@ class TestMongoDatabaseWrapper(DBTestCase):
 
         self.assertEqual(result, None)
 
+    def test_prepare_for_mongo_date(self):
+        document = {
+            '_id': '0123456789ab0123456789ab',
+            'o': {
+                'date': [datetime.date(2017, 10, 26), 2]
+            },
+            'p': {
+                'f': '2017-10-26T09:15:00+00:00'
+            }
+        }
+
+        result = self.db._prepare_for_mongo(document)
+
+        self.assertEqual(result, {
+            '_id': ObjectId('0123456789ab0123456789ab'),
+            'o': {
+                'date': [datetime.datetime(2017, 10, 26, tzinfo=pytz.utc), 2]
+            },
+            'p': {
+                'f': '2017-10-26T09:15:00+00:00'
+            }
+        })
+        self.assertEqual(document, {
+            '_id': '0123456789ab0123456789ab',
+            'o': {
+                'date': [datetime.date(2017, 10, 26), 2]
+            },
+            'p': {
+                'f': '2017-10-26T09:15:00+00:00'
+            }
+        })
+        self.assertIsNot(document['o'], result['o'])
+        self.assertIs(document['p'], result['p'])
+
+    def test_prepare_for_mongo_list(self):
+        documents = [
+            {'_id': '0123456789ab0123456789ab', 'o': {'f': 2}},
+            {'o': {'f': 3}}
+        ]
+
+        result = self.db._prepare_for_mongo(documents)
+
+        self.assertEqual(result, [
+            {'_id': ObjectId('0123456789ab0123456789ab'), 'o': {'f': 2}},
+            {'o': {'f': 3}}
+        ])
+        self.assertEqual(documents[0]['_id'], '0123456789ab0123456789ab')
+        self.assertIsNot(documents[1], result[1])
+        self.assertIs(documents[1]['o'], result[1]['o'])
+
     def test_get_collection_dict(self):
 
         self.db._logger = mock.MagicMock()
@@ -216,6 +271,83 @@ class TestMongoDatabaseWrapper(DBTestCase):
         self.db._logger.info.assert_called_once_with('Creating collection {collection} in {database}',
                                                      collection='test_collection', database='users~userNameDatabase')
 
+    def test_get_collection_cached(self):
+        self.db._db['test_collection'].insert_one({'test': 2})
+        self.db._db.collection_names = mock.MagicMock(wraps=self.db._db.collection_names)
+
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+
+        self.db._db.collection_names.assert_called_once_with()
+        self.assertEqual(self.db.collection_cache_stats, {'hits': 1, 'misses': 1})
+
+    def test_get_collection_cached_unknown(self):
+        self.db._db['test_collection'].insert_one({'test': 2})
+        self.db._db.collection_names = mock.MagicMock(wraps=self.db._db.collection_names)
+
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+        self.assertEqual(self.db._get_collection('test_collection2'), None)
+
+        self.assertEqual(self.db._db.collection_names.call_count, 2)
+        self.assertEqual(self.db.collection_cache_stats, {'hits': 0, 'misses': 2})
+
+    def test_get_collection_cached_create(self):
+        self.db._logger = mock.MagicMock()
+        self.db._get_collection('test_collection', create=True).insert_one({'test': 2})
+
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+        self.assertEqual(self.db.collection_cache_stats, {'hits': 0, 'misses': 2})
+
+    def test_get_collection_cached_invalidate(self):
+        self.db._db['test_collection'].insert_one({'test': 2})
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+
+        self.db._db.drop_collection('test_collection')
+        self.db.invalidate_collection_cache()
+
+        self.assertEqual(self.db._get_collection('test_collection'), None)
+        self.assertEqual(self.db.collection_cache_stats, {'hits': 0, 'misses': 2})
+
+    def test_get_collection_cached_expired(self):
+        self.db._collection_cache_ttl = 0
+        self.db._db['test_collection'].insert_one({'test': 2})
+
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+        self.assertIsInstance(self.db._get_collection('test_collection'), mongomock.collection.Collection)
+        self.assertEqual(self.db.collection_cache_stats, {'hits': 0, 'misses': 2})
+
+    def test_get_cursor_batch_size(self):
+        collection = self.db._get_collection('test_collection', create=True)
+        collection.insert_many([{'test': i} for i in range(30)])
+
+        result = self.db._get_cursor(collection.find({}), batch=CursorBatch(20))
+        self.assertEqual(result['size'], 20)
+        self.assertTrue(result['alive'])
+
+        result = self.db._more(result['cursorId'], None)
+        self.assertEqual(result['size'], 10)
+
+    def test_get_cursor_batch_size_more(self):
+        collection = self.db._get_collection('test_collection', create=True)
+        collection.insert_many([{'test': i} for i in range(30)])
+
+        result = self.db._get_cursor(collection.find({}), batch=CursorBatch(20))
+        result = self.db._more(result['cursorId'], None, batch_size=5)
+        self.assertEqual(result['size'], 5)
+        self.assertEqual([r['test'] for r in result['results']], [20, 21, 22, 23, 24])
+
+    def test_get_cursor_batch_adaptive(self):
+        collection = self.db._get_collection('test_collection', create=True)
+        collection.insert_many([{'test': i} for i in range(100)])
+
+        sizes = []
+        result = self.db._get_cursor(collection.find({}), batch=CursorBatch(5, 1024 * 1024))
+        while result['size']:
+            sizes.append(result['size'])
+            result = self.db._more(result['cursorId'], None)
+
+        self.assertEqual(sizes, [5, 10, 20, 40, 25])
+
     @test_chainable
     def test_insert_one(self):
 
@@ -977,6 +1109,16 @@ class TestMongoDatabaseWrapper(DBTestCase):
         d = self.d.wrapper.more("wefwefwef")
         yield self.assertFailure(d, DatabaseException)
 
+    def test_more_failure(self):
+        cursor = mock.MagicMock()
+        self.db._cursors.add('users~userNameDatabase', 'id', cursor, (None, CursorBatch()))
+        self.db._get_cursor = mock.MagicMock(side_effect=ValueError())
+
+        self.assertRaises(ValueError, self.db._more, 'id', None)
+
+        cursor.close.assert_called_once_with()
+        self.assertNotIn('id', self.db._cursors)
+
     @test_chainable
     def test_rewind(self):
 
@@ -1844,3 +1986,267 @@ class TestMongoDatabaseWrapper(DBTestCase):
         self.assertEqual(ids, ['0123456789ab0123456789ab', '59f1d9c57dd5d70043e74f8d'])
 
         yield self.d.delete_many({'datetime': datetime}, fields=Fields(date_times=['datetime']))
+
+    @test_chainable
+    def test_bulk_write(self):
+        yield self.d.insert_many([
+            {'test': 1, '_id': '0123456789ab0123456789ab'},
+            {'test': 2, '_id': '59f1d9c57dd5d70043e74f8d'},
+            {'test': 2, '_id': '59f1d9c57dd5d70043e74f8e'}
+        ])
+
+        self.db._get_collection = mock.MagicMock(wraps=self.db._get_collection)
+        result = yield self.d.bulk_write([
+            {'replaceOne': {'filter': {'test': 4}, 'replacement': {'test': 4}, 'upsert': True}},
+            {'insertOne': {'document': {'test': 3, '_id': '59f1d9c57dd5d70043e74f8f'}}},
+            {'updateOne': {'filter': {'test': 1}, 'update': {'$set': {'test2': 1}}}},
+            {'updateMany': {'filter': {'test': 2}, 'update': {'$set': {'test2': 2}}}},
+            {'deleteOne': {'filter': {'test': 3}}},
+            {'deleteMany': {'filter': {'test': 5}}}
+        ])
+        self.db._get_collection.assert_called_once_with('test_collection', True)
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.matched, 3)
+        self.assertEqual(result.modified, 3)
+        self.assertEqual(result.upserted, 1)
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(result.results[0], {'executed': True, 'upsertedId': mock.ANY})
+        self.assertEqual(result.results[1], {'executed': True, 'id': '59f1d9c57dd5d70043e74f8f'})
+        self.assertEqual(result.results[2], {'executed': True})
+
+        found = yield self.d.find_many({}, sort=('test', SortMode.Asc)).to_list()
+        self.assertEqual([(f['test'], f.get('test2')) for f in found], [(1, 1), (2, 2), (2, 2), (4, None)])
+        self.assertEqual(found[3]['_id'], result.results[0]['upsertedId'])
+
+    @test_chainable
+    def test_bulk_write_ordered_error(self):
+        yield self.d.insert_one({'test': 1, '_id': '0123456789ab0123456789ab'})
+
+        result = yield self.d.bulk_write([
+            {'insertOne': {'document': {'test': 2}}},
+            {'insertOne': {'document': {'test': 3, '_id': '0123456789ab0123456789ab'}}},
+            {'insertOne': {'document': {'test': 4}}}
+        ])
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.errors, 1)
+        self.assertTrue(result.results[0]['executed'])
+        self.assertEqual(result.results[1], {'executed': False, 'error': mock.ANY})
+        self.assertEqual(result.results[2], {'executed': False})
+
+    @test_chainable
+    def test_bulk_write_unordered_error(self):
+        yield self.d.insert_one({'test': 1, '_id': '0123456789ab0123456789ab'})
+
+        result = yield self.d.bulk_write([
+            {'insertOne': {'document': {'test': 2}}},
+            {'insertOne': {'document': {'test': 3, '_id': '0123456789ab0123456789ab'}}},
+            {'insertOne': {'document': {'test': 4}}}
+        ], ordered=False)
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual(result.errors, 1)
+        self.assertTrue(result.results[0]['executed'])
+        self.assertEqual(result.results[1], {'executed': False, 'error': mock.ANY})
+        self.assertTrue(result.results[2]['executed'])
+
+    @test_chainable
+    def test_bulk_write_empty(self):
+        self.db._get_collection = mock.MagicMock(wraps=self.db._get_collection)
+        result = yield self.d.bulk_write([])
+
+        self.db._get_collection.assert_not_called()
+        self.assertEqual(result.inserted, 0)
+        self.assertEqual(result.results, [])
+
+    @test_chainable
+    def test_bulk_write_date_time_fields(self):
+        datetime = self.faker.date_time(pytz.utc)
+        datetime2 = self.faker.date_time(pytz.utc)
+        yield self.d.bulk_write([
+            {'insertOne': {'document': {'test': 2, '_id': '0123456789ab0123456789ab', 'datetime': datetime}}},
+            {'updateOne': {'filter': {'test': 2}, 'update': {'$set': {'datetime2': datetime2}}}}
+        ], fields=Fields(date_times=['datetime', 'datetime2']))
+
+        found = yield self.d.find_one({'_id': '0123456789ab0123456789ab'}, fields=Fields(date_times=['datetime', 'datetime2']))
+        self.assertEqual(found, {'test': 2, '_id': '0123456789ab0123456789ab', 'datetime': datetime,
+                                 'datetime2': datetime2})
+
+    def test_parse_write_request(self):
+        model, arguments = self.db._parse_write_request({'updateOne': {'filter': {'test': 2}, 'update': {}}})
+
+        self.assertIs(model, UpdateOne)
+        self.assertEqual(arguments, {'filter': {'test': 2}, 'update': {}})
+
+    def test_parse_write_request_unknown_operation(self):
+        self.assertRaises(DatabaseException, self.db._parse_write_request, {'insertMany': {'documents': []}})
+
+    def test_parse_write_request_multiple_operations(self):
+        self.assertRaises(DatabaseException, self.db._parse_write_request, {'deleteOne': {'filter': {}},
+                                                                            'deleteMany': {'filter': {}}})
+
+    def test_parse_write_request_unknown_argument(self):
+        self.assertRaises(DatabaseException, self.db._parse_write_request, {'deleteOne': {'filter': {}, 'upsert': True}})
+
+    def test_parse_write_request_missing_argument(self):
+        self.assertRaises(DatabaseException, self.db._parse_write_request, {'updateOne': {'filter': {}}})
+
+    @test_chainable
+    def test_find_many_profiler(self):
+        self.db.profiler = QueryProfiler(slow_threshold=10)
+        yield self.d.insert_many([{'test': 2}, {'test': 2}, {'test': 3}])
+
+        yield self.d.find_many({'test': 2})
+
+        operations = self.db.profiler.report()['operations']
+        self.assertEqual(len(operations), 1)
+        self.assertEqual(operations[0]['database'], 'users~userNameDatabase')
+        self.assertEqual(operations[0]['operation'], 'find_many')
+        self.assertEqual(operations[0]['collection'], 'test_collection')
+        self.assertEqual(operations[0]['filter'], {'test': '?'})
+        self.assertEqual(operations[0]['documents'], 2)
+        self.assertEqual(self.db.profiler.report()['slow'], [])
+
+    @test_chainable
+    def test_find_many_profiler_explain(self):
+        self.db.profiler = mock.MagicMock()
+        yield self.d.insert_many([{'test': 2}])
+
+        yield self.d.find_many({'test': 2}, skip=1, limit=2, sort=('test', SortMode.Desc))
+
+        args, kwargs = self.db.profiler.record.call_args
+        self.assertEqual(args[:4], ('users~userNameDatabase', 'find_many', 'test_collection', {'test': 2}))
+        self.assertEqual(args[5], 0)
+
+        self.db._db.command = mock.MagicMock()
+        kwargs['explain']()
+        self.db._db.command.assert_called_once_with('explain', {
+            'find': 'test_collection',
+            'filter': {'test': 2},
+            'skip': 1,
+            'limit': 2,
+            'sort': {'test': -1}
+        }, verbosity='queryPlanner')
+
+    @test_chainable
+    def test_find_one_profiler(self):
+        self.db.profiler = QueryProfiler(slow_threshold=10)
+        yield self.d.insert_many([{'test': 2}])
+
+        yield self.d.find_one({'test': 2})
+        yield self.d.find_one({'test': 3})
+
+        operations = self.db.profiler.report()['operations']
+        self.assertEqual(operations[0]['operation'], 'find_one')
+        self.assertEqual(operations[0]['calls'], 2)
+        self.assertEqual(operations[0]['documents'], 1)
+
+    @test_chainable
+    def test_count_profiler(self):
+        self.db.profiler = QueryProfiler(slow_threshold=10)
+        yield self.d.insert_many([{'test': 2}, {'test': 2}])
+
+        yield self.d.count({'test': 2})
+
+        operations = self.db.profiler.report()['operations']
+        self.assertEqual(operations[0]['operation'], 'count')
+        self.assertEqual(operations[0]['documents'], 2)
+
+    @test_chainable
+    def test_aggregate_profiler(self):
+        self.db.profiler = QueryProfiler(slow_threshold=0)
+        self.db.profiler._logger = mock.MagicMock()
+        yield self.d.insert_many([{'test': 2}, {'test': 3}])
+
+        yield self.d.aggregate([{'$match': {'test': 2}}])
+
+        report = self.db.profiler.report()
+        self.assertEqual(report['operations'][0]['operation'], 'aggregate')
+        self.assertEqual(report['operations'][0]['filter'], [{'$match': {'test': '?'}}])
+        self.assertEqual(report['slow'][0]['documents'], 1)
+        self.db.profiler._logger.warn.assert_called_once()
+
+    @test_chainable
+    def test_find_many_lazy_decryption(self):
+        self.db.lazy_decryption = True
+        key_repository = mock.MagicMock()
+        key_repository.get_key.return_value = Fernet.generate_key()
+        fields = Fields(encrypted=['secret'], key_repository=key_repository)
+        yield self.db.insert_many('test_collection', [{'test': i, 'secret': 'hello {}'.format(i)} for i in range(3)],
+                                  fields=fields, claims=self.claims)
+
+        fields.decrypt = mock.MagicMock(wraps=fields.decrypt)
+        result = yield self.db.find_many('test_collection', {}, sort=('test', SortMode.Asc), fields=fields,
+                                         claims=self.claims)
+
+        self.assertEqual([r['test'] for r in result['results']], [0, 1, 2])
+        fields.decrypt.assert_not_called()
+        self.assertRegex(result['results'][1].document['secret'], '__encrypted__:')
+
+        self.assertEqual(result['results'][1]['secret'], 'hello 1')
+        self.assertEqual(fields.decrypt.call_count, 1)
+
+    @test_chainable
+    def test_find_one_lazy_decryption(self):
+        self.db.lazy_decryption = True
+        key_repository = mock.MagicMock()
+        key_repository.get_key.return_value = Fernet.generate_key()
+        fields = Fields(encrypted=['secret'], key_repository=key_repository)
+        yield self.db.insert_one('test_collection', {'test': 2, 'secret': 'hello'}, fields=fields, claims=self.claims)
+
+        result = yield self.db.find_one('test_collection', {'test': 2}, fields=fields, claims=self.claims)
+
+        self.assertIsInstance(result['result']['_id'], str)
+        self.assertEqual(Cursor.decrypt_fields(result['result']), {
+            '_id': result['result']['_id'],
+            'test': 2,
+            'secret': 'hello'
+        })
+
+    @test_chainable
+    def test_insert_many_find_many_parallel_encryption(self):
+        key_repository = mock.MagicMock()
+        key_repository.get_key.return_value = Fernet.generate_key()
+        fields = Fields(encrypted=['secret'], key_repository=key_repository)
+        fields.crypto_pool = mock.MagicMock(wraps=CryptoPool(threshold=2, chunk_size=3, workers=2))
+        self.addCleanup(fields.crypto_pool.shutdown)
+
+        yield self.db.insert_many('test_collection', [{'test': i, 'secret': 'hello {}'.format(i)} for i in range(10)],
+                                  fields=fields, claims=self.claims)
+
+        stored = yield self.db.find_many('test_collection', {}, sort=('test', SortMode.Asc))
+        for document in stored['results']:
+            self.assertRegex(document['secret'], '__encrypted__:')
+
+        result = yield self.db.find_many('test_collection', {}, sort=('test', SortMode.Asc), fields=fields,
+                                         claims=self.claims)
+
+        self.assertEqual([r['secret'] for r in result['results']], ['hello {}'.format(i) for i in range(10)])
+        self.assertEqual(fields.crypto_pool.map.call_count, 2)
+
+    @test_chainable
+    def test_find_many_guided_date_conversion(self):
+        self.db.guided_date_conversion = True
+        fields = Fields(date_times=['run.started'])
+        yield self.db.insert_one('test_collection', {
+            'run': [{'started': datetime.datetime(2018, 1, 1, 10, tzinfo=pytz.utc)}],
+            'other': datetime.datetime(2018, 1, 1, 10, tzinfo=pytz.utc)
+        })
+        self.db._convert_to_utc = mock.MagicMock()
+
+        result = yield self.db.find_many('test_collection', {}, fields=fields)
+
+        self.assertEqual(result['results'][0]['run'][0]['started'].tzinfo, pytz.utc)
+        self.assertIsNone(result['results'][0]['other'].tzinfo)
+        self.db._convert_to_utc.assert_not_called()
+
+    @test_chainable
+    def test_find_one_guided_date_conversion_no_fields(self):
+        self.db.guided_date_conversion = True
+        yield self.db.insert_one('test_collection', {'other': datetime.datetime(2018, 1, 1, 10, tzinfo=pytz.utc)})
+
+        result = yield self.db.find_one('test_collection', {})
+
+        self.assertEqual(result['result']['other'].tzinfo, pytz.utc)
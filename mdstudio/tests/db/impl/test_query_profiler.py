@@ -0,0 +1,104 @@
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.impl.query_profiler import QueryProfiler
+
+
+class TestQueryProfiler(TestCase):
+    def setUp(self):
+        self.d = QueryProfiler(slow_threshold=0.5, max_entries=2)
+        self.d._logger = mock.MagicMock()
+
+    def test_shape(self):
+        self.assertEqual(QueryProfiler.shape({'a': 2, 'b': {'$gt': 3, '$in': [1, 2]}}),
+                         {'a': '?', 'b': {'$gt': '?', '$in': '?'}})
+
+    def test_shape_conditions(self):
+        self.assertEqual(QueryProfiler.shape({'$or': [{'a': 2}, {'b': 'test'}]}), {'$or': [{'a': '?'}, {'b': '?'}]})
+
+    def test_shape_none(self):
+        self.assertEqual(QueryProfiler.shape(None), None)
+
+    def test_record(self):
+        self.d.record('db', 'find_many', 'col', {'a': 2}, 0.1, 10)
+        self.d.record('db', 'find_many', 'col', {'a': 3}, 0.3, 5)
+        self.d.record('db', 'find_many', 'col', {'b': 3}, 0.2, 1)
+
+        report = self.d.report()
+        self.assertEqual(report['slowThreshold'], 0.5)
+        self.assertEqual(report['slow'], [])
+        self.assertEqual(len(report['operations']), 2)
+        self.assertEqual(report['operations'][0]['filter'], {'a': '?'})
+        self.assertEqual(report['operations'][0]['calls'], 2)
+        self.assertEqual(report['operations'][0]['documents'], 15)
+        self.assertAlmostEqual(report['operations'][0]['totalDuration'], 0.4)
+        self.assertEqual(report['operations'][0]['maxDuration'], 0.3)
+        self.d._logger.warn.assert_not_called()
+
+    def test_record_max_shapes(self):
+        self.d.max_shapes = 1
+        self.d.record('db', 'count', 'col', {'a': 2}, 0.1, 10)
+        self.d.record('db', 'count', 'col', {'b': 2}, 0.1, 10)
+
+        self.assertEqual(len(self.d.report()['operations']), 1)
+
+    def test_record_slow(self):
+        explain = mock.MagicMock(return_value={
+            'queryPlanner': {
+                'parsedQuery': {'a': {'$eq': 2}},
+                'winningPlan': {'stage': 'COLLSCAN', 'filter': {'a': {'$eq': 2}}, 'direction': 'forward'}
+            }
+        })
+        self.d.record('db', 'find_many', 'col', {'a': 2}, 0.6, 10, explain=explain)
+
+        slow = self.d.report()['slow']
+        self.assertEqual(len(slow), 1)
+        self.assertEqual(slow[0]['operation'], 'find_many')
+        self.assertEqual(slow[0]['filter'], {'a': '?'})
+        self.assertEqual(slow[0]['documents'], 10)
+        self.assertTrue(slow[0]['collectionScan'])
+        self.assertEqual(slow[0]['plan'], {'stage': 'COLLSCAN', 'filter': {'a': {'$eq': '?'}}, 'direction': 'forward'})
+        self.d._logger.warn.assert_called_once()
+
+    def test_record_slow_index(self):
+        explain = mock.MagicMock(return_value={
+            'queryPlanner': {
+                'winningPlan': {
+                    'stage': 'FETCH',
+                    'inputStage': {'stage': 'IXSCAN', 'indexBounds': {'a': ['[2, 2]']}}
+                }
+            }
+        })
+        self.d.record('db', 'find_many', 'col', {'a': 2}, 0.6, 10, explain=explain)
+
+        slow = self.d.report()['slow']
+        self.assertFalse(slow[0]['collectionScan'])
+        self.assertEqual(slow[0]['plan']['inputStage']['indexBounds'], {'a': '?'})
+
+    def test_record_slow_no_explain(self):
+        self.d.explain = False
+        explain = mock.MagicMock()
+        self.d.record('db', 'count', 'col', {'a': 2}, 0.6, 10, explain=explain)
+
+        explain.assert_not_called()
+        self.assertIsNone(self.d.report()['slow'][0]['plan'])
+
+    def test_record_slow_explain_fails(self):
+        explain = mock.MagicMock(side_effect=NotImplementedError)
+        self.d.record('db', 'count', 'col', {'a': 2}, 0.6, 10, explain=explain)
+
+        slow = self.d.report()['slow']
+        self.assertIsNone(slow[0]['plan'])
+        self.assertFalse(slow[0]['collectionScan'])
+
+    def test_record_slow_bounded(self):
+        for i in range(3):
+            self.d.record('db', 'count', 'col{}'.format(i), {}, 0.6, 10)
+
+        self.assertEqual([s['collection'] for s in self.d.report()['slow']], ['col1', 'col2'])
+
+    def test_reset(self):
+        self.d.record('db', 'count', 'col', {}, 0.6, 10)
+        self.d.reset()
+
+        self.assertEqual(self.d.report(), {'slowThreshold': 0.5, 'operations': [], 'slow': []})
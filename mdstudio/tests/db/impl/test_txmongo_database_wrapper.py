@@ -0,0 +1,308 @@
+# coding=utf-8
+import datetime
+
+import pytz
+from bson import ObjectId
+from mock import mock
+from pymongo.results import InsertOneResult, UpdateResult, DeleteResult, BulkWriteResult
+from twisted.internet.defer import succeed
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.exception import DatabaseException
+from mdstudio.db.fields import Fields
+from mdstudio.db.impl.cursor_registry import CursorRegistry
+from mdstudio.db.impl.query_profiler import QueryProfiler
+from mdstudio.db.impl.txmongo_database_wrapper import TxMongoDatabaseWrapper, TxMongoCursor
+from mdstudio.deferred.chainable import test_chainable
+
+
+class FakeTxMongoCursor(object):
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.exhausted = False
+        self.sort = mock.MagicMock()
+        self.close = mock.MagicMock(return_value=succeed(None))
+
+    def next_batch(self):
+        batch = self.batches.pop(0) if self.batches else []
+        self.exhausted = not self.batches
+        return succeed(batch)
+
+
+class TestTxMongoCursor(TestCase):
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        self.collection.find.side_effect = lambda **kwargs: FakeTxMongoCursor([[{'test': 1}, {'test': 2}],
+                                                                             [{'test': 3}]])
+
+    @test_chainable
+    def test_next(self):
+        cursor = TxMongoCursor(self.collection, {'test': {'$gt': 0}}, skip=1, batch_size=2)
+
+        self.collection.find.assert_called_once_with(filter={'test': {'$gt': 0}}, projection=None, skip=1, limit=0,
+                                                     batch_size=2)
+
+        results = yield cursor.next(1)
+        self.assertEqual(results, [{'test': 1}])
+        self.assertTrue(cursor.alive)
+
+        results = yield cursor.next(5)
+        self.assertEqual(results, [{'test': 2}, {'test': 3}])
+        self.assertFalse(cursor.alive)
+
+    @test_chainable
+    def test_rewind(self):
+        cursor = TxMongoCursor(self.collection, {})
+        first = cursor._cursor
+
+        yield cursor.next(3)
+        cursor.rewind()
+
+        first.close.assert_called_once_with()
+        results = yield cursor.next(3)
+        self.assertEqual(results, [{'test': 1}, {'test': 2}, {'test': 3}])
+
+    def test_sort(self):
+        cursor = TxMongoCursor(self.collection, {}, sort=[('test', 1)])
+
+        cursor._cursor.sort.assert_called_once_with([('test', 1)])
+
+    @test_chainable
+    def test_documents(self):
+        cursor = TxMongoCursor(documents=[{'test': 1}, {'test': 2}])
+
+        results = yield cursor.next(1)
+        self.assertEqual(results, [{'test': 1}])
+        count = yield cursor.count()
+        self.assertEqual(count, 2)
+
+        cursor.rewind()
+        results = yield cursor.next(5)
+        self.assertEqual(results, [{'test': 1}, {'test': 2}])
+        self.assertFalse(cursor.alive)
+
+    def test_count(self):
+        cursor = TxMongoCursor(self.collection, {'test': 2}, skip=2, limit=3)
+
+        cursor.count()
+        self.collection.count_documents.assert_called_once_with({'test': 2})
+
+    def test_count_with_limit_and_skip(self):
+        cursor = TxMongoCursor(self.collection, None, skip=2, limit=3)
+
+        cursor.count(True)
+        self.collection.count_documents.assert_called_once_with({}, skip=2, limit=3)
+
+
+class TestTxMongoDatabaseWrapper(TestCase):
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        self.db = mock.MagicMock()
+        self.db.collection_names.return_value = succeed(['test_collection'])
+        self.db.__getitem__.return_value = self.collection
+
+        self.d = TxMongoDatabaseWrapper('users~userNameDatabase', self.db,
+                                        cursors=CursorRegistry(sweep_interval=None))
+
+    @test_chainable
+    def test_insert_one(self):
+        self.collection.insert_one.return_value = succeed(InsertOneResult(ObjectId('0123456789ab0123456789ab'), True))
+
+        result = yield self.d.insert_one('test_collection', {'test': 2, 'date': datetime.date(2018, 1, 1)})
+
+        self.assertEqual(result, {'id': '0123456789ab0123456789ab'})
+        self.collection.insert_one.assert_called_once_with({
+            'test': 2,
+            'date': datetime.datetime(2018, 1, 1, tzinfo=pytz.utc)
+        })
+
+    @test_chainable
+    def test_insert_one_date_time_fields(self):
+        self.collection.insert_one.return_value = succeed(InsertOneResult(ObjectId('0123456789ab0123456789ab'), True))
+
+        yield self.d.insert_one('test_collection', {'datetime': '2018-01-01T10:00:00+00:00'},
+                                fields=Fields(date_times=['datetime']))
+
+        self.collection.insert_one.assert_called_once_with({
+            'datetime': datetime.datetime(2018, 1, 1, 10, tzinfo=pytz.utc)
+        })
+
+    @test_chainable
+    def test_get_collection_cached(self):
+        yield self.d.find_one('test_collection', {})
+        yield self.d.find_one('test_collection', {})
+
+        self.db.collection_names.assert_called_once_with()
+        self.assertEqual(self.d.collection_cache_stats, {'hits': 1, 'misses': 1})
+
+    @test_chainable
+    def test_find_one_no_collection(self):
+        result = yield self.d.find_one('test_collection2', {})
+
+        self.assertEqual(result, {'result': None})
+        self.collection.find_one.assert_not_called()
+
+    @test_chainable
+    def test_find_one(self):
+        self.collection.find_one.return_value = succeed({'_id': ObjectId('0123456789ab0123456789ab'), 'test': 2})
+
+        result = yield self.d.find_one('test_collection', {'_id': '0123456789ab0123456789ab'})
+
+        self.assertEqual(result, {'result': {'_id': '0123456789ab0123456789ab', 'test': 2}})
+        self.collection.find_one.assert_called_once_with({'_id': ObjectId('0123456789ab0123456789ab')}, None,
+                                                         skip=0, sort=None)
+
+    @test_chainable
+    def test_update_one(self):
+        self.collection.update_one.return_value = succeed(UpdateResult({'n': 1, 'nModified': 1}, True))
+
+        result = yield self.d.update_one('test_collection', {'test': 2}, {'$set': {'test': 3}})
+
+        self.assertEqual(result, {'matched': 1, 'modified': 1})
+        self.collection.update_one.assert_called_once_with({'test': 2}, {'$set': {'test': 3}}, False)
+
+    @test_chainable
+    def test_update_one_no_collection(self):
+        result = yield self.d.update_one('test_collection2', {'test': 2}, {'$set': {'test': 3}})
+
+        self.assertEqual(result, {'matched': 0, 'modified': 0})
+
+    @test_chainable
+    def test_delete_many(self):
+        self.collection.delete_many.return_value = succeed(DeleteResult({'n': 3}, True))
+
+        result = yield self.d.delete_many('test_collection', {'test': 2})
+
+        self.assertEqual(result, {'count': 3})
+
+    @test_chainable
+    def test_count(self):
+        self.collection.count_documents.return_value = succeed(4)
+
+        result = yield self.d.count('test_collection', {'test': 2}, limit=10)
+
+        self.assertEqual(result, {'total': 4})
+        self.collection.count_documents.assert_called_once_with({'test': 2}, skip=None, limit=10)
+
+    @test_chainable
+    def test_find_many(self):
+        self.collection.find.side_effect = lambda **kwargs: FakeTxMongoCursor([
+            [{'_id': ObjectId('0123456789ab0123456789ab'), 'test': 1}, {'test': 2}],
+            [{'test': 3}]
+        ])
+
+        result = yield self.d.find_many('test_collection', {}, batch_size=2)
+
+        self.assertEqual(result['results'], [{'_id': '0123456789ab0123456789ab', 'test': 1}, {'test': 2}])
+        self.assertEqual(result['size'], 2)
+        self.assertTrue(result['alive'])
+        self.assertEqual(self.collection.find.call_args[1]['batch_size'], 2)
+
+        more = yield self.d.more(result['cursorId'])
+
+        self.assertEqual(more['results'], [{'test': 3}])
+        self.assertFalse(more['alive'])
+        self.assertNotIn(result['cursorId'], self.d._cursors)
+
+        count = yield self.d.count(cursor_id=more['cursorId'])
+        self.assertEqual(count, {'total': self.collection.count_documents.return_value})
+
+        rewind = yield self.d.rewind(more['cursorId'])
+        self.assertEqual(rewind['results'], [{'_id': '0123456789ab0123456789ab', 'test': 1}, {'test': 2}])
+
+    @test_chainable
+    def test_find_many_no_collection(self):
+        result = yield self.d.find_many('test_collection2', {})
+
+        self.assertEqual(result, {'results': [], 'alive': False, 'size': 0})
+
+    def test_more_unknown_cursor(self):
+        return self.assertFailure(self.d.more('unknown'), DatabaseException)
+
+    @test_chainable
+    def test_more_failure(self):
+        self.collection.find.side_effect = lambda **kwargs: FakeTxMongoCursor([[{'test': 1}], [{'test': 2}]])
+        result = yield self.d.find_many('test_collection', {}, batch_size=1)
+        cursor = self.d._cursors.get('users~userNameDatabase', result['cursorId'])[0]
+        cursor.next = mock.MagicMock(side_effect=ValueError())
+        cursor.close = mock.MagicMock()
+
+        yield self.assertFailure(self.d.more(result['cursorId']), ValueError)
+
+        cursor.close.assert_called_once_with()
+        self.assertNotIn(result['cursorId'], self.d._cursors)
+
+    @test_chainable
+    def test_aggregate(self):
+        self.collection.aggregate.return_value = succeed([{'test': i} for i in range(60)])
+
+        result = yield self.d.aggregate('test_collection', [{'$match': {}}])
+
+        self.assertEqual(result['size'], 50)
+        self.assertTrue(result['alive'])
+
+        more = yield self.d.more(result['cursorId'])
+        self.assertEqual(more['size'], 10)
+        self.assertFalse(more['alive'])
+
+    @test_chainable
+    def test_find_many_profiler(self):
+        self.d.profiler = QueryProfiler(slow_threshold=10)
+        self.collection.name = 'test_collection'
+        self.collection.find.side_effect = lambda **kwargs: FakeTxMongoCursor([[{'test': 2}, {'test': 2}]])
+
+        yield self.d.find_many('test_collection', {'test': 2})
+
+        operations = self.d.profiler.report()['operations']
+        self.assertEqual(len(operations), 1)
+        self.assertEqual(operations[0]['database'], 'users~userNameDatabase')
+        self.assertEqual(operations[0]['operation'], 'find_many')
+        self.assertEqual(operations[0]['collection'], 'test_collection')
+        self.assertEqual(operations[0]['filter'], {'test': '?'})
+        self.assertEqual(operations[0]['documents'], 2)
+
+    @test_chainable
+    def test_profiler_without_explain(self):
+        self.d.profiler = mock.MagicMock()
+        self.collection.name = 'test_collection'
+        self.collection.find_one.return_value = succeed({'test': 2})
+        self.collection.count_documents.return_value = succeed(4)
+        self.collection.distinct.return_value = succeed([2, 3])
+        self.collection.aggregate.return_value = succeed([{'test': 2}])
+
+        yield self.d.find_one('test_collection', {'test': 2})
+        yield self.d.count('test_collection', {'test': 2})
+        yield self.d.distinct('test_collection', 'test', {'test': 2})
+        yield self.d.aggregate('test_collection', [{'$match': {}}])
+
+        calls = self.d.profiler.record.call_args_list
+        self.assertEqual([c[0][1] for c in calls], ['find_one', 'count', 'distinct', 'aggregate'])
+        self.assertEqual([c[0][5] for c in calls], [1, 4, 2, 1])
+        self.assertFalse(any('explain' in c[1] for c in calls))
+
+    @test_chainable
+    def test_bulk_write(self):
+        self.collection.bulk_write.return_value = succeed(BulkWriteResult({
+            'nInserted': 1,
+            'nMatched': 0,
+            'nModified': 0,
+            'nRemoved': 1,
+            'nUpserted': 0,
+            'writeErrors': [],
+            'upserted': []
+        }, True))
+
+        def insert(models, ordered):
+            models[0]._doc['_id'] = ObjectId('0123456789ab0123456789ab')
+            return self.collection.bulk_write.return_value
+
+        self.collection.bulk_write.side_effect = insert
+
+        result = yield self.d.bulk_write('test_collection', [
+            {'insertOne': {'document': {'test': 2}}},
+            {'deleteOne': {'filter': {'test': 3}}}
+        ])
+
+        self.assertEqual(result['inserted'], 1)
+        self.assertEqual(result['deleted'], 1)
+        self.assertEqual(result['results'], [{'executed': True, 'id': '0123456789ab0123456789ab'}, {'executed': True}])
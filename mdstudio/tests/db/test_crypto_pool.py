@@ -0,0 +1,79 @@
+# coding=utf-8
+import threading
+
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.crypto_pool import CryptoPool
+
+
+class TestCryptoPool(TestCase):
+    def setUp(self):
+        self.pool = CryptoPool(threshold=4, chunk_size=2, workers=2)
+
+    def tearDown(self):
+        self.pool.shutdown()
+
+    def test_map_small_batch(self):
+        threads = set()
+
+        def func(document):
+            threads.add(threading.current_thread())
+            return document * 2
+
+        self.assertEqual(self.pool.map(func, [1, 2, 3]), [2, 4, 6])
+        self.assertEqual(threads, {threading.current_thread()})
+        self.assertIsNone(self.pool._executor)
+
+    def test_map_parallel(self):
+        threads = set()
+
+        def func(document):
+            threads.add(threading.current_thread())
+            return document * 2
+
+        self.assertEqual(self.pool.map(func, list(range(11))), [i * 2 for i in range(11)])
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_map_chunks(self):
+        executor = mock.MagicMock()
+        executor.map.side_effect = lambda f, chunks: [f(chunk) for chunk in chunks]
+        self.pool._executor = executor
+
+        self.pool.map(lambda d: d, [1, 2, 3, 4, 5])
+
+        self.assertEqual(executor.map.call_args[0][1], [[1, 2], [3, 4], [5]])
+
+    def test_map_disabled(self):
+        self.pool.workers = 0
+
+        self.assertEqual(self.pool.map(lambda d: d + 1, list(range(10))), list(range(1, 11)))
+        self.assertIsNone(self.pool._executor)
+
+    def test_map_raises(self):
+        def func(document):
+            if document == 5:
+                raise ValueError(document)
+            return document
+
+        self.assertRaises(ValueError, self.pool.map, func, list(range(10)))
+
+    def test_map_after_shutdown(self):
+        self.pool.shutdown()
+
+        self.assertEqual(self.pool.map(lambda d: d + 1, list(range(10))), list(range(1, 11)))
+        self.assertIsNone(self.pool._executor)
+
+    def test_map_executor_shut_down(self):
+        executor = mock.MagicMock()
+        executor.map.side_effect = RuntimeError('cannot schedule new futures after shutdown')
+        self.pool._executor = executor
+
+        self.assertEqual(self.pool.map(lambda d: d + 1, list(range(10))), list(range(1, 11)))
+
+    def test_executor_shutdown_trigger(self):
+        with mock.patch('mdstudio.db.crypto_pool.reactor') as reactor:
+            self.pool._get_executor()
+
+        reactor.callFromThread.assert_called_once_with(reactor.addSystemEventTrigger, 'during', 'shutdown',
+                                                       self.pool.shutdown)
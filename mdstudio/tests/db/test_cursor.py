@@ -4,6 +4,7 @@ from twisted.internet.defer import Deferred
 from twisted.trial.unittest import TestCase
 
 from mdstudio.db.cursor import Cursor, CursorRefreshingError
+from mdstudio.db.fields import LazyDecryptedDocument
 from mdstudio.deferred.chainable import chainable
 
 
@@ -80,6 +81,16 @@ class CursorTests(TestCase):
 
         self.wrapper.more.assert_called_with(**{'cursor_id': 1234})
 
+    @chainable
+    def test_iter_batch_size(self):
+
+        self.assertIs(self.cursor.batch_size(200), self.cursor)
+
+        for i, v in enumerate(self.cursor):
+            self.assertEqual((yield v), self.values[i])
+
+        self.wrapper.more.assert_called_with(**{'cursor_id': 1234, 'batch_size': 200})
+
     @chainable
     def test_more(self):
         self.wrapper.more = mock.MagicMock(return_value={'cursorId': 1234, 'alive': True, 'results': [{'test3': 8}]})
@@ -183,3 +194,15 @@ class CursorTests(TestCase):
         nxt = lambda: next(self.cursor)
         self.assertEqual((yield nxt()), {'test': 5})
         self.assertEqual((yield nxt()), {'test2': 2})
+
+    def test_decrypt_fields(self):
+        decrypt = mock.MagicMock(return_value='hello')
+        document = LazyDecryptedDocument({'test': '__encrypted__:abc', 'test2': 2}, [['test']], decrypt)
+
+        self.assertEqual(self.cursor.decrypt_fields(document), {'test': 'hello', 'test2': 2})
+        decrypt.assert_called_once_with('__encrypted__:abc', document.document, 'test')
+
+    def test_decrypt_fields_plain(self):
+        document = {'test': 5}
+
+        self.assertIs(self.cursor.decrypt_fields(document), document)
@@ -0,0 +1,98 @@
+# coding=utf-8
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.encryptor_cache import EncryptorCache
+
+
+class TestEncryptorCache(TestCase):
+    def setUp(self):
+        self.cache = EncryptorCache(ttl=60, max_size=2)
+        self.repository = object()
+        self.claims = {'username': 'user', 'connectionType': 'user'}
+
+    def test_get(self):
+        create = mock.MagicMock(return_value='encryptor')
+
+        self.assertEqual(self.cache.get(self.repository, self.claims, create), 'encryptor')
+        self.assertEqual(self.cache.get(self.repository, dict(self.claims), create), 'encryptor')
+
+        create.assert_called_once_with()
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_get_volatile_claims(self):
+        create = mock.MagicMock(return_value='encryptor')
+
+        self.cache.get(self.repository, dict(self.claims, requestHash='a', uri='mdstudio.test', exp=1), create)
+        self.cache.get(self.repository, dict(self.claims, requestHash='b', uri='mdstudio.test2', exp=2), create)
+
+        create.assert_called_once_with()
+
+    def test_get_other_claims(self):
+        create = mock.MagicMock(side_effect=['encryptor1', 'encryptor2'])
+
+        self.assertEqual(self.cache.get(self.repository, self.claims, create), 'encryptor1')
+        self.assertEqual(self.cache.get(self.repository, dict(self.claims, username='user2'), create), 'encryptor2')
+
+    def test_get_other_repository(self):
+        create = mock.MagicMock(side_effect=['encryptor1', 'encryptor2'])
+
+        self.cache.get(self.repository, self.claims, create)
+
+        self.assertEqual(self.cache.get(object(), self.claims, create), 'encryptor2')
+
+    def test_get_expired(self):
+        create = mock.MagicMock(side_effect=['encryptor1', 'encryptor2'])
+
+        with mock.patch('mdstudio.db.encryptor_cache.time.time', return_value=1000):
+            self.cache.get(self.repository, self.claims, create)
+        with mock.patch('mdstudio.db.encryptor_cache.time.time', return_value=1060):
+            self.assertEqual(self.cache.get(self.repository, self.claims, create), 'encryptor2')
+
+        self.assertEqual(self.cache.stats, {'hits': 0, 'misses': 2, 'size': 1})
+
+    def test_get_create_fails(self):
+        create = mock.MagicMock(side_effect=ValueError)
+
+        self.assertRaises(ValueError, self.cache.get, self.repository, self.claims, create)
+        self.assertEqual(self.cache.stats['size'], 0)
+
+    def test_get_bounded(self):
+        create = mock.MagicMock(side_effect=lambda: object())
+
+        first = self.cache.get(self.repository, {'username': 'user1'}, create)
+        self.cache.get(self.repository, {'username': 'user2'}, create)
+        # mark user1 as recently used, so user2 is evicted
+        self.cache.get(self.repository, {'username': 'user1'}, create)
+        self.cache.get(self.repository, {'username': 'user3'}, create)
+
+        self.assertEqual(self.cache.stats['size'], 2)
+        self.assertIs(self.cache.get(self.repository, {'username': 'user1'}, create), first)
+        self.assertEqual(create.call_count, 3)
+
+    def test_invalidate(self):
+        create = mock.MagicMock(side_effect=lambda: object())
+        self.cache.get(self.repository, self.claims, create)
+        self.cache.get(self.repository, {'username': 'user2'}, create)
+
+        self.assertEqual(self.cache.invalidate(dict(self.claims, requestHash='a')), 1)
+
+        self.assertEqual(self.cache.stats['size'], 1)
+        self.cache.get(self.repository, self.claims, create)
+        self.assertEqual(create.call_count, 3)
+
+    def test_invalidate_repository(self):
+        create = mock.MagicMock(side_effect=lambda: object())
+        self.cache.get(self.repository, self.claims, create)
+        self.cache.get(object(), self.claims, create)
+
+        self.assertEqual(self.cache.invalidate(repository=self.repository), 1)
+        self.assertEqual(self.cache.stats['size'], 1)
+
+    def test_invalidate_all(self):
+        create = mock.MagicMock(side_effect=lambda: object())
+        self.cache.get(self.repository, self.claims, create)
+        self.cache.get(self.repository, {'username': 'user2'}, create)
+
+        self.assertEqual(self.cache.invalidate(), 2)
+        self.assertEqual(self.cache.stats['size'], 0)
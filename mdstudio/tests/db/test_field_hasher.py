@@ -0,0 +1,125 @@
+# coding=utf-8
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.db.field_hasher import FieldHasher, derive_hash
+
+
+class TestFieldHasher(TestCase):
+    def setUp(self):
+        self.hasher = FieldHasher(processes=0, memo_size=2)
+
+    def tearDown(self):
+        self.hasher.shutdown()
+
+    def test_derive_hash(self):
+        self.assertEqual(derive_hash(b'2017-10-26'), 'OLiaieIaRIW2tk3SwD9zGAE4TGk-yxifRdI8xElZ7j8=')
+
+    def test_derive(self):
+        self.assertEqual(self.hasher.derive([b'2017-10-26', b'test']),
+                         ['OLiaieIaRIW2tk3SwD9zGAE4TGk-yxifRdI8xElZ7j8=', derive_hash(b'test')])
+        self.assertEqual(self.hasher.stats, {'hits': 0, 'misses': 2, 'size': 2})
+
+    def test_derive_memoized(self):
+        with mock.patch('mdstudio.db.field_hasher.derive_hash', wraps=derive_hash) as derive:
+            first = self.hasher.derive([b'test', b'test'])
+            second = self.hasher.derive([b'test'])
+
+        derive.assert_called_once_with(b'test')
+        self.assertEqual(first, second * 2)
+        self.assertEqual(self.hasher.stats, {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_derive_memo_bounded(self):
+        self.hasher.derive([b'a', b'b'])
+        # mark a as recently used, so b is evicted
+        self.hasher.derive([b'a'])
+        self.hasher.derive([b'c'])
+
+        self.assertEqual(self.hasher.stats['size'], 2)
+        with mock.patch('mdstudio.db.field_hasher.derive_hash', wraps=derive_hash) as derive:
+            self.hasher.derive([b'a', b'b'])
+        derive.assert_called_once_with(b'b')
+
+    def test_derive_memo_disabled(self):
+        self.hasher.memo_size = 0
+
+        self.hasher.derive([b'a'])
+
+        self.assertEqual(self.hasher.stats['size'], 0)
+
+    def test_memo_keyed_digest(self):
+        self.hasher.derive([b'secret@example.com'])
+
+        self.assertNotIn(b'secret@example.com', list(self.hasher._memo.keys()))
+        self.assertNotEqual(FieldHasher()._digest(b'test'), self.hasher._digest(b'test'))
+
+    def test_derive_pool(self):
+        self.hasher.processes = 2
+        pool = mock.MagicMock()
+        pool.map.side_effect = lambda f, values: map(f, values)
+
+        with mock.patch.object(self.hasher, '_get_pool', return_value=pool):
+            result = self.hasher.derive([b'a', b'b', b'a'])
+
+        pool.map.assert_called_once_with(derive_hash, [b'a', b'b'])
+        self.assertEqual(result, [derive_hash(b'a'), derive_hash(b'b'), derive_hash(b'a')])
+
+    def test_derive_pool_single_value(self):
+        self.hasher.processes = 2
+        self.hasher._get_pool = mock.MagicMock()
+
+        self.hasher.derive([b'a'])
+
+        self.hasher._get_pool.assert_not_called()
+
+    def test_derive_process_pool(self):
+        self.hasher.processes = 2
+
+        self.assertEqual(self.hasher.derive([b'a', b'b']), [derive_hash(b'a'), derive_hash(b'b')])
+        self.assertIsNotNone(self.hasher._pool)
+
+    def test_process_pool_spawned(self):
+        self.hasher.processes = 2
+
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as executor, \
+                mock.patch('mdstudio.db.field_hasher.reactor') as reactor:
+            self.hasher._get_pool()
+
+        self.assertEqual(executor.call_args[1]['mp_context'].get_start_method(), 'spawn')
+        reactor.callFromThread.assert_called_once_with(reactor.addSystemEventTrigger, 'during', 'shutdown',
+                                                       self.hasher.shutdown)
+
+    def test_process_pool_unsupported(self):
+        self.hasher.processes = 2
+
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as executor, \
+                mock.patch('mdstudio.db.field_hasher.sys') as sys:
+            sys.version_info = (3, 6, 0)
+            result = self.hasher.derive([b'a', b'b'])
+
+        executor.assert_not_called()
+        self.assertEqual(result, [derive_hash(b'a'), derive_hash(b'b')])
+
+    def test_derive_after_shutdown(self):
+        self.hasher.processes = 2
+        self.hasher.shutdown()
+
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as executor:
+            result = self.hasher.derive([b'a', b'b'])
+
+        executor.assert_not_called()
+        self.assertIsNone(self.hasher._pool)
+        self.assertEqual(result, [derive_hash(b'a'), derive_hash(b'b')])
+
+    def test_derive_pool_shut_down(self):
+        self.hasher.processes = 2
+        pool = mock.MagicMock()
+        pool.map.side_effect = RuntimeError('cannot schedule new futures after shutdown')
+
+        with mock.patch.object(self.hasher, '_get_pool', return_value=pool):
+            result = self.hasher.derive([b'a', b'b'])
+
+        self.assertEqual(result, [derive_hash(b'a'), derive_hash(b'b')])
+
+    def test_derive_invalid(self):
+        self.assertRaises(TypeError, self.hasher.derive, [2])
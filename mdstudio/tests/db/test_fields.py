@@ -8,7 +8,9 @@ from mock import mock
 from unittest2 import TestCase
 
 from mdstudio.db.database import Fields
+from mdstudio.db.crypto_pool import CryptoPool
 from mdstudio.db.exception import DatabaseException
+from mdstudio.db.fields import LazyDecryptedDocument
 from mdstudio.utc import now
 
 
@@ -1370,6 +1372,186 @@ class FieldsTests(TestCase):
         obj2 = deepcopy(obj)
         self.assertRaisesRegex(DatabaseException, "", self.field.parse_result, obj2, {'username': 'user'})
 
+    def test_encryption_fields_lazy(self):
+        self.field = Fields(encrypted=['test', 'other'])
+        self.field._key_repository = mock.MagicMock()
+        self.field._key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+        obj = {
+            'test': 'hello world',
+            'other': 'secret',
+            'plain': 2
+        }
+        obj2 = deepcopy(obj)
+        self.field.convert_call(obj2, None, {'username': 'user'})
+        self.field._key_repository.get_key.reset_mock()
+        Fields.encryptor_cache.invalidate(repository=self.field._key_repository)
+
+        result = self.field.parse_result(obj2, {'username': 'user'}, lazy=True)
+
+        self.assertIsInstance(result, LazyDecryptedDocument)
+        self.assertEqual(result['plain'], 2)
+        self.field._key_repository.get_key.assert_not_called()
+        self.assertRegex(obj2['test'], '__encrypted__:')
+
+        self.assertEqual(result['test'], 'hello world')
+        self.assertEqual(obj2['test'], 'hello world')
+        self.assertRegex(obj2['other'], '__encrypted__:')
+
+        self.assertEqual(result.decrypt_all(), obj)
+        self.field._key_repository.get_key.assert_called_once_with({'username': 'user'})
+
+    def test_encryption_fields_lazy_nested(self):
+        self.field = Fields(encrypted=['o.test', 'l.test'])
+        self.field._key_repository = mock.MagicMock()
+        self.field._key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+        obj = {
+            'o': {'test': 'hello', 'plain': 1},
+            'l': [{'test': 'world'}, {'plain': 2}]
+        }
+        obj2 = deepcopy(obj)
+        self.field.convert_call(obj2, None, {'username': 'user'})
+
+        result = self.field.parse_result(obj2, {'username': 'user'}, lazy=True)
+
+        self.assertIsInstance(result['o'], LazyDecryptedDocument)
+        self.assertEqual(result['o']['plain'], 1)
+        self.assertRegex(obj2['o']['test'], '__encrypted__:')
+        self.assertEqual(result['o']['test'], 'hello')
+        self.assertEqual(result['l'][0]['test'], 'world')
+        self.assertEqual(result['l'][1], {'plain': 2})
+        self.assertEqual(result.decrypt_all(), obj)
+
+    def test_encryption_fields_lazy_list(self):
+        self.field = Fields(encrypted=['test'])
+        self.field._key_repository = mock.MagicMock()
+        self.field._key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+        obj = {
+            'test': ['hello', 'world']
+        }
+        obj2 = deepcopy(obj)
+        self.field.convert_call(obj2, None, {'username': 'user'})
+
+        result = self.field.parse_result(obj2, {'username': 'user'}, lazy=True)
+
+        self.assertEqual(result['test'], ['hello', 'world'])
+
+    def test_encryption_fields_lazy_set(self):
+        self.field = Fields(encrypted=['test'])
+        self.field._key_repository = mock.MagicMock()
+        result = self.field.parse_result({'test': '__encrypted__:wefwefewf', 'plain': 2}, {'username': 'user'},
+                                         lazy=True)
+
+        result['test'] = 'plain'
+        del result['plain']
+
+        self.assertEqual(result['test'], 'plain')
+        self.assertEqual(result.decrypt_all(), {'test': 'plain'})
+        self.assertEqual(len(result), 1)
+        self.field._key_repository.get_key.assert_not_called()
+
+    def test_encryption_fields_lazy_decrypt_fails(self):
+        self.field = Fields(encrypted=['test'])
+        self.field._key_repository = mock.MagicMock()
+        self.field._key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+
+        result = self.field.parse_result({'test': 'wefwefewf', 'plain': 2}, {'username': 'user'}, lazy=True)
+
+        self.assertEqual(result['plain'], 2)
+        self.assertRaisesRegex(DatabaseException, 'Trying to decrypt an unencrypted field with key "test"',
+                               lambda: result['test'])
+
+    def test_encryption_fields_lazy_no_claims(self):
+        self.field = Fields(encrypted=['test'])
+        obj = {'test': '__encrypted__:wefwefewf'}
+
+        self.assertIs(self.field.parse_result(obj, None, lazy=True), obj)
+        self.assertIsNone(self.field.parse_result(None, {'username': 'user'}, lazy=True))
+
+    def test_get_encryptor_cached(self):
+        key_repository = mock.MagicMock()
+        key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+        claims = {'username': 'user'}
+
+        encryptor = Fields(encrypted=['test'], key_repository=key_repository).get_encryptor(claims)
+
+        self.assertIs(Fields(encrypted=['test'], key_repository=key_repository).get_encryptor(claims), encryptor)
+        key_repository.get_key.assert_called_once_with(claims)
+
+        Fields.encryptor_cache.invalidate(claims)
+
+        self.assertIsNot(Fields(encrypted=['test'], key_repository=key_repository).get_encryptor(claims), encryptor)
+        self.assertEqual(key_repository.get_key.call_count, 2)
+
+    def test_encrypt_documents(self):
+        self.field = Fields(encrypted=['test'])
+        self.field._key_repository = mock.MagicMock()
+        self.field._key_repository.get_key = mock.MagicMock(return_value=Fernet.generate_key())
+        self.field.crypto_pool = CryptoPool(threshold=2, chunk_size=3, workers=2)
+        self.addCleanup(self.field.crypto_pool.shutdown)
+        documents = [{'test': 'hello {}'.format(i), 'plain': i} for i in range(10)]
+        encrypted = deepcopy(documents)
+
+        self.field.encrypt_documents(encrypted, {'username': 'user'})
+
+        for document in encrypted:
+            self.assertRegex(document['test'], '__encrypted__:')
+        self.assertEqual([d['plain'] for d in encrypted], list(range(10)))
+
+        self.assertEqual(self.field.parse_results(encrypted, {'username': 'user'}), documents)
+        self.field._key_repository.get_key.assert_called_once_with({'username': 'user'})
+
+    def test_encrypt_documents_no_claims(self):
+        self.field = Fields(encrypted=['test'])
+        self.field.crypto_pool = mock.MagicMock()
+        documents = [{'test': 'hello'}]
+
+        self.field.encrypt_documents(documents)
+
+        self.assertEqual(documents, [{'test': 'hello'}])
+        self.field.crypto_pool.map.assert_not_called()
+
+    def test_parse_results_lazy(self):
+        self.field = Fields(encrypted=['test'])
+        self.field._key_repository = mock.MagicMock()
+
+        results = self.field.parse_results([{'test': '__encrypted__:abc'}], {'username': 'user'}, lazy=True)
+
+        self.assertIsInstance(results[0], LazyDecryptedDocument)
+        self.field._key_repository.get_key.assert_not_called()
+
+    def test_compile(self):
+        fields = Fields(date_times=['a.b', 'filter.c'])
+
+        self.assertEqual(fields._compile(fields.date_times, None), [('a', 'b'), ('filter', 'c')])
+        self.assertEqual(fields._compile(fields.date_times, ['filter', 'update']),
+                         [('filter', 'a', 'b'), ('update', 'a', 'b'), ('filter', 'c'), ('update', 'filter', 'c')])
+
+    def test_compile_cached(self):
+        fields = Fields(date_times=['a.b'])
+
+        plan = fields._compile(fields.date_times, ['filter'])
+
+        self.assertIs(fields._compile(fields.date_times, ['filter']), plan)
+        self.assertIsNot(fields._compile(fields.date_times, ['update']), plan)
+        self.assertIsNot(fields._compile(fields.date_times, None), plan)
+
+    def test_compile_changed_fields(self):
+        fields = Fields(date_times=['a'])
+        fields._compile(fields.date_times, None)
+
+        fields.date_times.append('b')
+
+        self.assertEqual(fields._compile(fields.date_times, None), [('a',), ('b',)])
+
+    def test_compile_bounded(self):
+        fields = Fields()
+        fields._max_plans = 2
+
+        for i in range(3):
+            fields._compile(['field{}'.format(i)], None)
+
+        self.assertEqual(len(fields._plans), 1)
+
     def test_to_dict(self):
         fields = Fields(date_times=['test'], dates=['test2'], encrypted=['test3'])
         self.assertEqual(fields.to_dict(), {
@@ -1426,6 +1608,25 @@ class FieldsTests(TestCase):
                 '__hashed__:date': 'OLiaieIaRIW2tk3SwD9zGAE4TGk-yxifRdI8xElZ7j8='
             })
 
+    def test_convert_call_hashed_batch(self):
+        f = Fields(hashed=['email'])
+        f.hasher = mock.MagicMock()
+        f.hasher.derive.side_effect = lambda values: [v.decode() + '#' for v in values]
+        document = {
+            'documents': [{'email': 'a@example.com'}, {'email': b'b@example.com'}, {'name': 'c'}],
+            'filter': {'email': 'c@example.com'}
+        }
+
+        f.convert_call(document, ['documents', 'filter'])
+
+        f.hasher.derive.assert_called_once_with([b'a@example.com', b'b@example.com', b'c@example.com'])
+        self.assertEqual(document['filter'], {'email': 'c@example.com', '__hashed__:email': 'c@example.com#'})
+        self.assertEqual(document['documents'], [
+            {'email': 'a@example.com', '__hashed__:email': 'a@example.com#'},
+            {'email': b'b@example.com', '__hashed__:email': 'b@example.com#'},
+            {'name': 'c'}
+        ])
+
     def test_convert_call_hashed2(self):
         for i in range(50):
             document = {
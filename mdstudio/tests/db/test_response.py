@@ -1,7 +1,7 @@
 # coding=utf-8
 import unittest
 
-from mdstudio.db.response import UpdateManyResponse, UpdateOneResponse, ReplaceOneResponse
+from mdstudio.db.response import UpdateManyResponse, UpdateOneResponse, ReplaceOneResponse, BulkWriteResponse
 
 
 class ResponseTests(unittest.TestCase):
@@ -61,3 +61,21 @@ class ResponseTests(unittest.TestCase):
         self.assertEqual(many.matched, 2)
         self.assertEqual(many.modified, 1)
         self.assertEqual(many.upserted_id, None)
+
+    def test_BulkWriteResponse(self):
+        bulk = BulkWriteResponse({
+            'inserted': 1,
+            'matched': 2,
+            'modified': 1,
+            'deleted': 3,
+            'upserted': 1,
+            'errors': 1,
+            'results': [{'executed': True, 'id': '123'}, {'executed': False, 'error': 'failed'}]
+        })
+        self.assertEqual(bulk.inserted, 1)
+        self.assertEqual(bulk.matched, 2)
+        self.assertEqual(bulk.modified, 1)
+        self.assertEqual(bulk.deleted, 3)
+        self.assertEqual(bulk.upserted, 1)
+        self.assertEqual(bulk.errors, 1)
+        self.assertEqual(bulk.results, [{'executed': True, 'id': '123'}, {'executed': False, 'error': 'failed'}])
@@ -31,6 +31,14 @@ class SessionDatabaseWrapperTests(TestCase):
             'cursorId': '123456'
         }, claims={'connectionType': 'user'})
 
+    def test_more_batch_size(self):
+        self.wrapper.more('123456', batch_size=500)
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.more', {
+            'cursorId': '123456',
+            'batchSize': 500
+        }, claims={'connectionType': 'user'})
+
     def test_rewind(self):
         self.wrapper.rewind('123456')
 
@@ -326,6 +334,16 @@ class SessionDatabaseWrapperTests(TestCase):
             'sort': [['_id', 'asc']]
         }, claims={'connectionType': 'user'})
 
+    def test_find_many_batch_size(self):
+        self.wrapper.find_many('col', {'_id': 50}, batch_size=500, batch_bytes=1024)
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.find_many', {
+            'collection': 'col',
+            'filter': {'_id': 50},
+            'batchSize': 500,
+            'batchBytes': 1024
+        }, claims={'connectionType': 'user'})
+
     def test_find_many_date_time(self):
         self.wrapper.find_many('col', {'_id': 50}, fields=Fields(date_times=['field1', 'field2']))
 
@@ -552,6 +570,16 @@ class SessionDatabaseWrapperTests(TestCase):
             'pipeline': [{'test': 10}]
         }, claims={'connectionType': 'user'})
 
+    def test_aggregate_batch_size(self):
+        self.wrapper.aggregate('col', [{'test': 10}], batch_size=500, batch_bytes=1024)
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.aggregate', {
+            'collection': 'col',
+            'pipeline': [{'test': 10}],
+            'batchSize': 500,
+            'batchBytes': 1024
+        }, claims={'connectionType': 'user'})
+
     def test_delete_one(self):
         self.wrapper.delete_one('col', {'test': 10})
 
@@ -590,6 +618,35 @@ class SessionDatabaseWrapperTests(TestCase):
             }
         }, claims={'connectionType': 'user'})
 
+    def test_bulk_write(self):
+        self.wrapper.bulk_write('col', [{'insertOne': {'document': {'test': 10}}}])
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.bulk_write', {
+            'collection': 'col',
+            'requests': [{'insertOne': {'document': {'test': 10}}}]
+        }, claims={'connectionType': 'user'})
+
+    def test_bulk_write_unordered(self):
+        self.wrapper.bulk_write('col', [{'deleteOne': {'filter': {'test': 10}}}], ordered=False)
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.bulk_write', {
+            'collection': 'col',
+            'requests': [{'deleteOne': {'filter': {'test': 10}}}],
+            'ordered': False
+        }, claims={'connectionType': 'user'})
+
+    def test_bulk_write_date_time_fields(self):
+        self.wrapper.bulk_write('col', [{'deleteOne': {'filter': {'test': 10}}}],
+                                fields=Fields(date_times=['field1', 'field2']))
+
+        self.session.call.assert_called_once_with('mdstudio.db.endpoint.bulk_write', {
+            'collection': 'col',
+            'requests': [{'deleteOne': {'filter': {'test': 10}}}],
+            'fields': {
+                'datetime': ['field1', 'field2']
+            }
+        }, claims={'connectionType': 'user'})
+
 
 # noinspection PyPep8
 class TestSessionDatabaseWrapperDeferred(TestCase):
@@ -0,0 +1,23 @@
+from twisted.internet.defer import Deferred, fail, succeed
+from twisted.trial.unittest import TestCase
+
+from mdstudio.deferred.chainable import Chainable
+from mdstudio.deferred.gather import gather
+
+
+class TestGather(TestCase):
+    def test_gather(self):
+        d = Deferred()
+        result = gather([d, succeed(2), 3, Chainable(succeed(4))])
+
+        self.assertNoResult(result)
+        d.callback(1)
+        self.assertEqual(self.successResultOf(result), [1, 2, 3, 4])
+
+    def test_gather_empty(self):
+        self.assertEqual(self.successResultOf(gather([])), [])
+
+    def test_gather_failure(self):
+        result = gather([succeed(1), fail(KeyError('test')), fail(ValueError('test'))])
+
+        self.failureResultOf(result, KeyError)
@@ -4,6 +4,7 @@ from twisted.trial.unittest import TestCase
 from mdstudio.deferred.chainable import test_chainable, Chainable
 from mdstudio.deferred.make_deferred import make_deferred
 from mdstudio.deferred.return_value import return_value
+from mdstudio.deferred.thread_pool import ThreadPools
 
 
 # noinspection PyUnresolvedReferences
@@ -67,3 +68,37 @@ class TestMakeDeferred(TestCase):
 
         test_add = test.add()
         yield self.assertFailure(test_add, ValueError)
+
+    @test_chainable
+    def test_pool(self):
+        class Test:
+            thread_pools = ThreadPools('test')
+
+            @make_deferred(pool='read')
+            def add(self, a, b):
+                return a + b
+
+        test = Test()
+
+        test_add = test.add(6, 9)
+        self.assertIsInstance(test_add, Chainable)
+        self.assertEqual((yield test_add), 15)
+        self.assertEqual(Test.thread_pools.metrics['read']['completed'], 1)
+
+        Test.thread_pools.stop()
+
+        return_value({})
+
+    @test_chainable
+    def test_pool_without_pools(self):
+        class Test:
+            @make_deferred(pool='read')
+            def add(self, a, b):
+                return a + b
+
+        test = Test()
+
+        test_add = test.add(6, 9)
+        self.assertEqual((yield test_add), 15)
+
+        return_value({})
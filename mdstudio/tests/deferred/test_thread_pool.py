@@ -0,0 +1,103 @@
+from threading import Event
+
+from twisted.trial.unittest import TestCase
+
+from mdstudio.deferred.chainable import test_chainable
+from mdstudio.deferred.return_value import return_value
+from mdstudio.deferred.thread_pool import ThreadPool, ThreadPools, ThreadPoolFullException
+
+
+class TestThreadPool(TestCase):
+    def setUp(self):
+        self.pool = ThreadPool('test', max_threads=1, max_queue=1)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def test_construction(self):
+        self.assertEqual(self.pool.metrics, {
+            'queued': 0,
+            'active': 0,
+            'workers': 0,
+            'maxWorkers': 1,
+            'maxQueue': 1,
+            'completed': 0,
+            'rejected': 0,
+            'averageWait': 0.0,
+            'maxWait': 0.0
+        })
+
+    @test_chainable
+    def test_defer(self):
+        result = yield self.pool.defer(lambda a, b: a + b, 6, b=9)
+
+        self.assertEqual(result, 15)
+        self.assertEqual(self.pool.metrics['completed'], 1)
+        self.assertEqual(self.pool.metrics['queued'], 0)
+        self.assertEqual(self.pool.metrics['active'], 0)
+
+        return_value({})
+
+    @test_chainable
+    def test_defer_exception(self):
+        def raises():
+            raise ValueError()
+
+        yield self.assertFailure(self.pool.defer(raises), ValueError)
+        self.assertEqual(self.pool.metrics['completed'], 1)
+
+        return_value({})
+
+    @test_chainable
+    def test_queue_limit(self):
+        running = Event()
+        release = Event()
+
+        def block():
+            running.set()
+            release.wait()
+            return 1
+
+        first = self.pool.defer(block)
+        running.wait()
+        second = self.pool.defer(lambda: 2)
+
+        yield self.assertFailure(self.pool.defer(lambda: 3), ThreadPoolFullException)
+        self.assertEqual(self.pool.metrics['rejected'], 1)
+        self.assertEqual(self.pool.metrics['queued'], 1)
+        self.assertEqual(self.pool.metrics['active'], 1)
+
+        release.set()
+        self.assertEqual((yield first), 1)
+        self.assertEqual((yield second), 2)
+        self.assertEqual(self.pool.metrics['completed'], 2)
+
+        return_value({})
+
+    def test_queue_limit_zero(self):
+        pool = ThreadPool('test', max_queue=0)
+
+        self.failureResultOf(pool.defer(lambda: 1), ThreadPoolFullException)
+        self.assertEqual(pool.metrics['rejected'], 1)
+
+
+class TestThreadPools(TestCase):
+    def test_get(self):
+        pools = ThreadPools('test', {'read': {'maxThreads': 3, 'maxQueue': 10}})
+
+        read = pools.get('read')
+        self.assertIs(read, pools.get('read'))
+        self.assertEqual(read.name, 'test-read')
+        self.assertEqual(read.max_queue, 10)
+        self.assertEqual(read.metrics['maxWorkers'], 3)
+
+        write = pools.get('write')
+        self.assertEqual(write.max_queue, 1000)
+        self.assertEqual(write.metrics['maxWorkers'], 5)
+
+    def test_metrics(self):
+        pools = ThreadPools('test')
+        pools.get('read')
+
+        self.assertEqual(list(pools.metrics.keys()), ['read'])
+        self.assertEqual(pools.metrics['read']['completed'], 0)
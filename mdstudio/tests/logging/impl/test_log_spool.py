@@ -0,0 +1,102 @@
+import os
+
+from twisted.trial.unittest import TestCase
+
+from mdstudio.logging.impl.log_spool import LogSpool
+
+
+class TestLogSpool(TestCase):
+    def setUp(self):
+        self.path = self.mktemp()
+        self.spool = LogSpool(self.path, segment_size=3)
+
+    def test_empty(self):
+        self.assertTrue(self.spool.empty)
+        self.assertEqual(self.spool.read(10), [])
+        self.spool.ack()
+
+    def test_append_read(self):
+        self.spool.append([{'message': 'a'}, {'message': 'b'}])
+
+        self.assertFalse(self.spool.empty)
+        self.assertEqual(self.spool.read(10), [{'message': 'a'}, {'message': 'b'}])
+        with open(os.path.join(self.path, '0000000000.ndjson')) as f:
+            self.assertEqual(f.read(), '{"message": "a"}\n{"message": "b"}\n')
+
+    def test_append_empty(self):
+        self.spool.append([])
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_segments(self):
+        self.spool.append(list(range(4)))
+        self.spool.append(list(range(4, 7)))
+
+        self.assertEqual(sorted(os.listdir(self.path)), ['0000000000.ndjson', '0000000001.ndjson', '0000000002.ndjson'])
+        self.assertEqual(self.spool.read(10), [0, 1, 2])
+
+    def test_read_ack(self):
+        self.spool.append(list(range(5)))
+
+        self.assertEqual(self.spool.read(2), [0, 1])
+        self.assertEqual(self.spool.read(2), [0, 1])
+        self.spool.ack()
+        self.assertEqual(self.spool.read(2), [2])
+        self.spool.ack()
+        self.assertEqual(self.spool.read(2), [3, 4])
+        self.spool.ack()
+
+        self.assertTrue(self.spool.empty)
+
+    def test_ack_deletes_segment(self):
+        self.spool.append(list(range(5)))
+
+        self.spool.read(3)
+        self.spool.ack()
+
+        self.assertEqual(os.listdir(self.path), ['0000000001.ndjson'])
+
+    def test_append_while_reading(self):
+        self.spool.append([0])
+        self.assertEqual(self.spool.read(10), [0])
+        self.spool.append([1])
+        self.spool.ack()
+
+        self.assertEqual(self.spool.read(10), [1])
+        self.spool.ack()
+        self.assertTrue(self.spool.empty)
+
+        self.spool.append([2])
+        self.assertEqual(self.spool.read(10), [2])
+
+    def test_restart(self):
+        self.spool.append([0, 1])
+        self.spool.read(1)
+        self.spool.ack()
+
+        spool = LogSpool(self.path, segment_size=3)
+        spool.append([2])
+
+        # the offset is not stored, so the acknowledged records of a segment that was not deleted are read again
+        self.assertEqual(spool.read(10), [0, 1])
+        spool.ack()
+        self.assertEqual(spool.read(10), [2])
+        self.assertEqual(sorted(os.listdir(self.path)), ['0000000001.ndjson'])
+
+    def test_partial_line(self):
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, '0000000000.ndjson'), 'w') as f:
+            f.write('{"message": "a"}\n{"mess')
+
+        self.spool.append([{'message': 'b'}])
+
+        self.assertEqual(self.spool.read(10), [{'message': 'a'}])
+        self.spool.ack()
+        self.assertEqual(self.spool.read(10), [{'message': 'b'}])
+
+    def test_other_files(self):
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, 'notes.txt'), 'w') as f:
+            f.write('not a segment')
+
+        self.assertTrue(self.spool.empty)
@@ -6,10 +6,13 @@ import os
 from autobahn.wamp import ApplicationError, TransportLost
 from mock import mock, call
 from pyfakefs.fake_filesystem_unittest import Patcher
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
 
 from mdstudio.api.exception import CallException
 from mdstudio.deferred.chainable import test_chainable
-from mdstudio.logging.impl.session_observer import SessionLogObserver
+from mdstudio.logging.impl.log_spool import LogSpool
+from mdstudio.logging.impl.session_observer import SessionLogObserver, OverflowPolicy
 from mdstudio.logging.log_type import LogType
 from mdstudio.unittest.db import DBTestCase
 from mdstudio.utc import from_utc_string, now, to_utc_string, timestamp
@@ -111,12 +114,11 @@ class SessionObserverTests(DBTestCase):
 
             yield self.observer.store_recovery()
             self.assertEqual(self.observer.logs, [])
-            with open(self.observer.recovery_file(self.session)) as f:
-                self.assertEqual(json.load(f), [{
-                    'level': 'info',
-                    'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver',
-                    'message': 'Collecting logs on session "MagicMock"'
-                }])
+            self.assertEqual(LogSpool(self.observer.spool_path(self.session)).read(10), [{
+                'level': 'info',
+                'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver',
+                'message': 'Collecting logs on session "MagicMock"'
+            }])
 
     @test_chainable
     def test_store_recovery2(self):
@@ -128,7 +130,7 @@ class SessionObserverTests(DBTestCase):
 
             yield self.observer.store_recovery()
             self.assertEqual(self.observer.logs, [])
-            self.assertFalse(os.path.isfile(self.observer.recovery_file(self.session)))
+            self.assertFalse(os.path.exists(self.observer.spool_path(self.session)))
 
     @test_chainable
     def test_flush_logs(self):
@@ -159,10 +161,7 @@ class SessionObserverTests(DBTestCase):
             'message': 'Collecting logs on session "MagicMock"',
             'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver'
         }])
-        self.observer.sleep.assert_has_calls([
-            call(3),
-            call(1)
-        ])
+        self.observer.sleep.assert_called_once_with(3)
 
     @test_chainable
     def test_flush_logs3(self):
@@ -172,7 +171,7 @@ class SessionObserverTests(DBTestCase):
         self.observer.session = self.session
         self.observer.sleep = mock.MagicMock()
         self.observer.log = mock.MagicMock()
-        self.session.flush_logs = mock.MagicMock(wraps=lambda ex: raise_(ApplicationError))
+        self.session.flush_logs = mock.MagicMock(wraps=lambda ex: raise_(ApplicationError(u'wamp.error.no_such_procedure')))
         del self.observer.logs[0]['time']
         yield self.observer.flush_logs()
         self.assertEqual(self.observer.logs, [{
@@ -180,9 +179,7 @@ class SessionObserverTests(DBTestCase):
             'message': 'Collecting logs on session "MagicMock"',
             'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver'
         }])
-        self.observer.sleep.assert_has_calls([
-            call(1)
-        ])
+        self.observer.sleep.assert_called_once_with(1)
 
     @test_chainable
     def test_flush_logs4(self):
@@ -200,10 +197,7 @@ class SessionObserverTests(DBTestCase):
             'message': 'Collecting logs on session "MagicMock"',
             'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver'
         }])
-        self.observer.sleep.assert_has_calls([
-            call(1),
-            call(1)
-        ])
+        self.observer.sleep.assert_called_once_with(1)
 
     @test_chainable
     def test_flush_logs5(self):
@@ -221,10 +215,7 @@ class SessionObserverTests(DBTestCase):
             'message': 'Collecting logs on session "MagicMock"',
             'source': 'mdstudio.logging.impl.session_observer.SessionLogObserver'
         }])
-        self.observer.sleep.assert_has_calls([
-            call(1),
-            call(1)
-        ])
+        self.observer.sleep.assert_called_once_with(1)
 
     @test_chainable
     def test_flush_logs6(self):
@@ -265,11 +256,17 @@ class SessionObserverTests(DBTestCase):
         self.observer.sleep = mock.MagicMock()
         self.observer.log = mock.MagicMock()
         self.observer.log.error = mock.MagicMock()
-        self.observer.logs = [0] * 9
+        self.observer.batch_size = 4
+        self.observer.logs = list(range(9))
         yield self.observer.flush_logs()
-        self.observer.sleep.assert_has_calls([
-            call(1)
+        self.session.flush_logs.assert_has_calls([
+            call([0, 1, 2, 3]),
+            call([4, 5, 6, 7]),
+            call([8])
         ])
+        self.assertEqual(self.observer.logs, [])
+        self.assertEqual(self.observer.flushed, 9)
+        self.observer.sleep.assert_not_called()
 
     @test_chainable
     def test_flush_logs9(self):
@@ -281,6 +278,166 @@ class SessionObserverTests(DBTestCase):
         yield self.observer.flush_logs()
         self.observer.sleep.assert_not_called()
 
+    @test_chainable
+    def test_flush_logs10(self):
+        def raise_(ex):
+            raise ex
+
+        self.observer.session = self.session
+        self.observer.sleep = mock.MagicMock()
+        self.observer.batch_size = 2
+        self.observer.logs = list(range(5))
+        self.session.flush_logs = mock.MagicMock(side_effect=[None, TransportLost()])
+        yield self.observer.flush_logs()
+        self.assertEqual(self.session.flush_logs.call_count, 2)
+        self.assertEqual(self.observer.logs, [2, 3, 4])
+        self.assertEqual(self.observer.flushed, 2)
+
+    def test_append_log_drop_oldest(self):
+        self.observer.capacity = 3
+        self.observer.logs = []
+        for i in range(5):
+            self.observer.append_log(i)
+
+        self.assertEqual(self.observer.logs, [2, 3, 4])
+        self.assertEqual(self.observer.stats, {'size': 3, 'waiting': 0, 'dropped': 2, 'flushed': 0})
+
+    @test_chainable
+    def test_append_log_block(self):
+        self.observer.session = self.session
+        self.observer.capacity = 2
+        self.observer.policy = OverflowPolicy.Block
+        self.observer.logs = []
+
+        appended = [self.observer.append_log(i) for i in range(3)]
+        self.assertEqual(self.observer.logs, [0, 1])
+        self.assertFalse(appended[2].called)
+        self.assertEqual(self.observer.stats['waiting'], 1)
+
+        yield self.observer.flush_logs()
+
+        self.session.flush_logs.assert_called_once_with([0, 1])
+        self.assertTrue(appended[2].called)
+        self.assertEqual(self.observer.logs, [2])
+        self.assertEqual(self.observer.stats, {'size': 1, 'waiting': 0, 'dropped': 0, 'flushed': 2})
+
+    def test_append_log_block_bounded(self):
+        self.observer.capacity = 3
+        self.observer.policy = OverflowPolicy.Block
+        self.observer.logs = []
+
+        for i in range(3 * self.observer.capacity):
+            self.observer({
+                'message': 'log {}'.format(i),
+                'log_namespace': 'test namespace',
+                'log_level': LogType.Group,
+                'log_time': timestamp(now())
+            })
+
+        self.assertEqual([log['message'] for log in self.observer.logs], ['log 0', 'log 1', 'log 2'])
+        self.assertEqual([log['message'] for log, _ in self.observer._waiting], ['log 3', 'log 4', 'log 5'])
+        self.assertEqual(self.observer.stats, {'size': 3, 'waiting': 3, 'dropped': 3, 'flushed': 0})
+        self.assertFalse(self.successResultOf(self.observer.append_log({'message': 'dropped'})))
+
+    @test_chainable
+    def test_flush_logs_backoff_unlocked(self):
+        backoff = Deferred()
+        self.observer.session = self.session
+        self.observer.spool = LogSpool(self.mktemp())
+        self.observer.sleep = mock.MagicMock(return_value=backoff)
+        self.session.flush_logs = mock.MagicMock(side_effect=TimeoutError())
+
+        flushed = self.observer.flush_logs()
+
+        self.observer.sleep.assert_called_once_with(3)
+        self.assertFalse(self.observer.lock.locked)
+        self.assertFalse(flushed.called)
+
+        yield self.observer.store_recovery()
+        self.assertEqual(len(self.observer.spool.read(10)), 1)
+
+        backoff.callback(None)
+        yield flushed
+
+    def test_append_log_flush_size(self):
+        clock = Clock()
+        self.observer.clock = clock
+        self.observer.session = self.session
+        self.observer.flushing = True
+        self.observer.flush_size = 3
+        self.observer.logs = []
+
+        self.observer.append_log(0)
+        self.observer.append_log(1)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+        self.observer.append_log(2)
+        self.observer.append_log(3)
+        self.assertEqual(len(clock.getDelayedCalls()), 1)
+
+        clock.advance(0)
+        self.session.flush_logs.assert_called_once_with([0, 1, 2, 3])
+        self.assertEqual(self.observer.logs, [])
+
+    def test_pause_flushing_scheduled(self):
+        clock = Clock()
+        self.observer.clock = clock
+        self.observer.flushing = True
+        self.observer.session = self.session
+        self.observer.flush_size = 1
+        self.observer.append_log(0)
+
+        self.observer.pause_flushing(self.session)
+        self.assertEqual(clock.getDelayedCalls(), [])
+
+    @test_chainable
+    def test_flush_logs_spool(self):
+        self.observer.session = self.session
+        self.observer.sleep = mock.MagicMock()
+        self.observer.spool = LogSpool(self.mktemp())
+        self.observer.batch_size = 2
+        self.observer.logs = list(range(5))
+        self.session.flush_logs = mock.MagicMock(side_effect=[None, TransportLost()])
+
+        yield self.observer.flush_logs()
+
+        self.assertEqual(self.observer.logs, [])
+        self.assertEqual(self.observer.spool.read(10), [2, 3, 4])
+
+    @test_chainable
+    def test_flush_logs_spool2(self):
+        self.observer.session = self.session
+        self.observer.sleep = mock.MagicMock()
+        self.observer.spool = LogSpool(self.mktemp())
+        self.observer.spool.append([0, 1, 2])
+        self.observer.batch_size = 2
+        self.observer.logs = [3]
+
+        yield self.observer.flush_logs()
+
+        self.session.flush_logs.assert_has_calls([
+            call([0, 1]),
+            call([2]),
+            call([3])
+        ])
+        self.assertTrue(self.observer.spool.empty)
+        self.assertEqual(self.observer.flushed, 4)
+
+    @test_chainable
+    def test_flush_logs_spool3(self):
+        self.observer.session = self.session
+        self.observer.sleep = mock.MagicMock()
+        self.observer.spool = LogSpool(self.mktemp())
+        self.observer.spool.append([0, 1])
+        self.observer.logs = [2]
+        self.session.flush_logs = mock.MagicMock(side_effect=CallException('Logger is offline'))
+
+        yield self.observer.flush_logs()
+
+        self.session.flush_logs.assert_called_once_with([0, 1])
+        self.assertEqual(self.observer.logs, [])
+        self.assertEqual(self.observer.spool.read(10), [0, 1, 2])
+
     @test_chainable
     def test_start_flushing(self):
         self.observer.session = self.session
@@ -309,12 +466,14 @@ class SessionObserverTests(DBTestCase):
 
             self.observer.session = self.session
             self.observer.sleep = mock.MagicMock()
+            self.observer.logs = []
             yield self.observer.start_flushing(self.session)
-            self.assertEqual(self.observer.logs, [{'est': 'error'}])
+            self.assertFalse(os.path.isfile(self.observer.recovery_file(self.session)))
+            self.assertEqual(self.observer.logs, [])
 
             yield self.observer.flush_logs()
 
-            self.assertFalse(os.path.isfile(self.observer.recovery_file(self.session)))
+            self.assertTrue(self.observer.spool.empty)
 
             self.session.flush_logs.assert_called_once_with([{'est': 'error'}])
             self.assertEqual(self.observer.session, self.session)
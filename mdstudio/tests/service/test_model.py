@@ -11,7 +11,7 @@ from mdstudio.db.cursor import Cursor
 from mdstudio.db.database import IDatabase
 from mdstudio.db.fields import Fields
 from mdstudio.service.model import Model
-from mdstudio.db.response import ReplaceOneResponse, UpdateOneResponse, UpdateManyResponse
+from mdstudio.db.response import ReplaceOneResponse, UpdateOneResponse, UpdateManyResponse, BulkWriteResponse
 from mdstudio.db.session_database import SessionDatabaseWrapper
 from mdstudio.db.sort_mode import SortMode
 from mdstudio.deferred.chainable import chainable
@@ -676,6 +676,28 @@ class ModelTests(TestCase):
                                                        sort=None,
                                                        fields=None)
 
+    @chainable
+    def test_find_many_batch_size(self):
+        self.wrapper.find_many.return_value = {
+            'cursorId': 1234,
+            'alive': False,
+            'results': self.documents
+        }
+        self.wrapper.make_cursor = lambda x, fields: IDatabase.make_cursor(self.wrapper, x, fields)
+        results = yield self.model.find_many({'_id': 'test_id'}, batch_size=500, batch_bytes=1024)
+
+        self.assertIsInstance(results, Cursor)
+
+        self.wrapper.find_many.assert_called_once_with(self.collection,
+                                                       filter={'_id': 'test_id'},
+                                                       projection=None,
+                                                       skip=None,
+                                                       limit=None,
+                                                       sort=None,
+                                                       fields=None,
+                                                       batch_size=500,
+                                                       batch_bytes=1024)
+
     @chainable
     def test_find_many_projection(self):
         self.wrapper.find_many.return_value = {
@@ -1410,3 +1432,50 @@ class ModelTests(TestCase):
         self.wrapper.delete_many.assert_called_once_with(self.collection,
                                                          filter={'_id': 'test_id'},
                                                          fields=Fields(date_times=['test2', 'test']))
+
+    @chainable
+    def test_bulk_write(self):
+        self.wrapper.bulk_write.return_value = {
+            'inserted': 1,
+            'matched': 0,
+            'modified': 0,
+            'deleted': 1,
+            'upserted': 0,
+            'errors': 0,
+            'results': [{'executed': True, 'id': '1234'}, {'executed': True}]
+        }
+        self.wrapper.transform = IDatabase.transform
+        requests = [{'insertOne': {'document': self.document}}, {'deleteOne': {'filter': {'_id': 'test_id'}}}]
+        result = yield self.model.bulk_write(requests)
+
+        self.assertIsInstance(result, BulkWriteResponse)
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(result.results, [{'executed': True, 'id': '1234'}, {'executed': True}])
+
+        self.wrapper.bulk_write.assert_called_once_with(self.collection,
+                                                        requests=requests,
+                                                        ordered=True,
+                                                        fields=None)
+
+    @chainable
+    def test_bulk_write_date_time_fields(self):
+        self.wrapper.bulk_write.return_value = {
+            'inserted': 0,
+            'matched': 0,
+            'modified': 0,
+            'deleted': 1,
+            'upserted': 0,
+            'results': [{'executed': True}]
+        }
+        self.wrapper.transform = IDatabase.transform
+        self.model.date_time_fields = ['test']
+        requests = [{'deleteOne': {'filter': {'_id': 'test_id'}}}]
+        result = yield self.model.bulk_write(requests, ordered=False, fields=Fields(date_times=['test2']))
+
+        self.assertEqual(result.errors, 0)
+
+        self.wrapper.bulk_write.assert_called_once_with(self.collection,
+                                                        requests=requests,
+                                                        ordered=False,
+                                                        fields=Fields(date_times=['test2', 'test']))
@@ -0,0 +1,60 @@
+# coding=utf-8
+import datetime
+
+import pytz
+from mock import mock
+from twisted.trial.unittest import TestCase
+
+from mdstudio.utc import from_utc_string, from_date_string, to_utc_string, to_date_string
+
+
+class TestUtc(TestCase):
+    def test_from_utc_string(self):
+        self.assertEqual(from_utc_string('2017-10-26T09:42:00+00:00'),
+                         datetime.datetime(2017, 10, 26, 9, 42, tzinfo=pytz.utc))
+
+    def test_from_utc_string_round_trip(self):
+        dt = datetime.datetime(2017, 10, 26, 9, 42, 1, 123000, tzinfo=pytz.utc)
+
+        with mock.patch('mdstudio.utc.parsedate') as parsedate:
+            parsed = from_utc_string(to_utc_string(dt))
+
+        parsedate.assert_not_called()
+        self.assertEqual(parsed, dt)
+        self.assertIs(parsed.tzinfo, pytz.utc)
+
+    def test_from_utc_string_fraction(self):
+        self.assertEqual(from_utc_string('2017-10-26T09:42:00.1Z'),
+                         datetime.datetime(2017, 10, 26, 9, 42, 0, 100000, tzinfo=pytz.utc))
+
+    def test_from_utc_string_offset(self):
+        self.assertEqual(from_utc_string('2017-10-26T09:42:00+02:00'),
+                         datetime.datetime(2017, 10, 26, 7, 42, tzinfo=pytz.utc))
+        self.assertEqual(from_utc_string('2017-10-26T09:42:00-05:30'),
+                         datetime.datetime(2017, 10, 26, 15, 12, tzinfo=pytz.utc))
+
+    def test_from_utc_string_naive(self):
+        self.assertEqual(from_utc_string('2017-10-26 09:42:00'),
+                         datetime.datetime(2017, 10, 26, 9, 42, tzinfo=pytz.utc))
+
+    def test_from_utc_string_fallback(self):
+        self.assertEqual(from_utc_string('26 October 2017 09:42 UTC'),
+                         datetime.datetime(2017, 10, 26, 9, 42, tzinfo=pytz.utc))
+        self.assertEqual(from_utc_string('2017-10-26'), datetime.datetime(2017, 10, 26, tzinfo=pytz.utc))
+
+    def test_from_utc_string_invalid(self):
+        self.assertRaises(ValueError, from_utc_string, '2017-13-26T09:42:00+00:00')
+        self.assertRaises(ValueError, from_utc_string, 'test')
+
+    def test_from_date_string(self):
+        with mock.patch('mdstudio.utc.parsedate') as parsedate:
+            self.assertEqual(from_date_string(to_date_string(datetime.date(2017, 10, 26))),
+                             datetime.date(2017, 10, 26))
+
+        parsedate.assert_not_called()
+
+    def test_from_date_string_fallback(self):
+        self.assertEqual(from_date_string('2017-10-26T09:42:00+00:00'), datetime.date(2017, 10, 26))
+
+    def test_from_date_string_invalid(self):
+        self.assertRaises(ValueError, from_date_string, '2017-02-30')
@@ -1,8 +1,15 @@
-from datetime import datetime, date
+import re
+from datetime import datetime, date, timedelta
+from typing import Optional
 
 import pytz
 from dateutil.parser import parse as parsedate
 
+# the formats produced by `to_utc_string` and `to_date_string`, which are parsed without dateutil
+_utc_format = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?'
+                         r'(?:(Z)|([+-])(\d{2}):(\d{2}))?$')
+_date_format = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+
 
 def now():
     # type: () -> datetime
@@ -27,6 +34,10 @@ def to_date_string(ldate):
 
 def from_utc_string(dt):
     # type: (str) -> datetime
+    parsed = _parse_utc_string(dt)
+    if parsed is not None:
+        return parsed
+
     parsed = parsedate(dt)
     # fix for python < 3.6
     if not parsed.tzinfo:
@@ -36,11 +47,40 @@ def from_utc_string(dt):
 
 def from_date_string(ldate):
     # type: (str) -> ldate
+    match = _date_format.match(ldate)
+    if match:
+        try:
+            return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        except ValueError:
+            # let dateutil report the invalid date
+            pass
+
     parsed = parsedate(ldate)
     # fix for python < 3.6
     if not parsed.tzinfo:
         parsed = parsed.replace(tzinfo=pytz.utc)
     return parsed.astimezone(pytz.utc).date()
 
+
+def _parse_utc_string(dt):
+    # type: (str) -> Optional[datetime]
+    match = _utc_format.match(dt)
+    if not match:
+        return None
+
+    year, month, day, hour, minute, second, fraction, zulu, sign, offset_hours, offset_minutes = match.groups()
+    try:
+        parsed = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                          int(fraction.ljust(6, '0')) if fraction else 0, tzinfo=pytz.utc)
+    except ValueError:
+        # let dateutil report the invalid timestamp
+        return None
+
+    if sign:
+        offset = timedelta(hours=int(offset_hours), minutes=int(offset_minutes))
+        parsed = parsed - offset if sign == '+' else parsed + offset
+    return parsed
+
+
 def timestamp(ldate):
     return (ldate - datetime(1970, 1, 1, tzinfo=pytz.utc)).total_seconds()
\ No newline at end of file
@@ -56,6 +56,7 @@ setup(
         'service_identity',  # For Twisted host TLS verification
         'pypiwin32 >= 1.0;platform_system=="Windows"',
         'functools32 >= 0.0;python_version<"3.4"',
+        'futures >= 3.0;python_version<"3.2"',
         'click',
         'GitPython'
     ],